@@ -0,0 +1,126 @@
+"""
+Ende-til-ende-måling av innsamlingen: SensorDataCollector leser fra en simulert enhet
+(DeviceSimulator på en pty) og skriver til en lokal database.
+
+For hver frekvens måles oppstartstid (håndtrykket), rader skrevet per sekund, forsinkelse fra
+linjen er lest fra seriellporten til raden er committet (p50/p99), og CPU-tid i innsamlingen
+per rad. Simulatoren kjøres som egen prosess, så CPU-tallene gjelder bare innsamlingen.
+Loggen fra innsamlingen er på WARNING-nivå (bruk --verbose for DEBUG, én rate-begrenset
+melding per måling). Med --profile skrives tiden per trinn (se Profiling) etter hver frekvens;
+kjør med og uten for å se hva tidtakingen koster. Bare Linux/macOS.
+
+    python Benchmark/IngestBench.py --rates 100 1000 --duration 10
+    python Benchmark/IngestBench.py --rates 1000 --binary
+    python Benchmark/IngestBench.py --rates 1000 --profile
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from CollectorLog import setup_logging
+from DataColector import SensorDataCollector
+from Profiling import profiler
+from Storage import open_backend
+from WriteBuffer import WriteBuffer
+
+
+def start_simulator(args):
+    """
+    Starter DeviceSimulator som egen prosess.
+
+    Returns:
+        tuple: (prosess, port)
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'DeviceSimulator.py'),
+         '--temperature-every', str(args.temperature_every), '--alarm-every', str(args.alarm_every), '--seed', '1'],
+        stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+def bench_rate(db, rate, args):
+    """
+    Kjører innsamlingen mot simulatoren i args.duration sekunder med gitt frekvens.
+
+    Returns:
+        dict: Resultatene for frekvensen.
+    """
+    simulator, port = start_simulator(args)
+    collector = SensorDataCollector(port, rate, args.batch_size, args.flush_interval_ms, backend=db, binary=args.binary)
+    collector.write_buffer = WriteBuffer(db, args.batch_size, args.flush_interval_ms, latency_window=10 ** 6)
+    try:
+        start = time.perf_counter()
+        collector.run(progress=lambda message: None)
+        startup = time.perf_counter() - start
+
+        profiler.report()  # Nytt intervall, uten håndtrykket
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        time.sleep(args.duration)
+        elapsed = time.perf_counter() - start
+        # Enheten sender ikke mer etter STOP, så alle radene er mottatt innenfor elapsed
+        collector.stop()
+        cpu = time.process_time() - cpu_start
+    finally:
+        simulator.send_signal(signal.SIGINT)
+        simulator.wait()
+
+    stats = collector.pipelineStats()
+    writer = stats['writer']
+    rows = writer['rows_written']
+    return {
+        'startup_ms': 1000 * startup,
+        'rows_per_sec': rows / elapsed,
+        'lines_per_sec': stats['reader']['lines'] / elapsed,
+        'p50_ms': writer.get('latency_p50_ms', 0),
+        'p99_ms': writer.get('latency_p99_ms', 0),
+        'cpu_us_per_row': 1e6 * cpu / rows if rows else 0,
+        'dropped': stats['queues'][0]['dropped'] + writer['rows_lost'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=int, nargs='+', default=[100, 1000], help="Målinger per sekund")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval-ms', type=int, default=200)
+    parser.add_argument('--temperature-every', type=int, default=1)
+    parser.add_argument('--alarm-every', type=int, default=0)
+    parser.add_argument('--binary', action='store_true', help="Binære rammer i stedet for JSON-linjer")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--sqlite-path', default=None, help='Standard: midlertidig fil')
+    parser.add_argument('--mysql-database', default='sensordata_bench')
+    parser.add_argument('--verbose', action='store_true', help="Logg på DEBUG-nivå under målingen")
+    parser.add_argument('--profile', action='store_true', help="Skriv tiden per trinn etter hver frekvens")
+    args = parser.parse_args()
+    setup_logging(logging.DEBUG if args.verbose else logging.WARNING)
+    if args.profile:
+        profiler.enable(report_interval=0)
+
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.backend == 'sqlite':
+        db = open_backend('sqlite', path=args.sqlite_path or os.path.join(tmpdir.name, 'bench.db'))
+    else:
+        db = open_backend('mysql', database=args.mysql_database)
+
+    print(f"{'Hz':>6s} {'oppstart (ms)':>13s} {'linjer/s':>9s} {'rader/s':>9s} {'p50 (ms)':>9s} "
+          f"{'p99 (ms)':>9s} {'CPU/rad (µs)':>13s} {'tapt':>6s}")
+    for rate in args.rates:
+        result = bench_rate(db, rate, args)
+        print(f"{rate:6d} {result['startup_ms']:13.0f} {result['lines_per_sec']:9.0f} {result['rows_per_sec']:9.0f} "
+              f"{result['p50_ms']:9.1f} {result['p99_ms']:9.1f} {result['cpu_us_per_row']:13.1f} {result['dropped']:6d}")
+        if args.profile:
+            print(profiler.format_report(profiler.report()))
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Måler spørretid for tidsseriespørringene før og etter indeksene i migrering 2 (CreateSqlTabels).
+
+For hver størrelse fylles en tom database på skjemaversjon 1 med målinger fordelt på flere
+sensorer. Spørringene kjøres, indeksene opprettes, og spørringene kjøres på nytt.
+
+    python Benchmark/QueryLatency.py --rows 1000000 10000000
+    python Benchmark/QueryLatency.py --backend mysql --mysql-database sensordata_bench --rows 1000000
+
+For MySQL slettes og gjenopprettes alle tabellene i --mysql-database, så bruk en egen testdatabase.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from CreateSqlTabels import migrate
+from Storage import SQLiteBackend, open_backend
+
+TABLES = ['TEMPERATUREALARMS', 'ACCELERATIONALARMS', 'TEMPERATUREREADINGS', 'ACCELERATIONREADINGS',
+          'ALARMTHRESHOLDS', 'SENSORS', 'SCHEMA_VERSION']
+
+QUERIES = {
+    # Plot/Sensor_Db.get_latest_data
+    'siste per sensor': (
+        "SELECT temperature FROM temperaturereadings WHERE sensor_id = %s ORDER BY timestamp DESC LIMIT 1",
+        lambda sensor, end: (sensor,)),
+    # Historikk for siste time for én sensor
+    'siste time': (
+        "SELECT timestamp, temperature FROM temperaturereadings WHERE sensor_id = %s AND timestamp BETWEEN %s AND %s",
+        lambda sensor, end: (sensor, str(end - timedelta(hours=1)), str(end))),
+    # DataColector.getAlarmThresholds / gjeldende grense
+    'gjeldende grense': (
+        "SELECT min_value, max_value FROM alarmthresholds WHERE sensor_id = %s AND parameter = 'T' ORDER BY threshold_id DESC LIMIT 1",
+        lambda sensor, end: (sensor,)),
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def fill(db, rows, sensors, thresholds, chunk=10000):
+    """
+    Fyller temperaturtabellen med rows målinger fordelt på sensors sensorer, ett sekund mellom
+    målingene for hver sensor, og alarmgrensetabellen med thresholds rader.
+
+    :return: Tidsstempelet til siste måling.
+    """
+    db.executemany("INSERT INTO SENSORS (sensor_id, type, location, installation_date) VALUES (%s, %s, %s, %s)",
+                   [(sensor, 'bench', 'bench', '2024-01-01') for sensor in range(1, sensors + 1)])
+    db.executemany("INSERT INTO alarmthresholds (sensor_id, parameter, min_value, max_value) VALUES (%s, %s, %s, %s)",
+                   [(1 + i % sensors, 'TA'[i % 2], -4, 28) for i in range(thresholds)])
+
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append((1 + i % sensors, str(start + timedelta(seconds=i // sensors)), 20.0 + (i % 100) / 10))
+        if len(batch) == chunk:
+            db.executemany("INSERT INTO temperaturereadings (sensor_id, timestamp, temperature) VALUES (%s, %s, %s)", batch)
+            db.commit()
+            batch = []
+    if batch:
+        db.executemany("INSERT INTO temperaturereadings (sensor_id, timestamp, temperature) VALUES (%s, %s, %s)", batch)
+    db.commit()
+    return start + timedelta(seconds=(rows - 1) // sensors)
+
+
+def run_queries(db, sensors, end, repeats):
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        latencies = []
+        for i in range(repeats):
+            args = params(1 + i % sensors, end)
+            start = time.perf_counter()
+            db.query(sql, args)
+            latencies.append(1000 * (time.perf_counter() - start))
+        results[name] = (percentile(latencies, 0.5), percentile(latencies, 0.99))
+    return results
+
+
+def open_database(args, tmpdir, rows):
+    if args.backend == 'sqlite':
+        db = SQLiteBackend(os.path.join(tmpdir, f'bench_{rows}.db'), auto_migrate=False)
+        db.connect()
+        return db
+    db = open_backend('mysql', database=args.mysql_database)
+    db.connect()
+    db.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in TABLES:
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+    db.execute("SET FOREIGN_KEY_CHECKS = 1")
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--sensors', type=int, default=20)
+    parser.add_argument('--thresholds', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--mysql-database', default=None)
+    args = parser.parse_args()
+    if args.backend == 'mysql' and args.mysql_database in (None, 'sensordata'):
+        parser.error("--mysql-database må peke på en egen testdatabase")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            db = open_database(args, tmpdir, rows)
+            migrate(db, target=1, verbose=False)
+
+            start = time.perf_counter()
+            end = fill(db, rows, args.sensors, args.thresholds)
+            print(f"\n{rows} rader: fylt på {time.perf_counter() - start:.1f} s")
+
+            before = run_queries(db, args.sensors, end, args.repeats)
+            start = time.perf_counter()
+            migrate(db, target=2, verbose=False)
+            print(f"Indekser opprettet på {time.perf_counter() - start:.1f} s")
+            after = run_queries(db, args.sensors, end, args.repeats)
+
+            print(f"{'spørring':20s} {'uten indeks p50/p99 (ms)':>28s} {'med indeks p50/p99 (ms)':>28s}")
+            for name in QUERIES:
+                print(f"{name:20s} {before[name][0]:13.3f} / {before[name][1]:<12.3f} "
+                      f"{after[name][0]:13.3f} / {after[name][1]:<12.3f}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
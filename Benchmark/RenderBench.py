@@ -0,0 +1,111 @@
+"""
+Måler tegnetid per oppdatering for live-plottet i GuiHMI: den gamle veien (tøm aksene, plott
+alt på nytt, tight_layout og canvas.draw to ganger) mot LivePlot (set_data og blitting).
+
+Kjøres uten vindu (Agg), så tallene viser matplotlib-arbeidet og ikke Tk. mplcursors er ikke
+med i den gamle veien; i GUI-et kom gjenoppretting av markørene i tillegg.
+
+    python Benchmark/RenderBench.py --points 24 120 --frames 30
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from LivePlot import LivePlot
+
+THRESHOLDS = (-4, 28, 15)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def series(points, frame):
+    # Én måling per sekund, forskjøvet med frame sekunder
+    times = [1.7e9 + frame + i for i in range(points)]
+    temperatures = [20 + 5 * math.sin((frame + i) / 10) for i in range(points)]
+    axes = [[10 * math.sin((frame + i) / (5 + k)) for i in range(points)] for k in range(3)]
+    return times, temperatures, axes
+
+
+def full_redraw(fig, ax1, ax2, times, temperatures, axes):
+    # Tilsvarer GuiHMI.plot_data før inkrementell tegning
+    temp_min, temp_max, acc = THRESHOLDS
+    labels = [time.strftime("%H:%M:%S", time.localtime(t)) for t in times]
+    ax1.clear()
+    ax2.clear()
+    ax1.plot(labels, temperatures, marker='o', label='Temperatur')
+    ax1.axhline(y=0, color='gray', linestyle='--')
+    ax1.axhline(y=temp_min, color='red', linestyle='--', label=f'{temp_min}°C')
+    ax1.axhline(y=temp_max, color='blue', linestyle='--', label=f'{temp_max}°C')
+    ax1.set_title("Temperatur")
+    ax1.set_ylabel("°C")
+    ax1.set_ylim(-20, 40)
+    ax1.set_xticks(range(len(labels)))
+    ax1.set_xticklabels(labels, rotation=45, ha='right')
+    ax1.legend()
+    for values, axis, color in zip(axes, 'xyz', ('red', 'green', 'blue')):
+        ax2.plot(labels, values, label=axis, color=color)
+    ax2.axhline(y=0, color='gray', linestyle='--')
+    ax2.axhline(y=-acc, color='red', linestyle='--', label=f'-{acc} m/s²')
+    ax2.axhline(y=acc, color='blue', linestyle='--', label=f'{acc} m/s²')
+    ax2.set_title("Akselerasjon")
+    ax2.set_ylabel("m/s²")
+    ax2.set_ylim(-20, 20)
+    ax2.set_xticks(range(len(labels)))
+    ax2.set_xticklabels(labels, rotation=45, ha='right')
+    ax2.legend()
+    fig.tight_layout()
+    fig.canvas.draw()
+    fig.tight_layout()
+    fig.canvas.draw()
+
+
+def measure(render, frames):
+    latencies = []
+    cpu_start = time.process_time()
+    for frame in range(frames):
+        start = time.perf_counter()
+        render(frame)
+        latencies.append(1000 * (time.perf_counter() - start))
+    cpu = 1000 * (time.process_time() - cpu_start) / frames
+    return percentile(latencies, 0.5), percentile(latencies, 0.99), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[24, 120])
+    parser.add_argument('--frames', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'punkter':>8s} {'metode':12s} {'p50 (ms)':>10s} {'p99 (ms)':>10s} {'CPU/ramme (ms)':>15s}")
+    for points in args.points:
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 6))
+        results = {'full': measure(lambda frame: full_redraw(fig, ax1, ax2, *series(points, frame)), args.frames)}
+        plt.close(fig)
+
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 6))
+        live = LivePlot(fig, ax1, ax2, window=points)
+        live.set_thresholds(*THRESHOLDS)
+
+        def incremental(frame):
+            times, temperatures, axes = series(points, frame)
+            live.update(times, temperatures, times, *axes)
+
+        results['inkrementell'] = measure(incremental, args.frames)
+        plt.close(fig)
+
+        for name, (p50, p99, cpu) in results.items():
+            print(f"{points:8d} {name:12s} {p50:10.2f} {p99:10.2f} {cpu:15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Måler spoolen (se Spool.py): hvor raskt skrivebufferen kan legge bolker i spoolfilen når
+databasen er nede, og hvor raskt spoolen spilles av når databasen er tilbake.
+
+Databaseutfallet simuleres med en SQLite-backend som feiler mens down er satt. Midt i
+avspillingen lukkes og åpnes spoolen på nytt, som etter et krasj, og til slutt sjekkes det at
+databasen har nøyaktig like mange rader som ble lagt i bufferen.
+
+    python Benchmark/SpoolBench.py --rows 200000 --batch-size 500
+    python Benchmark/SpoolBench.py --sync
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from CollectorLog import setup_logging
+from Spool import Spool
+from Storage import SQLiteBackend
+from WriteBuffer import WriteBuffer
+
+
+class OutageBackend(SQLiteBackend):
+    """
+    SQLite-backend som oppfører seg som en database som er nede mens down er satt.
+    """
+
+    down = False
+
+    def clone(self):
+        return OutageBackend(self.path, self.auto_migrate)
+
+    def ping(self):
+        if self.down:
+            raise sqlite3.OperationalError("database is down")
+        super().ping()
+
+    def executemany(self, sql, rows):
+        if self.down:
+            raise sqlite3.OperationalError("database is down")
+        return super().executemany(sql, rows)
+
+
+def fill(buffer, rows, sensor_id, alarm_every):
+    """
+    Legger rows målinger (halvparten temperatur, halvparten akselerasjon) i bufferen.
+
+    Returns:
+        float: Sekunder det tok.
+    """
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    start = time.perf_counter()
+    for i in range(rows // 2):
+        alarms = ["HIGH ALARM TEMPERATURE"] if alarm_every and i % alarm_every == 0 else ()
+        buffer.addTemperature((sensor_id, timestamp, 20.0 + i % 10), alarms=alarms)
+        buffer.addAcceleration((sensor_id, timestamp, 0.1, 0.2, 9.8, 0.01, -0.02, 0.0))
+    buffer.flush()
+    return time.perf_counter() - start
+
+
+def replay(buffer, limit=None):
+    """
+    Spiller av spoolen til den er tom, eller til limit rader er spilt av.
+
+    Returns:
+        tuple: (rader, sekunder).
+    """
+    rows = 0
+    start = time.perf_counter()
+    while buffer.spool.pending() and (limit is None or rows < limit):
+        rows += buffer.replaySpool()
+    return rows, time.perf_counter() - start
+
+
+def count_rows(db):
+    return sum(db.query_one(f"SELECT COUNT(*) FROM {table}")[0]
+               for table in ('temperaturereadings', 'accelerationreadings'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--replay-batch', type=int, default=5000)
+    parser.add_argument('--alarm-every', type=int, default=1000, help="Hver N-te temperatur har alarm, 0 gir ingen")
+    parser.add_argument('--capacity-mb', type=int, default=256)
+    parser.add_argument('--sync', action='store_true', help="msync etter hver bolk")
+    parser.add_argument('--sensor-id', type=int, default=1)
+    args = parser.parse_args()
+    setup_logging(logging.ERROR)  # Ellers én advarsel per bolk mens databasen er nede
+
+    tmpdir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmpdir.name, 'bench.db')
+    spool_path = os.path.join(tmpdir.name, 'bench.spool')
+    db = OutageBackend(db_path)
+    db.connect()
+    before = count_rows(db)
+
+    spool = Spool(spool_path, args.capacity_mb * 2 ** 20, sync=args.sync)
+    buffer = WriteBuffer(db, args.batch_size, 10 ** 9, spool=spool, retry_interval=0,
+                         replay_batch=args.replay_batch)
+    OutageBackend.down = True
+    elapsed = fill(buffer, args.rows, args.sensor_id, args.alarm_every)
+    stats = spool.stats()
+    print(f"spool   {buffer.rows_spooled / elapsed:10.0f} rader/s  "
+          f"{stats['pending_bytes'] / elapsed / 2 ** 20:7.1f} MB/s  "
+          f"({stats['pending_bytes'] / max(1, buffer.rows_spooled):.0f} byte/rad, sync={args.sync}, tapt {buffer.rows_lost})")
+
+    # Halve spoolen, så "krasj": ny spool og ny buffer på samme filer
+    OutageBackend.down = False
+    first, first_time = replay(buffer, args.rows // 2)
+    spool.close()
+    spool = Spool(spool_path, sync=args.sync)
+    buffer = WriteBuffer(db.clone(), args.batch_size, 10 ** 9, spool=spool, replay_batch=args.replay_batch)
+    buffer.backend.connect()
+    rest, rest_time = replay(buffer)
+    rows = first + rest
+    print(f"replay  {rows / (first_time + rest_time):10.0f} rader/s  "
+          f"({first} før og {rest} etter gjenåpning, replay_batch={args.replay_batch})")
+
+    written = count_rows(buffer.backend) - before
+    status = "OK" if written == args.rows // 2 * 2 and not spool.pending() else "FEIL"
+    print(f"kontroll {status}: {written} rader i databasen, {args.rows // 2 * 2} lagt i bufferen")
+    spool.close()
+    buffer.backend.close()
+    db.close()
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
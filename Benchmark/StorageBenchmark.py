@@ -0,0 +1,101 @@
+"""
+Sammenligner MySQL- og SQLite-backenden: innsettingsrate via WriteBuffer og
+forsinkelse for "siste verdi"-spørringene som HMI-en kjører hvert sekund.
+
+Kjør mot en egen testdatabase, siden målingene blir liggende igjen i tabellene:
+
+    python Benchmark/StorageBenchmark.py --backends sqlite mysql --rows 100000 --mysql-database sensordata_bench
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Storage import open_backend
+from WriteBuffer import WriteBuffer
+
+LATEST_QUERIES = [
+    "SELECT temperature FROM temperaturereadings ORDER BY reading_id DESC LIMIT 1;",
+    "SELECT diff_acceleration_x, diff_acceleration_y, diff_acceleration_z FROM accelerationreadings ORDER BY reading_id DESC LIMIT 1;",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def bench_inserts(db, rows, batch_size, sensor_id):
+    """
+    Setter inn rows målinger (halvparten temperatur, halvparten akselerasjon) via WriteBuffer.
+
+    Returns:
+        float: Rader per sekund.
+    """
+    buffer = WriteBuffer(db, batch_size=batch_size, flush_interval_ms=10 ** 9)
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    start = time.perf_counter()
+    for i in range(rows // 2):
+        buffer.addTemperature((sensor_id, timestamp, 20.0 + i % 10))
+        buffer.addAcceleration((sensor_id, timestamp, 0.1, 0.2, 9.8, 0.0, 0.0, 0.0))
+    buffer.flush()
+    elapsed = time.perf_counter() - start
+    return buffer.rows_written / elapsed
+
+
+def bench_latest(db, repeats):
+    """
+    Kjører siste-verdi-spørringene repeats ganger.
+
+    Returns:
+        list: Forsinkelse i millisekunder per runde (begge spørringer).
+    """
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for sql in LATEST_QUERIES:
+            db.query(sql)
+        db.commit()
+        latencies.append(1000 * (time.perf_counter() - start))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['sqlite', 'mysql'], choices=['sqlite', 'mysql'])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--sensor-id', type=int, default=1)
+    parser.add_argument('--sqlite-path', default=None, help='Standard: midlertidig fil')
+    parser.add_argument('--mysql-database', default='sensordata')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    for kind in args.backends:
+        if kind == 'sqlite':
+            db = open_backend('sqlite', path=args.sqlite_path or os.path.join(tmpdir.name, 'bench.db'))
+        else:
+            db = open_backend('mysql', database=args.mysql_database)
+        try:
+            db.connect()
+        except db.Error as e:
+            print(f"{kind}: kunne ikke koble til ({e})")
+            continue
+
+        for batch_size in args.batch_size:
+            rate = bench_inserts(db, args.rows, batch_size, args.sensor_id)
+            print(f"{kind:7s} insert batch={batch_size:<5d} {rate:10.0f} rader/s")
+
+        latencies = bench_latest(db, args.queries)
+        print(f"{kind:7s} siste verdi  p50={percentile(latencies, 0.5):.3f} ms  "
+              f"p99={percentile(latencies, 0.99):.3f} ms  snitt={statistics.mean(latencies):.3f} ms")
+        db.close()
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+FORMAT = '%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Slipper gjennom maks burst meldinger per period sekunder for hver meldingsmal (logger,
+    nivå og format-streng), så en feil som gjentar seg for hver måling ikke oversvømmer loggen.
+    Neste melding som slipper gjennom etter en pause, forteller hvor mange som ble holdt tilbake.
+    """
+
+    def __init__(self, burst=10, period=10.0):
+        """
+        Args:
+            burst (int): Antall meldinger som slipper gjennom per period.
+            period (float): Lengden på vinduet i sekunder.
+        """
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.windows = {}  # mal -> [vindusstart, antall, holdt tilbake]
+        self.lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                held_back = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if held_back:
+                    record.msg = f"{record.msg} ({held_back} like meldinger holdt tilbake)"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler som forkaster meldinger når køen er full, i stedet for å blokkere tråden som
+    logger. Formateringen og skrivingen gjøres av QueueListener i en egen tråd.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging(level=logging.INFO, stream=None, burst=10, period=10.0, queue_size=10000):
+    """
+    Setter opp logging for innsamlingen: nivåfiltrering, rate-begrensning og en kø, så trådene
+    i innsamlingen aldri venter på en treg terminal. Kan kalles flere ganger; bare nivået endres
+    etter første gang.
+
+    Args:
+        level (int): Laveste nivå som logges, f.eks. logging.DEBUG for én linje per måling.
+        stream: Hvor loggen skrives. Standard er sys.stderr.
+        burst (int): Meldinger per mal som slipper gjennom per period (se RateLimitFilter).
+        period (float): Sekunder per vindu for rate-begrensningen.
+        queue_size (int): Maks antall meldinger som venter på å bli skrevet.
+
+    Returns:
+        DroppingQueueHandler: Handleren på rot-loggeren (har telleren dropped).
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _handler is not None:
+        return _handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(FORMAT))
+    log_queue = queue.Queue(queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(RateLimitFilter(burst, period))
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _handler
+
+
+def stop_logging():
+    """
+    Skriver ut det som ligger i loggkøen og stopper skrivetråden.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
+        _handler = None
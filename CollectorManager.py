@@ -0,0 +1,249 @@
+import argparse
+import logging
+import threading
+import time
+from CollectorLog import setup_logging
+from DataColector import SensorDataCollector
+from Metrics import metrics
+from Pipeline import StageQueue
+from Profiling import profiler
+from Rollup import RollupAggregator
+from Spool import Spool
+from Storage import open_backend
+from ThresholdCache import ThresholdCache
+from WriteBuffer import WriteBuffer
+
+log = logging.getLogger('collector')
+
+
+class CollectorManager:
+    """
+    Samler inn fra mange mikrokontrollere samtidig, én SensorDataCollector per seriellport.
+
+    Hver port har egen lese- og tolketråd, slik at en treg eller død enhet ikke holder igjen de
+    andre. Alle tolkerne legger radene i én felles skrivekø som tømmes av en liten pool
+    skrivetråder, hver med egen databaseforbindelse og WriteBuffer, så antall forbindelser og
+    commits ikke vokser med antall enheter. Alarmgrensene deles gjennom én ThresholdCache.
+    """
+
+    def __init__(self, ports, frequency, writers=2, batch_size=500, flush_interval_ms=500, queue_size=50000,
+                 backend=None, rollup_interval=None, spool=None):
+        """
+        Args:
+            ports (list): Seriellportene som skal leses.
+            frequency (int): Antall målinger per sekund per enhet.
+            writers (int): Antall skrivetråder. Med SQLite gir mer enn én lite, siden skrivingen
+                           uansett serialiseres i databasen.
+            batch_size (int): Antall rader per commit per skrivetråd.
+            flush_interval_ms (int): Maks tid i millisekunder en rad kan ligge i en skrivebuffer.
+            queue_size (int): Kapasitet på den felles skrivekøen og på hver enhets linjekø.
+            backend (StorageBackend): Databasen radene skrives til. Standard er open_backend().
+            rollup_interval (float): Sekunder mellom hver oppdatering av rollup-tabellene.
+                                     None betyr at rollups vedlikeholdes av en egen prosess.
+            spool (Spool): Felles spoolfil for alle skrivetrådene når databasen er nede eller treg.
+        """
+        self.db = backend if backend is not None else open_backend()
+        self.write_queue = StageQueue('writes', queue_size)
+        self.thresholds = ThresholdCache(self.db.clone())
+        self.rollup = RollupAggregator(self.db.clone(), rollup_interval) if rollup_interval else None
+
+        self.collectors = [
+            SensorDataCollector(port, frequency, queue_size=queue_size, backend=self.db,
+                                write_queue=self.write_queue, thresholds=self.thresholds)
+            for port in ports
+        ]
+        self.write_buffers = [WriteBuffer(self.db.clone(), batch_size, flush_interval_ms, spool=spool)
+                              for _ in range(writers)]
+        self.writer_threads = []
+        self.started = None
+
+    def run(self, progress=print, timeout=5):
+        """
+        Starter skrivetrådene og alle enhetene. Håndtrykkene kjøres parallelt.
+
+        Args:
+            progress (callable): Mottar statusmeldinger, med porten først.
+            timeout (float): Maks ventetid i sekunder per svar fra en enhet.
+
+        Returns:
+            dict: Port -> unntak for enhetene som ikke kunne startes. De andre samler inn.
+        """
+        self.thresholds.start()
+        self.write_queue.reopen()
+        self.writer_threads = [
+            threading.Thread(target=self.writeData, args=(write_buffer,), name=f'writer {i}')
+            for i, write_buffer in enumerate(self.write_buffers)
+        ]
+        for thread in self.writer_threads:
+            thread.start()
+
+        failed = {}
+
+        def start(collector):
+            try:
+                collector.run(lambda message: progress(f"{collector.port}: {message}"), timeout)
+            except Exception as e:
+                failed[collector.port] = e
+                progress(f"{collector.port}: {e}")
+
+        self.forEach(start)
+        if self.rollup is not None:
+            self.rollup.start()
+        self.started = time.monotonic()
+        return failed
+
+    def stop(self, timeout=5):
+        """
+        Stopper alle enhetene, og så skrivetrådene når den felles skrivekøen er tom.
+
+        Args:
+            timeout (float): Maks ventetid i sekunder på stoppbekreftelsen fra hver enhet.
+        """
+        self.forEach(lambda collector: collector.stop(timeout) if collector.running else None)
+        # Alle tolkerne er ferdige, så ingen flere rader kommer i køen
+        self.write_queue.close()
+        for thread in self.writer_threads:
+            thread.join()
+        self.writer_threads = []
+        if self.rollup is not None:
+            self.rollup.stop()
+        self.thresholds.stop()
+
+    def forEach(self, action):
+        """
+        Kjører action(collector) for alle enhetene i parallell og venter til alle er ferdige.
+        """
+        threads = [threading.Thread(target=action, args=(collector,)) for collector in self.collectors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def writeData(self, write_buffer):
+        """
+        Skrivetråd: tømmer den felles skrivekøen med egen forbindelse. Er databasen nede, prøves
+        den igjen med økende pause (se WriteBuffer) mens køen fylles og gir mottrykk.
+        """
+        try:
+            write_buffer.connect(retry=True)
+            write_buffer.drainQueue(self.write_queue)
+        except Exception:
+            # Ellers blir tolkerne stående i put() på en full kø, og stop() venter for alltid
+            log.exception("%s stopped, discarding the write queue until collection stops",
+                          threading.current_thread().name)
+            self.discard(write_buffer)
+        finally:
+            write_buffer.backend.close()
+
+    def discard(self, write_buffer):
+        """
+        Tømmer skrivekøen uten å skrive til den er lukket, og teller radene som tapt.
+        """
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+            kind, rows = item[0], item[1]
+            count = len(rows) if kind in ('temperatures', 'accelerations') else 1
+            write_buffer.rows_lost += count
+            write_buffer.lost.inc(count)
+
+    def stats(self):
+        """
+        Returnerer samlet statistikk for alle enhetene.
+
+        Returns:
+            dict: 'samples' (rader skrevet), 'samples_per_sec' siden run(), 'lines_per_sec' lest
+                  fra alle portene, 'dropped' linjer, 'write_queue' (StageQueue.stats),
+                  'writers' (WriteBuffer.stats per skrivetråd) og 'devices' (per port).
+        """
+        elapsed = time.monotonic() - self.started if self.started else 0
+        writers = [write_buffer.stats() for write_buffer in self.write_buffers]
+        devices = {}
+        for collector in self.collectors:
+            reader = collector.line_reader.stats() if collector.line_reader is not None else None
+            devices[collector.port] = {
+                'running': collector.running,
+                'lines_per_sec': reader['lines_per_sec'] if reader else 0,
+                'dropped': collector.line_queue.stats()['dropped'],
+            }
+        samples = sum(writer['rows_written'] for writer in writers)
+        return {
+            'samples': samples,
+            'samples_per_sec': samples / elapsed if elapsed > 0 else 0,
+            'lines_per_sec': sum(device['lines_per_sec'] for device in devices.values()),
+            'dropped': sum(device['dropped'] for device in devices.values()),
+            'write_queue': self.write_queue.stats(),
+            'writers': writers,
+            'devices': devices,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Samler inn fra flere mikrokontrollere samtidig.")
+    parser.add_argument('ports', nargs='*', help="Seriellporter, f.eks. COM5 COM6 eller /dev/ttyUSB0")
+    parser.add_argument('--simulate', type=int, default=0, metavar='N',
+                        help="Start N simulerte enheter på pty-er (se DeviceSimulator) i tillegg til portene")
+    parser.add_argument('--frequency', type=int, default=1, help="Målinger per sekund per enhet")
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=None, help="Sekunder før innsamlingen stoppes")
+    parser.add_argument('--report', type=float, default=5, help="Sekunder mellom hver statistikkutskrift")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--metrics-port', type=int, default=9108, help="HTTP-port for /metrics, 0 slår av")
+    parser.add_argument('--spool', default=None, metavar='FIL',
+                        help="Spool målinger til denne filen når databasen er nede eller treg (se Spool)")
+    parser.add_argument('--profile', type=float, default=0, metavar='SEKUNDER',
+                        help="Logg tiden per trinn (p50/p95/p99, kall/s) med dette intervallet, 0 slår av")
+    parser.add_argument('--flamegraph', default=None, metavar='FIL',
+                        help="Skriv stakkprøver av alle tråder som folded stacks (flamegraph.pl, speedscope)")
+    parser.add_argument('--flamegraph-seconds', type=float, default=30, help="Lengden på prøvevinduet")
+    args = parser.parse_args()
+
+    setup_logging(getattr(logging, args.log_level))
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.profile:
+        profiler.enable(args.profile)
+
+    simulators = []
+    ports = list(args.ports)
+    if args.simulate:
+        from DeviceSimulator import DeviceSimulator
+        for i in range(args.simulate):
+            simulator = DeviceSimulator(temperature_sensor_id=2 * i + 1, accelerometer_id=2 * i + 2)
+            simulators.append(simulator)
+            ports.append(simulator.start())
+    if not ports:
+        parser.error("Oppgi minst én port eller --simulate")
+
+    spool = Spool(args.spool) if args.spool else None
+    manager = CollectorManager(ports, args.frequency, args.writers, args.batch_size, spool=spool)
+    failed = manager.run()
+    if len(failed) == len(ports):
+        manager.stop()
+        raise SystemExit("Ingen enheter startet")
+
+    if args.flamegraph:
+        profiler.sample_stacks(args.flamegraph_seconds, args.flamegraph)
+    deadline = time.monotonic() + args.duration if args.duration else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(args.report if deadline is None else min(args.report, max(0.0, deadline - time.monotonic())))
+            stats = manager.stats()
+            print(f"{stats['samples_per_sec']:.0f} samples/s skrevet, {stats['lines_per_sec']:.0f} linjer/s lest, "
+                  f"skrivekø {stats['write_queue']['depth']}, forkastet {stats['dropped']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+        for simulator in simulators:
+            simulator.stop()
+        print(manager.stats())
+        if spool is not None:
+            print(spool.stats())
+            spool.close()
+
+
+if __name__ == "__main__":
+    main()
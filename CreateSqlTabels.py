@@ -1,76 +1,306 @@
-import mysql.connector #Importerer MySQL-connektoren
-connection = mysql.connector.connect(
-    host="localhost", # Kobler til MySQL-serveren på localhost
-    user="root", # Brukernavn for MySQL-databasen
-    passwd="root", # Passord for MySQL-databasen
-    database="sensordata" # Spesifiserer databasen som skal brukes
-)
-
-cursorObject = connection.cursor() # Oppretter en cursor for å utføre SQL-spørringer
-
-# Oppretter tabellen SENSORS for å lagre sensordata
-studentRecord = """CREATE TABLE SENSORS (
-    sensor_id INT PRIMARY KEY,
-    type VARCHAR(50),
-    location VARCHAR(100),
-    installation_date DATE
-)"""
-cursorObject.execute(studentRecord)# Utfører SQL-kommandoen for å opprette tabellen
-
-# Oppretter tabellen TEMPERATUREREADINGS for temperaturdata
-studentRecord1 = """CREATE TABLE TEMPERATUREREADINGS (
-    reading_id INT AUTO_INCREMENT PRIMARY KEY,
-    sensor_id INT,
-    timestamp DATETIME,
-    temperature FLOAT,
-    FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id)
-)"""
-cursorObject.execute(studentRecord1) # Utfører SQL-kommandoen for å opprette tabellen
-
-# Oppretter tabellen ACCELERATIONREADINGS for akselerasjonsdata
-studentRecord2 = """CREATE TABLE ACCELERATIONREADINGS (
-    reading_id INT AUTO_INCREMENT PRIMARY KEY,
-    sensor_id INT,
-    timestamp DATETIME,
-    acceleration_x FLOAT,
-    acceleration_y FLOAT,
-    acceleration_z FLOAT,
-    diff_acceleration_x FLOAT,
-    diff_acceleration_y FLOAT,
-    diff_acceleration_z FLOAT,
-    FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id) 
-)"""
-cursorObject.execute(studentRecord2) # Utfører SQL-kommandoen for å opprette tabellen
-
-# Oppretter tabellen ALARMTHRESHOLDS for alarmgrenser
-studentRecord3 = """CREATE TABLE ALARMTHRESHOLDS (
-    threshold_id INT AUTO_INCREMENT PRIMARY KEY,
-    sensor_id INT,
-    parameter VARCHAR(50),
-    min_value FLOAT,
-    max_value FLOAT,
-    FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id) 
-)"""
-cursorObject.execute(studentRecord3)# Utfører SQL-kommandoen for å opprette tabellen
-
-# Oppretter tabellen TEMPERATUREALARMS for temperaturalarmer
-studentRecord4 = """CREATE TABLE TEMPERATUREALARMS (
-    alarm_id INT AUTO_INCREMENT PRIMARY KEY,
-    reading_id INT,
-    parameter VARCHAR(50),
-    FOREIGN KEY (reading_id) REFERENCES TEMPERATUREREADINGS(reading_id) 
-)"""
-cursorObject.execute(studentRecord4)# Utfører SQL-kommandoen for å opprette tabellen
-
-# Oppretter tabellen ACCELERATIONALARMS for akselerasjonsalarmer
-studentRecord5 = """CREATE TABLE ACCELERATIONALARMS (
-    alarm_id INT AUTO_INCREMENT PRIMARY KEY,
-    reading_id INT,
-    parameter VARCHAR(50),
-    FOREIGN KEY (reading_id) REFERENCES ACCELERATIONREADINGS(reading_id) 
-)"""
-cursorObject.execute(studentRecord5)# Utfører SQL-kommandoen for å opprette tabellen
-connection.close()# Lukker tilkoblingen til databasen
+"""
+Oppretter og oppgraderer databaseskjemaet med nummererte migreringer.
 
+Hver migrering kjøres én gang og registreres i tabellen SCHEMA_VERSION, så skriptet kan kjøres
+på nytt uten at noe skjer to ganger. Hver setning er i tillegg idempotent (IF NOT EXISTS eller
+sjekk mot information_schema), siden MySQL committer DDL fortløpende og en migrering som feiler
+halvveis derfor kan kjøres på nytt.
 
+    python CreateSqlTabels.py                      # MySQL, oppgrader til siste versjon
+    python CreateSqlTabels.py --backend sqlite     # SQLite-fil (SENSORDATA_SQLITE_PATH)
+    python CreateSqlTabels.py --status             # vis gjeldende versjon
+    python CreateSqlTabels.py --partition day      # partisjoner målingstabellene per dag (MySQL)
+"""
+import argparse
+import time
+from datetime import date
+from Retention import READING_TABLES, partition_definitions, partitions, period_start, next_period
+from Storage import open_backend
 
+# Tabelldefinisjoner per databasetype. SQLite bruker INTEGER PRIMARY KEY (rowid) i stedet for AUTO_INCREMENT.
+TABLES = {
+    'mysql': [
+        # Oppretter tabellen SENSORS for å lagre sensordata
+        """CREATE TABLE IF NOT EXISTS SENSORS (
+            sensor_id INT PRIMARY KEY,
+            type VARCHAR(50),
+            location VARCHAR(100),
+            installation_date DATE
+        )""",
+        # Oppretter tabellen TEMPERATUREREADINGS for temperaturdata
+        """CREATE TABLE IF NOT EXISTS TEMPERATUREREADINGS (
+            reading_id INT AUTO_INCREMENT PRIMARY KEY,
+            sensor_id INT,
+            timestamp DATETIME,
+            temperature FLOAT,
+            FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id)
+        )""",
+        # Oppretter tabellen ACCELERATIONREADINGS for akselerasjonsdata
+        """CREATE TABLE IF NOT EXISTS ACCELERATIONREADINGS (
+            reading_id INT AUTO_INCREMENT PRIMARY KEY,
+            sensor_id INT,
+            timestamp DATETIME,
+            acceleration_x FLOAT,
+            acceleration_y FLOAT,
+            acceleration_z FLOAT,
+            diff_acceleration_x FLOAT,
+            diff_acceleration_y FLOAT,
+            diff_acceleration_z FLOAT,
+            FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id)
+        )""",
+        # Oppretter tabellen ALARMTHRESHOLDS for alarmgrenser
+        """CREATE TABLE IF NOT EXISTS ALARMTHRESHOLDS (
+            threshold_id INT AUTO_INCREMENT PRIMARY KEY,
+            sensor_id INT,
+            parameter VARCHAR(50),
+            min_value FLOAT,
+            max_value FLOAT,
+            FOREIGN KEY (sensor_id) REFERENCES SENSORS(sensor_id)
+        )""",
+        # Oppretter tabellen TEMPERATUREALARMS for temperaturalarmer
+        """CREATE TABLE IF NOT EXISTS TEMPERATUREALARMS (
+            alarm_id INT AUTO_INCREMENT PRIMARY KEY,
+            reading_id INT,
+            parameter VARCHAR(50),
+            FOREIGN KEY (reading_id) REFERENCES TEMPERATUREREADINGS(reading_id)
+        )""",
+        # Oppretter tabellen ACCELERATIONALARMS for akselerasjonsalarmer
+        """CREATE TABLE IF NOT EXISTS ACCELERATIONALARMS (
+            alarm_id INT AUTO_INCREMENT PRIMARY KEY,
+            reading_id INT,
+            parameter VARCHAR(50),
+            FOREIGN KEY (reading_id) REFERENCES ACCELERATIONREADINGS(reading_id)
+        )""",
+    ],
+    'sqlite': [
+        """CREATE TABLE IF NOT EXISTS SENSORS (
+            sensor_id INTEGER PRIMARY KEY,
+            type VARCHAR(50),
+            location VARCHAR(100),
+            installation_date DATE
+        )""",
+        """CREATE TABLE IF NOT EXISTS TEMPERATUREREADINGS (
+            reading_id INTEGER PRIMARY KEY,
+            sensor_id INT REFERENCES SENSORS(sensor_id),
+            timestamp DATETIME,
+            temperature FLOAT
+        )""",
+        """CREATE TABLE IF NOT EXISTS ACCELERATIONREADINGS (
+            reading_id INTEGER PRIMARY KEY,
+            sensor_id INT REFERENCES SENSORS(sensor_id),
+            timestamp DATETIME,
+            acceleration_x FLOAT,
+            acceleration_y FLOAT,
+            acceleration_z FLOAT,
+            diff_acceleration_x FLOAT,
+            diff_acceleration_y FLOAT,
+            diff_acceleration_z FLOAT
+        )""",
+        """CREATE TABLE IF NOT EXISTS ALARMTHRESHOLDS (
+            threshold_id INTEGER PRIMARY KEY,
+            sensor_id INT REFERENCES SENSORS(sensor_id),
+            parameter VARCHAR(50),
+            min_value FLOAT,
+            max_value FLOAT
+        )""",
+        """CREATE TABLE IF NOT EXISTS TEMPERATUREALARMS (
+            alarm_id INTEGER PRIMARY KEY,
+            reading_id INT REFERENCES TEMPERATUREREADINGS(reading_id),
+            parameter VARCHAR(50)
+        )""",
+        """CREATE TABLE IF NOT EXISTS ACCELERATIONALARMS (
+            alarm_id INTEGER PRIMARY KEY,
+            reading_id INT REFERENCES ACCELERATIONREADINGS(reading_id),
+            parameter VARCHAR(50)
+        )""",
+    ],
+}
+
+
+def create_index(db, table, name, columns):
+    """
+    Oppretter en indeks dersom den ikke finnes fra før.
+
+    :param db: Tilkoblet StorageBackend.
+    :param table: Tabellen indeksen skal ligge på.
+    :param name: Navn på indeksen.
+    :param columns: Kolonneliste, f.eks. "sensor_id, timestamp".
+    """
+    if db.name == 'sqlite':
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return
+    exists = db.query_one("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND LOWER(table_name) = LOWER(%s) AND index_name = %s
+    """, (table, name))[0]
+    if not exists:
+        db.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+
+
+def create_tables(db):
+    # Grunnskjemaet slik det opprinnelig ble laget av dette skriptet
+    for statement in TABLES[db.name]:
+        db.execute(statement)
+
+
+def create_time_series_indexes(db):
+    # Siste verdi / tidsintervall per sensor: WHERE sensor_id = ? ORDER BY timestamp
+    create_index(db, 'TEMPERATUREREADINGS', 'idx_temperature_sensor_time', 'sensor_id, timestamp')
+    create_index(db, 'ACCELERATIONREADINGS', 'idx_acceleration_sensor_time', 'sensor_id, timestamp')
+    # Gjeldende grense per sensor og parameter: WHERE sensor_id = ? AND parameter = ? ORDER BY threshold_id DESC
+    create_index(db, 'ALARMTHRESHOLDS', 'idx_thresholds_sensor_parameter', 'sensor_id, parameter, threshold_id')
+
+
+def create_rollup_tables(db):
+    # Nedsamplede serier (min/maks/sum/antall per sensor, målestørrelse, oppløsning og tidsbøtte), se Rollup.py
+    db.execute("""CREATE TABLE IF NOT EXISTS ROLLUPS (
+        sensor_id INT NOT NULL,
+        metric VARCHAR(32) NOT NULL,
+        resolution INT NOT NULL,
+        bucket_start DATETIME NOT NULL,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        sum_value DOUBLE,
+        sample_count INT,
+        PRIMARY KEY (sensor_id, metric, resolution, bucket_start)
+    )""")
+    # Høyeste reading_id som er aggregert per kildetabell
+    db.execute("""CREATE TABLE IF NOT EXISTS ROLLUP_STATE (
+        source VARCHAR(64) PRIMARY KEY,
+        last_reading_id BIGINT NOT NULL
+    )""")
+
+
+def create_spool_state(db):
+    # Hvor langt hver spoolfil er spilt av (generasjon og byteposisjon), se Spool.py
+    db.execute("""CREATE TABLE IF NOT EXISTS SPOOL_STATE (
+        spool VARCHAR(255) PRIMARY KEY,
+        generation BIGINT NOT NULL,
+        position BIGINT NOT NULL
+    )""")
+
+
+# (versjon, beskrivelse, funksjon). Nye migreringer legges til nederst med neste versjonsnummer.
+MIGRATIONS = [
+    (1, "Opprett tabeller", create_tables),
+    (2, "Indekser for tidsserier og alarmgrenser", create_time_series_indexes),
+    (3, "Tabeller for nedsamplede serier (rollups)", create_rollup_tables),
+    (4, "Avspillingsposisjon for spoolfiler", create_spool_state),
+]
+
+
+def current_version(db):
+    """
+    Finner høyeste migrering som er kjørt. Oppretter SCHEMA_VERSION ved første kjøring.
+
+    :param db: Tilkoblet StorageBackend.
+    :return: Versjonsnummer, 0 for en tom database.
+    """
+    db.execute("""CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+        version INT PRIMARY KEY,
+        description VARCHAR(200),
+        applied_at DATETIME
+    )""")
+    db.commit()
+    row = db.query_one("SELECT MAX(version) FROM SCHEMA_VERSION")
+    return row[0] or 0
+
+
+def migrate(db, target=None, verbose=True):
+    """
+    Kjører alle migreringer som ikke er kjørt, opp til og med target.
+
+    :param db: Tilkoblet StorageBackend.
+    :param target: Siste versjon som skal kjøres. Standard er nyeste.
+    :param verbose: Skriv ut hver migrering som kjøres.
+    :return: Versjonen databasen har etterpå.
+    """
+    version = current_version(db)
+    for number, description, apply in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        if verbose:
+            print(f"Migrering {number}: {description}")
+        apply(db)
+        db.execute(
+            "INSERT INTO SCHEMA_VERSION (version, description, applied_at) VALUES (%s, %s, %s)",
+            (number, description, time.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        db.commit()
+        version = number
+    return version
+
+
+def drop_foreign_keys(db, table):
+    # Partisjonerte InnoDB-tabeller kan verken ha eller være mål for fremmednøkler
+    rows = db.query("""
+        SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND (LOWER(TABLE_NAME) = LOWER(%s) OR LOWER(REFERENCED_TABLE_NAME) = LOWER(%s))
+    """, (table, table))
+    for table_name, constraint in rows:
+        db.execute(f"ALTER TABLE {table_name} DROP FOREIGN KEY {constraint}")
+
+
+def partition_readings(db, granularity, ahead=3):
+    """
+    Partisjonerer målingstabellene på timestamp per dag eller måned (bare MySQL).
+
+    Tabeller som allerede er partisjonert hoppes over. Fremmednøklene på og til målingstabellene
+    fjernes, og primærnøkkelen utvides til (reading_id, timestamp), siden MySQL krever at
+    partisjonsnøkkelen er med i alle unike nøkler. Tabellen bygges om, så kjør dette i et
+    vedlikeholdsvindu. Deretter holder Retention.py partisjonene ved like.
+
+    :param db: Tilkoblet MySQL-backend.
+    :param granularity: 'day' eller 'month'.
+    :param ahead: Antall framtidige perioder det opprettes partisjoner for.
+    """
+    if db.name != 'mysql':
+        raise ValueError("Partisjonering støttes bare på MySQL")
+    for table in READING_TABLES:
+        if partitions(db, table):
+            print(f"{table} er allerede partisjonert")
+            continue
+
+        first = db.query_one(f"SELECT MIN(timestamp) FROM {table}")[0]
+        first = first.date() if first else date.today()
+        last = period_start(date.today(), granularity)
+        for _ in range(ahead):
+            last = next_period(last, granularity)
+        definitions = partition_definitions(first, last, granularity)
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+        drop_foreign_keys(db, table)
+        print(f"Partisjonerer {table} i {len(definitions)} partisjoner")
+        db.execute(f"""ALTER TABLE {table}
+            MODIFY timestamp DATETIME NOT NULL,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (reading_id, timestamp)
+            PARTITION BY RANGE COLUMNS(timestamp) ({", ".join(definitions)})""")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=None)
+    parser.add_argument('--target', type=int, default=None, help="Migrer bare opp til denne versjonen")
+    parser.add_argument('--status', action='store_true', help="Vis gjeldende versjon og avslutt")
+    parser.add_argument('--partition', choices=['day', 'month'], default=None,
+                        help="Partisjoner målingstabellene på timestamp (MySQL)")
+    parser.add_argument('--ahead', type=int, default=3, help="Antall framtidige partisjoner")
+    args = parser.parse_args()
+
+    db = open_backend(args.backend)
+    db.connect()  # Kobler til databasen (SQLite-filen opprettes og migreres automatisk)
+    try:
+        if args.status:
+            print(f"Skjemaversjon: {current_version(db)} av {MIGRATIONS[-1][0]}")
+        else:
+            print(f"Skjemaversjon: {migrate(db, args.target)}")
+            if args.partition:
+                partition_readings(db, args.partition, args.ahead)
+    finally:
+        db.close()  # Lukker tilkoblingen til databasen
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,347 @@
-from time import sleep
-import pymysql
+import logging
 import serial
 import json
+import math
 import time
+import queue
 import threading
+import numpy as np
+from WriteBuffer import WriteBuffer
+from Pipeline import StageQueue
+from SerialReader import SerialLineReader
+from Storage import open_backend
+from Rollup import RollupAggregator
+from ThresholdCache import ThresholdCache
+import Framing
+from Metrics import metrics
+from Profiling import profiler
+from CollectorLog import setup_logging
+
+log = logging.getLogger('collector')
+
+# Linjer fra mikrokontrolleren som er svar på kommandoer; alt annet er målinger
+RESPONSE_KEYS = (b'"Response"', b'"SensorConfiguration"')
+STOPPED = "Data gathering stopped."
+
+DEFAULT_PORT = 'COM5'
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _sensor_id(stamp):
+    if not isinstance(stamp, dict):
+        raise ValueError(f"expected an object, got {stamp!r}")
+    sensor_id = stamp.get('sensor_id')
+    if not isinstance(sensor_id, int) or isinstance(sensor_id, bool):
+        raise ValueError(f"invalid sensor_id {sensor_id!r}")
+    return sensor_id
+
+
+def _number(stamp, key):
+    value = stamp.get(key)
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+        raise ValueError(f"invalid {key} {value!r}")
+    return float(value)
+
+
+def decodeLine(line):
+    """
+    Dekoder én JSON-linje med målinger og sjekker at den har riktig form.
+
+    Args:
+        line (str | bytes): Linjen fra mikrokontrolleren.
+
+    Returns:
+        tuple: (temperatur, akselerasjon), der temperatur er (sensor_id, temperatur) og
+               akselerasjon er (sensor_id, x, y, z), eller None for det linjen ikke har.
+
+    Raises:
+        ValueError: Ugyldig JSON, ikke et objekt, ingen målinger, sensor_id som ikke er et
+                    heltall eller måleverdier som ikke er endelige tall.
+    """
+    dataJson = json.loads(line)  # JSONDecodeError er en ValueError
+    if not isinstance(dataJson, dict):
+        raise ValueError(f"expected an object, got {dataJson!r}")
+    temperature = acceleration = None
+    if "temperature" in dataJson:
+        stamp = dataJson['temperature']
+        temperature = (_sensor_id(stamp), _number(stamp, 'temperature'))
+    if "acceleration" in dataJson:
+        stamp = dataJson['acceleration']
+        acceleration = (_sensor_id(stamp), _number(stamp, 'x'), _number(stamp, 'y'), _number(stamp, 'z'))
+    if temperature is None and acceleration is None:
+        raise ValueError("no temperature or acceleration")
+    return temperature, acceleration
+
+
+def decodeFrame(frame):
+    """
+    Sjekker én binær ramme fra FrameDecoder med de samme kravene som decodeLine.
+
+    Args:
+        frame (tuple): (type, sensor_id, tid i ms, verdi...).
+
+    Returns:
+        tuple: (temperatur, akselerasjon) som fra decodeLine.
+
+    Raises:
+        ValueError: Ukjent rammetype eller måleverdier som ikke er endelige tall (NaN, inf).
+    """
+    frame_type, sensor_id, device_ms, *values = frame
+    for value in values:
+        if not math.isfinite(value):
+            raise ValueError(f"invalid value {value!r} in frame from sensor {sensor_id}")
+    if frame_type == Framing.TEMPERATURE:
+        return (sensor_id, values[0]), None
+    if frame_type == Framing.ACCELERATION:
+        return None, (sensor_id, *values)
+    raise ValueError(f"unknown frame type {frame_type!r}")
+
 
 class SensorDataCollector:
     """
     Klasse for å hente og behandle sanntidsdata fra temperatursensor og akselerometer via seriell port.
-    Støtter innsetting av målinger og alarmer til MySQL-database.
+    Støtter innsetting av målinger og alarmer til MySQL- eller SQLite-database (se Storage).
     """
 
-    def __init__(self, port, frequency):
+    def __init__(self, port, frequency, batch_size=100, flush_interval_ms=500, queue_size=10000, backend=None,
+                 rollup_interval=None, write_queue=None, thresholds=None, baudrate=9600, data_baudrate=None,
+                 binary=False, parse_block=256, parse_wait_ms=50, spool=None):
         """
         Initialiserer objektet med seriell port, målefrekvens og databaseforbindelse.
+        Seriellporten og databasen åpnes først i open()/run(), så objektet kan lages uten å vente.
+
+        Målinger skrives via en WriteBuffer: de samles i minnet og skrives med én commit
+        per bolk. Ved krasj kan maksimalt batch_size - 1 målinger, eller de siste
+        flush_interval_ms + 100 millisekundene med data, gå tapt, i tillegg til det som
+        ligger i køene mellom trinnene. stop() tømmer alltid køene og bufferen.
 
         Args:
             port (str): COM-porten som sensoren er koblet til.
             frequency (int): Antall målinger per sekund.
+            batch_size (int): Antall målinger per commit. 1 gir commit per måling.
+            flush_interval_ms (int): Maks tid i millisekunder en måling kan ligge i bufferen.
+            queue_size (int): Kapasitet på køene mellom lese-, tolke- og skrivetrinnet.
+            backend (StorageBackend): Databasen målingene skrives til. Standard er open_backend().
+            rollup_interval (float): Sekunder mellom hver oppdatering av rollup-tabellene (se Rollup).
+                                     None betyr at rollups vedlikeholdes av en egen prosess.
+            write_queue (StageQueue): Delt skrivekø (se CollectorManager). Da startes ingen egen
+                                      skrivetråd, og eieren av køen lukker den og skriver radene.
+            thresholds (ThresholdCache): Delt grensecache. Eieren starter og stopper den.
+            baudrate (int): Baudrate mikrokontrolleren starter med.
+            data_baudrate (int): Baudrate det byttes til under håndtrykket ({"Baud": ...}), for
+                                 innsamling med høyere frekvens. None beholder baudrate.
+            binary (bool): Be om binære rammer (se Framing) i stedet for JSON-linjer. Svarer ikke
+                           enheten, brukes JSON.
+            parse_block (int): Maks antall linjer tolketrinnet behandler samlet med processBatch.
+                               0 gir processData per linje (med utskrift per måling).
+            parse_wait_ms (int): Hvor lenge tolketrinnet venter på flere linjer før en blokk
+                                 behandles. Små blokker koster mer per linje enn de sparer.
+            spool (Spool): Spoolfil for målinger når databasen er nede eller treg (se WriteBuffer).
+                           Innsamlingen kan da også startes uten database.
         """
         self.port = port
-        self.baudrate = 9600
+        self.baudrate = baudrate
+        self.data_baudrate = data_baudrate
+        self.binary = binary
+        self.parse_block = parse_block
+        self.parse_wait = parse_wait_ms / 1000
         self.frequency = frequency
         self.interval = 1 / frequency
-        self.ser = serial.Serial(port, self.baudrate, timeout=1)
-        time.sleep(2)  # Wait for the connection to establish
-
-        self.db_config = {
-            'host': 'localhost',
-            'user': 'root',
-            'password': 'root',
-            'database': 'sensordata'
-        }
-        self.conn = pymysql.connect(**self.db_config)
-        self.cursor = self.conn.cursor()
+        self.ser = None
+        self.line_reader = None
+
+        self.db = backend if backend is not None else open_backend()
+        self.shared_writer = write_queue is not None
+        self.write_buffer = None if self.shared_writer else WriteBuffer(self.db, batch_size, flush_interval_ms,
+                                                                        spool=spool)
 
         self.running = False
-        self.thread = None
+        self.threads = []
+        self.rollup = RollupAggregator(self.db.clone(), rollup_interval) if rollup_interval else None
+        # Alarmgrenser slås opp i minnet; endringer i alarmthresholds slår inn innen poll_interval
+        self.shared_thresholds = thresholds is not None
+        self.thresholds = thresholds if self.shared_thresholds else ThresholdCache(self.db.clone())
+
+        # Leser -> tolker: leseren skal aldri blokkere, så linjer forkastes når køen er full.
+        # Tolker -> skriver: mottrykk, tolkeren venter på skriveren.
+        self.line_queue = StageQueue('lines', queue_size, drop_when_full=True)
+        self.write_queue = write_queue if self.shared_writer else StageQueue('writes', queue_size)
+        # Leser -> request(): svar på kommandoer, skilt ut fra målingene av lesetrinnet
+        self.responses = queue.Queue()
 
         self.temperature_sensor_id = None
         self.accelerometer_id = None
 
-        self.temperature_min_threshold = None
-        self.temperature_max_threshold = None
-
-        self.acceleration_min_threshold = None
-        self.acceleration_max_threshold = None
+        # Veggklokke minus monotonic(), for å gi hver måling tidsstempelet den ble lest med.
+        # Oppdateres av tolketrinnet, så en justert systemklokke slår inn med en gang.
+        self.clock_offset = time.time() - time.monotonic()
 
         self.acceleration_x2 = 0
         self.acceleration_y2 = 0
         self.acceleration_z2 = 0
 
-    def sendCommand(self, command):
+        # Tellere og histogrammer, lest via Metrics.metrics.snapshot() eller HTTP (Metrics.serve)
+        self.lines_received = metrics.counter('lines_received')
+        self.responses_received = metrics.counter('responses_received')
+        self.samples_parsed = metrics.counter('samples_parsed')
+        self.invalid_lines = metrics.counter('invalid_lines')
+        self.alarms_raised = metrics.counter('alarms_raised')
+        self.queue_wait = metrics.histogram('line_queue_wait_ms')
+        self.parse_time = metrics.histogram('parse_ms')
+        metrics.gauge(f'line_queue_depth {port}', self.line_queue.depth)
+        metrics.gauge(f'lines_dropped {port}', lambda: self.line_queue.dropped)
+        metrics.gauge('write_queue_depth', self.write_queue.depth)
+
+    def open(self, progress=print):
         """
-        Sender en kommando til mikrokontrolleren via seriell port.
+        Åpner seriellporten hvis den ikke allerede er åpen.
 
         Args:
-            command (str): Kommandoen som skal sendes.
+            progress (callable): Mottar statusmeldinger underveis.
+
+        Raises:
+            serial.SerialException: Porten finnes ikke eller er i bruk.
+        """
+        if self.ser is None:
+            progress(f"Opening {self.port}")
+            self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
+            self.line_reader = SerialLineReader(self.ser)
+        elif not self.ser.is_open:
+            progress(f"Reopening {self.port}")
+            self.ser.baudrate = self.baudrate  # Enheten starter på nytt med standard baudrate
+            self.ser.open()
+
+    def isResponse(self, line):
+        """
+        Skiller svar på kommandoer fra målinger uten å tolke hele linjen.
+
+        Args:
+            line (bytes): Linje fra seriellporten.
+
+        Returns:
+            bool: True hvis linjen er et svar (Response eller SensorConfiguration).
         """
+        return line.lstrip(b'{ ').startswith(RESPONSE_KEYS)
+
+    def writeMessage(self, message):
+        """
+        Skriver en JSON-melding til mikrokontrolleren.
+
+        Args:
+            message (dict): Meldingen, f.eks. {"Command": "START"}.
+        """
+        if self.ser is None:
+            log.warning("Not sent, serial port not opened: %s", message)
+            return
         if not self.ser.is_open:
             self.ser.open()
-        command_json = json.dumps({"Command": command})
-        self.ser.write(command_json.encode())
-        print(f"Sent: {command_json}")
+        message_json = json.dumps(message)
+        self.ser.write(message_json.encode())
+        log.debug("Sent: %s", message_json)
+
+    def request(self, message, accept, timeout=5, resend=None):
+        """
+        Sender en melding og venter til mikrokontrolleren svarer. Lesetrinnet må kjøre; det legger
+        svarene i self.responses og sender målinger som kommer innimellom videre til tolkeren.
 
+        Args:
+            message (dict): Meldingen som sendes.
+            accept (callable): Får det tolkede svaret og returnerer True for svaret det ventes på.
+                               Andre svar skrives ut og hoppes over.
+            timeout (float): Maks antall sekunder å vente.
+            resend (float): Send meldingen på nytt hvis det ikke har kommet svar etter så mange
+                            sekunder. Brukes rett etter at porten er åpnet, mens mikrokontrolleren
+                            fortsatt starter opp og ikke leser seriellporten.
+
+        Returns:
+            dict: Svaret.
+
+        Raises:
+            TimeoutError: Ingen godtatt svar innen timeout.
+        """
+        # Gamle svar (f.eks. fra en kommando som gikk ut på tid) skal ikke tas for svar på denne
+        while True:
+            try:
+                self.responses.get_nowait()
+            except queue.Empty:
+                break
+
+        deadline = time.monotonic() + timeout
+        self.writeMessage(message)
+        next_send = time.monotonic() + resend if resend else deadline
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError(f"No response to {message} from microcontroller within {timeout} s")
+            if now >= next_send:
+                self.writeMessage(message)
+                next_send = now + resend
+            try:
+                line = self.responses.get(timeout=min(deadline, next_send) - now)
+            except queue.Empty:
+                continue
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                log.warning("Received invalid JSON response")
+                continue
+            if accept(response):
+                return response
+            log.warning("Unexpected response: %s", response)
+
+    def sendCommand(self, command):
+        """
+        Sender en kommando til mikrokontrolleren via seriell port.
+
+        Args:
+            command (str): Kommandoen som skal sendes.
+        """
+        self.writeMessage({"Command": command})
 
-    def setFrequency(self, frequency):
+    def setFrequency(self, frequency, timeout=5):
         """
-        Setter målefrekvensen for datainnsamling.
+        Setter målefrekvensen for datainnsamling og venter på bekreftelse.
 
         Args:
             frequency (int): Antall målinger per sekund.
+            timeout (float): Maks antall sekunder å vente på svar.
+        """
+        response = self.request({"GatherFreq": frequency}, lambda r: 'Response' in r, timeout)
+        log.info("Device: %s", response['Response'])
+
+    def setBaudrate(self, baudrate, timeout=5):
+        """
+        Ber mikrokontrolleren bytte baudrate, og bytter porten etter at den har bekreftet.
+
+        Args:
+            baudrate (int): Ny baudrate.
+            timeout (float): Maks antall sekunder å vente på svar.
+        """
+        response = self.request({"Baud": baudrate}, lambda r: 'Response' in r, timeout)
+        log.info("Device: %s", response['Response'])
+        self.ser.baudrate = baudrate
+
+    def enableBinary(self, timeout=5):
         """
-        command_json = json.dumps({"GatherFreq": frequency})
-        self.ser.write(command_json.encode())
-        print(f"Sent: {command_json}")
+        Ber mikrokontrolleren sende binære rammer. Leseren slås over først, siden den også
+        forstår JSON-linjer; svarer ikke enheten, går leseren tilbake til JSON-linjer.
+
+        Args:
+            timeout (float): Maks antall sekunder å vente på svar.
+
+        Returns:
+            bool: True hvis enheten sender binære rammer.
+        """
+        self.line_reader.setBinary(True)
+        try:
+            response = self.request({"Command": "BINARY"}, lambda r: 'Response' in r, timeout)
+        except TimeoutError:
+            self.line_reader.setBinary(False)
+            log.warning("Binary framing not supported, using JSON")
+            return False
+        log.info("Device: %s", response['Response'])
+        return True
 
     def sendCommandStart(self):
         """
@@ -88,28 +355,22 @@ class SensorDataCollector:
         """
         self.sendCommand('STOP')
 
-    def insertTemperatureData(self, sensor_id, temperature):
+    def insertTemperatureData(self, sensor_id, temperature, arrival=None, alarms=()):
         """
-        Setter inn temperaturdata i databasen.
+        Sender temperaturdata videre til skrivetrinnet. Dataene skrives til databasen ved neste flush.
 
         Args:
             sensor_id (int): Sensorens ID.
             temperature (float): Temperaturmåling.
+            arrival (float): time.monotonic() da linjen ble lest, brukes til å måle forsinkelse.
+            alarms (list): Alarmparametere som skal knyttes til målingen.
         """
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        try:
-            self.cursor.execute('''
-            INSERT INTO temperaturereadings (sensor_id, timestamp, temperature)
-            VALUES (%s, %s, %s)
-            ''', (sensor_id, timestamp, temperature))
-            self.conn.commit()
-            print('Temperature data transferred')
-        except pymysql.MySQLError as e:
-            print(f"Error: {e}")
+        timestamp = self.timestamps([arrival])[0]
+        self.write_queue.put(('temperature', (sensor_id, timestamp, temperature), arrival, alarms))
 
-    def insertAccelerationData(self, sensor_id, acceleration_x, acceleration_y, acceleration_z, diff_acceleration_x, diff_acceleration_y, diff_acceleration_z):
+    def insertAccelerationData(self, sensor_id, acceleration_x, acceleration_y, acceleration_z, diff_acceleration_x, diff_acceleration_y, diff_acceleration_z, arrival=None, alarms=()):
         """
-        Setter inn akselerasjonsdata i databasen.
+        Sender akselerasjonsdata videre til skrivetrinnet. Dataene skrives til databasen ved neste flush.
 
         Args:
             sensor_id (int): Sensorens ID.
@@ -119,278 +380,505 @@ class SensorDataCollector:
             diff_acceleration_x (float): Differensiell akselerasjon i x-retning.
             diff_acceleration_y (float): Differensiell akselerasjon i y-retning.
             diff_acceleration_z (float): Differensiell akselerasjon i z-retning.
+            arrival (float): time.monotonic() da linjen ble lest, brukes til å måle forsinkelse.
+            alarms (list): Alarmparametere som skal knyttes til målingen.
         """
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        try:
-            self.cursor.execute('''
-            INSERT INTO accelerationreadings (sensor_id, timestamp, acceleration_x, acceleration_y, acceleration_z, diff_acceleration_x, diff_acceleration_y, diff_acceleration_z)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (sensor_id, timestamp, acceleration_x, acceleration_y, acceleration_z, diff_acceleration_x, diff_acceleration_y, diff_acceleration_z))
-            self.conn.commit()
-            print('Acceleration data transferred')
-        except pymysql.MySQLError as e:
-            print(f"Error: {e}")
+        timestamp = self.timestamps([arrival])[0]
+        self.write_queue.put(('acceleration', (sensor_id, timestamp, acceleration_x, acceleration_y, acceleration_z,
+                                               diff_acceleration_x, diff_acceleration_y, diff_acceleration_z), arrival, alarms))
 
-    def insertTemperatureAlarm(self, parameter):
+    def timestamps(self, arrivals):
         """
-        Setter inn temperaturalarm i databasen.
+        Tidsstempler for målinger ut fra når de ble lest fra seriellporten.
 
         Args:
-            parameter (str): Parameter som utløste alarmen.
+            arrivals (list): time.monotonic() da hver måling ble lest, eller None for nå.
+
+        Returns:
+            list: 'YYYY-MM-DD HH:MM:SS' per måling.
         """
-        self.cursor.execute('SELECT reading_id FROM temperaturereadings ORDER BY reading_id DESC LIMIT 1;')
-        reading_id = self.cursor.fetchall()
-        try:
-            self.cursor.execute('''
-            INSERT INTO temperaturealarms (reading_id, parameter)
-            VALUES (%s, %s)
-            ''', (reading_id, parameter))
-            self.conn.commit()
-            print('Temperature ALARM transferred')
-        except pymysql.MySQLError as e:
-            print(f"Error: {e}")
+        texts = {}  # Sekund -> tekst; en blokk spenner sjelden over mer enn noen få sekunder
+        timestamps = []
+        for arrival in arrivals:
+            second = int(time.time() if arrival is None else arrival + self.clock_offset)
+            text = texts.get(second)
+            if text is None:
+                text = texts[second] = time.strftime(TIMESTAMP_FORMAT, time.localtime(second))
+            timestamps.append(text)
+        return timestamps
+
+    def temperatureAlarms(self, temperature, thresholds):
+        """
+        Sjekker en temperaturmåling mot alarmgrensene.
+
+        Args:
+            temperature (float): Temperaturmåling.
+            thresholds (tuple): (min, maks) fra ThresholdCache. None betyr ingen grense, og da sjekkes ikke målingen.
 
-    def insertAccelerationAlarm(self, parameter):
+        Returns:
+            list: Alarmparametere som skal settes inn sammen med målingen (tom hvis innenfor).
         """
-        Setter inn akselerasjonsalarm i databasen.
+        if thresholds is None:
+            return []
+        min_threshold, max_threshold = thresholds
+        if temperature > max_threshold:
+            return ["HIGH ALARM TEMPERATURE"]
+        elif temperature < min_threshold:
+            return ["LOW ALARM TEMPERATURE"]
+        log.debug("Temperature inside threshold")
+        return []
+
+    def accelerationAlarms(self, diff_accelerations, thresholds):
+        """
+        Sjekker differensiell akselerasjon per akse mot alarmgrensene.
 
         Args:
-            parameter (str): Parameter som utløste alarmen.
+            diff_accelerations (dict): Differensiell akselerasjon per akse ('x', 'y', 'z').
+            thresholds (tuple): (min, maks) fra ThresholdCache. None betyr ingen grense, og da sjekkes ikke målingen.
+
+        Returns:
+            list: Alarmparametere for alle akser utenfor grensene, i rekkefølgen x, y, z.
         """
-        self.cursor.execute('SELECT reading_id FROM accelerationreadings ORDER BY reading_id DESC LIMIT 1;')
-        reading_id = self.cursor.fetchall()
-        try:
-            self.cursor.execute('''
-            INSERT INTO accelerationalarms (reading_id, parameter)
-            VALUES (%s, %s)
-            ''', (reading_id, parameter))
-            self.conn.commit()
-            print('Acceleration ALARM transferred')
-        except pymysql.MySQLError as e:
-            print(f"Error: {e}")
+        if thresholds is None:
+            return []
+        min_threshold, max_threshold = thresholds
+        alarms = []
+        for axis, diff in diff_accelerations.items():
+            if diff > max_threshold:
+                alarms.append(f"HIGH ALARM ACCELERATION {axis.upper()}")
+            elif diff < min_threshold:
+                alarms.append(f"LOW ALARM ACCELERATION {axis.upper()}")
+            else:
+                log.debug("Acceleration %s inside threshold", axis.upper())
+        return alarms
 
-    def getSensorID(self):
+    def getSensorID(self, timeout=5):
         """
         Henter sensor-IDer fra mikrokontrolleren.
-        """
-        self.sendCommand("RETURN_DATA")
-        time.sleep(1)
-        data = self.ser.readline().decode().strip()
 
-        jsonSensorData = json.loads(data)
+        Args:
+            timeout (float): Maks antall sekunder å vente på svar.
+        """
+        jsonSensorData = self.request({"Command": "RETURN_DATA"}, lambda r: 'SensorConfiguration' in r, timeout)
 
         self.temperature_sensor_id = jsonSensorData['SensorConfiguration']['TemperatureSensor']['Sensor_id']
         self.accelerometer_id = jsonSensorData['SensorConfiguration']['Accelerometer']['Sensor_id']
-        print("SenorID found:")
-        print("temperature_sensor_id:", self.temperature_sensor_id)
-        print("accelerometer_id:", self.accelerometer_id)
-        print()
+        log.info("Sensor IDs found: temperature_sensor_id=%s, accelerometer_id=%s",
+                 self.temperature_sensor_id, self.accelerometer_id)
 
     def getAlarmThresholds(self):
         """
-        Henter alarmgrenser fra databasen.
+        Skriver ut gjeldende alarmgrenser for sensorene. Grensecachen startes i run().
         """
-        try:
-            self.cursor.execute('SELECT * FROM alarmthresholds WHERE sensor_id = %s', (self.temperature_sensor_id,))
-            temperature_thresholds = self.cursor.fetchall()
-            if temperature_thresholds:
-                self.temperature_min_threshold = temperature_thresholds[-1][3]
-                self.temperature_max_threshold = temperature_thresholds[-1][4]
-            else:
-                print("No temperature thresholds found for the given sensor ID")
-
-            self.cursor.execute('SELECT * FROM alarmthresholds WHERE sensor_id = %s', (self.accelerometer_id,))
-            acceleration_thresholds = self.cursor.fetchall()
-            if acceleration_thresholds:
-                self.acceleration_min_threshold = acceleration_thresholds[-1][3]
-                self.acceleration_max_threshold = acceleration_thresholds[-1][4]
-            else:
-                print("No acceleration thresholds found for the given sensor ID")
-
-            print("Threshold set:")
-            print(f"Temperature min/max: {self.temperature_min_threshold}/{self.temperature_max_threshold}")
-            print(f"Acceleration min/max: {self.acceleration_min_threshold}/{self.acceleration_max_threshold}")
-            print()
-        except pymysql.MySQLError as e:
-            print(f"Database error: {e}")
-        except IndexError as e:
-            print(f"Index error: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+        temperature_thresholds = self.thresholds.get(self.temperature_sensor_id, 'T')
+        acceleration_thresholds = self.thresholds.get(self.accelerometer_id, 'A')
+        if temperature_thresholds is None:
+            log.warning("No temperature thresholds found for sensor %s", self.temperature_sensor_id)
+        if acceleration_thresholds is None:
+            log.warning("No acceleration thresholds found for sensor %s", self.accelerometer_id)
+        log.info("Thresholds: temperature min/max %s, acceleration min/max %s",
+                 temperature_thresholds, acceleration_thresholds)
+
+    def handleTemperature(self, sensor_id, temperature, arrival=None):
+        """
+        Sjekker én temperaturmåling mot grensene og sender den videre til skrivetrinnet.
+        """
+        alarms = self.temperatureAlarms(temperature, self.thresholds.get(sensor_id, 'T'))
+        self.samples_parsed.inc()
+        if alarms:
+            self.alarms_raised.inc(len(alarms))
+        self.insertTemperatureData(sensor_id, temperature, arrival, alarms)
 
-    def processData(self, data):
+    def handleAcceleration(self, sensor_id, acceleration_x, acceleration_y, acceleration_z, arrival=None):
+        """
+        Regner ut differensiell akselerasjon mot forrige måling, sjekker den mot grensene og
+        sender målingen videre til skrivetrinnet.
+        """
+        diff_acceleration_x = self.acceleration_x2 - acceleration_x
+        diff_acceleration_y = self.acceleration_y2 - acceleration_y
+        diff_acceleration_z = self.acceleration_z2 - acceleration_z
+
+        self.acceleration_x2 = acceleration_x
+        self.acceleration_y2 = acceleration_y
+        self.acceleration_z2 = acceleration_z
+
+        alarms = self.accelerationAlarms({
+            'x': diff_acceleration_x,
+            'y': diff_acceleration_y,
+            'z': diff_acceleration_z
+        }, self.thresholds.get(sensor_id, 'A'))
+        self.samples_parsed.inc()
+        if alarms:
+            self.alarms_raised.inc(len(alarms))
+        self.insertAccelerationData(sensor_id, acceleration_x, acceleration_y, acceleration_z,
+                                    diff_acceleration_x, diff_acceleration_y, diff_acceleration_z, arrival, alarms)
+
+    def processData(self, data, arrival=None):
         """
         Behandler mottatt data fra sensorer, setter inn data i databasen og sjekker for alarmer.
 
         Args:
             data (str): JSON-streng med sensoravlesninger.
+            arrival (float): time.monotonic() da linjen ble lest fra seriellporten.
         """
         try:
-            dataJson = json.loads(data)
-
-            print(dataJson)
-            if "acceleration" and "temperature" in dataJson:
-                print("Acceleration and Temperature data received")
-
-                temperature_stamp = dataJson['temperature']
-                sensor_id_temp = temperature_stamp['sensor_id']
-                temperature = temperature_stamp['temperature']
-
-                self.insertTemperatureData(sensor_id_temp, temperature)
-
-                if temperature > self.temperature_max_threshold:
-                    self.insertTemperatureAlarm("HIGH ALARM TEMPERATURE")
-                elif temperature < self.temperature_min_threshold:
-                    self.insertTemperatureAlarm("LOW ALARM TEMPERATURE")
-                else:
-                    print("Temperature inside threshold")
-
-                acceleration = dataJson['acceleration']
-                sensor_id_acc = acceleration['sensor_id']
-                acceleration_x = acceleration['x']
-                acceleration_y = acceleration['y']
-                acceleration_z = acceleration['z']
-
-                diff_acceleration_x = self.acceleration_x2 - acceleration_x
-                diff_acceleration_y = self.acceleration_y2 - acceleration_y
-                diff_acceleration_z = self.acceleration_z2 - acceleration_z
-
-                self.acceleration_x2 = acceleration_x
-                self.acceleration_y2 = acceleration_y
-                self.acceleration_z2 = acceleration_z
-
-                self.insertAccelerationData(sensor_id_acc, acceleration_x, acceleration_y, acceleration_z,
-                                            diff_acceleration_x, diff_acceleration_y, diff_acceleration_z)
-
-                # Loop to check acceleration differences and insert alarms
-                diff_accelerations = {
-                    'x': diff_acceleration_x,
-                    'y': diff_acceleration_y,
-                    'z': diff_acceleration_z
-                }
-
-                for axis, diff in diff_accelerations.items():
-                    if diff > self.acceleration_max_threshold:
-                        self.insertAccelerationAlarm(f"HIGH ALARM ACCELERATION {axis.upper()}")
-                    elif diff < self.acceleration_min_threshold:
-                        self.insertAccelerationAlarm(f"LOW ALARM ACCELERATION {axis.upper()}")
-                    else:
-                        print(f"Acceleration {axis.upper()} inside threshold")
-
-            elif "acceleration" in dataJson:
-                print("Acceleration data received")
-                acceleration = dataJson['acceleration']
-                sensor_id_acc = acceleration['sensor_id']
-                acceleration_x = acceleration['x']
-                acceleration_y = acceleration['y']
-                acceleration_z = acceleration['z']
-
-                diff_acceleration_x = self.acceleration_x2 - acceleration_x
-                diff_acceleration_y = self.acceleration_y2 - acceleration_y
-                diff_acceleration_z = self.acceleration_z2 - acceleration_z
-
-                self.acceleration_x2 = acceleration_x
-                self.acceleration_y2 = acceleration_y
-                self.acceleration_z2 = acceleration_z
-
-                self.insertAccelerationData(sensor_id_acc, acceleration_x, acceleration_y, acceleration_z,
-                                            diff_acceleration_x, diff_acceleration_y, diff_acceleration_z)
-
-                # Loop to check acceleration differences and insert alarms
-                diff_accelerations = {
-                    'x': diff_acceleration_x,
-                    'y': diff_acceleration_y,
-                    'z': diff_acceleration_z
-                }
-
-                for axis, diff in diff_accelerations.items():
-                    if diff > self.acceleration_max_threshold:
-                        self.insertAccelerationAlarm(f"HIGH ALARM ACCELERATION {axis.upper()}")
-                    elif diff < self.acceleration_min_threshold:
-                        self.insertAccelerationAlarm(f"LOW ALARM ACCELERATION {axis.upper()}")
-                    else:
-                        print(f"Acceleration {axis.upper()} inside threshold")
-
-            elif "temperature" in dataJson:
-                print("Temperature data received")
-                temperature_stamp = dataJson['temperature']
-                sensor_id_temp = temperature_stamp['sensor_id']
-                temperature = temperature_stamp['temperature']
-
-                self.insertTemperatureData(sensor_id_temp, temperature)
-
-                if temperature > self.temperature_max_threshold:
-                    self.insertTemperatureAlarm("HIGH ALARM TEMPERATURE")
-                elif temperature < self.temperature_min_threshold:
-                    self.insertTemperatureAlarm("LOW ALARM TEMPERATURE")
-                else:
-                    print("Temperature inside threshold")
-            else:
-                print("no valid data received")
+            temperature, acceleration = decodeLine(data)
+        except ValueError as e:
+            log.warning("Received invalid data: %s", e)
+            self.invalid_lines.inc()
+            return
+
+        log.debug("Parsed: %s %s", temperature, acceleration)
+        if temperature is not None:
+            self.handleTemperature(*temperature, arrival)
+        if acceleration is not None:
+            self.handleAcceleration(*acceleration, arrival)
+
+    def processFrame(self, frame, arrival=None):
+        """
+        Behandler én binær ramme fra FrameDecoder på samme måte som processData.
+
+        Args:
+            frame (tuple): (type, sensor_id, tid i ms, verdi...).
+            arrival (float): time.monotonic() da rammen ble lest fra seriellporten.
+        """
+        try:
+            temperature, acceleration = decodeFrame(frame)
+        except ValueError as e:
+            log.warning("Received invalid frame: %s", e)
+            self.invalid_lines.inc()
+            return
+
+        if temperature is not None:
+            self.handleTemperature(*temperature, arrival)
+        if acceleration is not None:
+            self.handleAcceleration(*acceleration, arrival)
+
+    def processBatch(self, items):
+        """
+        Behandler en blokk med linjer og rammer samlet. Gir nøyaktig de samme radene og alarmene
+        som processData/processFrame linje for linje, men differensiell akselerasjon og alle
+        grensesjekker regnes som NumPy-arrayer, og radene sendes til skrivetrinnet som én
+        liste per tabell. Hver måling får tidsstempelet den ble lest med, som i processData.
+
+        Args:
+            items (list): (ankomsttid, linje)-par fra linjekøen. Linjen er JSON-bytes eller en
+                          ramme fra FrameDecoder.
+        """
+        temperatures = []   # (sensor_id, temperatur)
+        temperature_arrivals = []
+        accelerations = []  # (sensor_id, x, y, z)
+        acceleration_arrivals = []
+        with profiler.section('parse.decode'):
+            for arrival, line in items:
+                try:
+                    temperature, acceleration = decodeFrame(line) if isinstance(line, tuple) else decodeLine(line)
+                except ValueError as e:
+                    log.warning("Received invalid data: %s", e)
+                    self.invalid_lines.inc()
+                    continue
+                if temperature is not None:
+                    temperatures.append(temperature)
+                    temperature_arrivals.append(arrival)
+                if acceleration is not None:
+                    accelerations.append(acceleration)
+                    acceleration_arrivals.append(arrival)
+
+        if temperatures:
+            with profiler.section('parse.temperature'):
+                self.temperatureBatch(temperatures, temperature_arrivals)
+        if accelerations:
+            with profiler.section('parse.acceleration'):
+                self.accelerationBatch(accelerations, acceleration_arrivals)
+
+    def thresholdArrays(self, sensor_ids, parameter):
+        """
+        Slår opp grensene for hver måling i en blokk.
+
+        Args:
+            sensor_ids (ndarray): Sensor-ID per måling.
+            parameter (str): 'T' eller 'A'.
 
-        except json.JSONDecodeError:
-            print("Received invalid JSON")
+        Returns:
+            tuple: (min, maks) som arrayer. NaN der sensoren ikke har grense, så ingen
+                   sammenligning slår til, som når processData får None fra cachen.
+        """
+        low = np.full(len(sensor_ids), np.nan)
+        high = np.full(len(sensor_ids), np.nan)
+        for sensor_id in np.unique(sensor_ids).tolist():
+            thresholds = self.thresholds.get(sensor_id, parameter)
+            if thresholds is not None:
+                mask = sensor_ids == sensor_id
+                low[mask], high[mask] = thresholds
+        return low, high
+
+    def temperatureBatch(self, temperatures, arrivals):
+        """
+        Sjekker en blokk med temperaturer mot grensene og sender dem til skrivetrinnet.
 
-    def stop(self):
+        Args:
+            temperatures (list): (sensor_id, temperatur) per måling.
+            arrivals (list): Ankomsttid per måling.
+        """
+        sensor_ids = np.array([sensor_id for sensor_id, _ in temperatures])
+        values = np.array([temperature for _, temperature in temperatures], dtype=float)
+        with profiler.section('parse.thresholds'):
+            low, high = self.thresholdArrays(sensor_ids, 'T')
+            above = values > high
+            below = ~above & (values < low)
+
+        alarms = [()] * len(temperatures)
+        alarm_indexes = np.flatnonzero(above | below).tolist()
+        for index in alarm_indexes:
+            alarms[index] = ["HIGH ALARM TEMPERATURE" if above[index] else "LOW ALARM TEMPERATURE"]
+        self.samples_parsed.inc(len(temperatures))
+        self.alarms_raised.inc(len(alarm_indexes))
+        rows = [(sensor_id, timestamp, temperature)
+                for (sensor_id, temperature), timestamp in zip(temperatures, self.timestamps(arrivals))]
+        self.write_queue.put(('temperatures', rows, arrivals, alarms))
+
+    def accelerationBatch(self, accelerations, arrivals):
+        """
+        Regner ut differensiell akselerasjon for en blokk, sjekker den mot grensene og sender
+        radene til skrivetrinnet. Forrige måling fra forrige blokk (acceleration_x2 osv.) brukes
+        for første rad, og siste måling tas vare på til neste blokk.
+
+        Args:
+            accelerations (list): (sensor_id, x, y, z) per måling.
+            arrivals (list): Ankomsttid per måling.
+        """
+        sensor_ids = np.array([row[0] for row in accelerations])
+        values = np.array([row[1:] for row in accelerations], dtype=float)
+        previous = np.array([[self.acceleration_x2, self.acceleration_y2, self.acceleration_z2]], dtype=float)
+        # diff = forrige - nåværende, som i handleAcceleration
+        diffs = -np.diff(np.vstack((previous, values)), axis=0)
+        self.acceleration_x2, self.acceleration_y2, self.acceleration_z2 = accelerations[-1][1:]
+
+        with profiler.section('parse.thresholds'):
+            low, high = self.thresholdArrays(sensor_ids, 'A')
+            above = diffs > high[:, None]
+            below = ~above & (diffs < low[:, None])
+
+        alarms = [()] * len(accelerations)
+        for index in np.flatnonzero((above | below).any(axis=1)).tolist():
+            alarms[index] = [f"{'HIGH' if above[index, axis] else 'LOW'} ALARM ACCELERATION {name}"
+                             for axis, name in enumerate('XYZ') if above[index, axis] or below[index, axis]]
+        self.samples_parsed.inc(len(accelerations))
+        self.alarms_raised.inc(int((above | below).sum()))
+        rows = [(sensor_id, timestamp, x, y, z, diff_x, diff_y, diff_z)
+                for (sensor_id, x, y, z), (diff_x, diff_y, diff_z), timestamp
+                in zip(accelerations, diffs.tolist(), self.timestamps(arrivals))]
+        self.write_queue.put(('accelerations', rows, arrivals, alarms))
+
+    def stop(self, timeout=5):
         """
         Stopper datainnsamling og sender stoppkommando til mikrokontrolleren.
+        Venter på bekreftelsen (målinger som kommer før den, blir lagret), og så til tolke- og
+        skrivetrinnet har tømt køene og skrivebufferen.
+
+        Args:
+            timeout (float): Maks antall sekunder å vente på bekreftelsen.
         """
-        self.running = False
-        self.sendCommandStop()
-        self.thread = None
+        if self.threads:
+            try:
+                self.request({"Command": "STOP"}, lambda r: r.get('Response') == STOPPED, timeout)
+            except TimeoutError as e:
+                log.warning("%s", e)
+            self.stopPipeline()
+        else:
+            if not self.shared_writer:
+                self.write_buffer.flush()
+            self.sendCommandStop()
+        if self.rollup is not None:
+            self.rollup.stop()
+        if not self.shared_thresholds:
+            self.thresholds.stop()
+        log.info("Pipeline stats: %s", self.pipelineStats())
 
-    def run(self):
+    def startPipeline(self):
         """
-        Starter datainnsamling ved å sende nødvendige kommandoer til mikrokontrolleren og opprette en tråd for datainnsamling.
+        Starter trådene for lesing, tolking og skriving.
         """
         self.running = True
-        self.conn.ping(reconnect=True)
-        print('run')
+        self.line_reader.reset()
+        self.line_queue.reopen()
+        self.threads = [
+            threading.Thread(target=self.collectData, name=f'reader {self.port}'),
+            threading.Thread(target=self.parseData, name=f'parser {self.port}'),
+        ]
+        if not self.shared_writer:
+            self.write_queue.reopen()
+            self.threads.append(threading.Thread(target=self.writeData, name='writer'))
+        for thread in self.threads:
+            thread.start()
+
+    def stopPipeline(self):
+        """
+        Stopper lesetrinnet og venter til tolke- og skrivetrinnet er ferdige.
+        """
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
 
-        self.sendCommandStop()
-        time.sleep(1)
-        response = self.ser.readline().decode().strip()
-        while response != '{"Response":"Data gathering stopped."}':
-            response = self.ser.readline().decode().strip()
-            print('WRONG RESPONSE: ',response)
+    def run(self, progress=print, timeout=5):
+        """
+        Starter datainnsamling ved å sende nødvendige kommandoer til mikrokontrolleren og starte
+        trådene for lesing, tolking og skriving.
 
-        self.setFrequency(self.frequency)
-        time.sleep(1)
-        print(self.ser.readline().decode().strip())
-        time.sleep(1)
-        self.getSensorID()
+        Trådene startes før håndtrykket: lesetrinnet sender svar på kommandoene til request() og
+        målinger som kommer innimellom til tolkeren, så ingenting kastes. Hvert steg venter bare
+        til svaret kommer (maks timeout sekunder), i stedet for faste pauser.
 
-        self.getAlarmThresholds()
+        Args:
+            progress (callable): Mottar statusmeldinger for hvert steg.
+            timeout (float): Maks ventetid i sekunder per svar.
 
-        self.sendCommandStart()
-        print(self.ser.readline().decode().strip())
-        time.sleep(1)
+        Raises:
+            TimeoutError: Mikrokontrolleren svarte ikke. Trådene er da stoppet igjen.
+            serial.SerialException: Seriellporten kunne ikke åpnes.
+        """
+        self.open(progress)
+        if not self.shared_writer:
+            progress("Connecting to database")
+            self.write_buffer.connect()
+        self.thresholds.start()
+        log.info("Starting collection on %s", self.port)
+
+        self.startPipeline()
+        try:
+            progress("Stopping data gathering")
+            # Mikrokontrolleren starter på nytt når porten åpnes, så STOP sendes til den svarer
+            self.request({"Command": "STOP"}, lambda r: r.get('Response') == STOPPED, timeout, resend=0.5)
+
+            progress(f"Setting frequency to {self.frequency}")
+            self.setFrequency(self.frequency, timeout)
+
+            if self.data_baudrate and self.data_baudrate != self.baudrate:
+                progress(f"Switching to {self.data_baudrate} baud")
+                self.setBaudrate(self.data_baudrate, timeout)
+            if self.binary:
+                progress("Requesting binary framing")
+                self.enableBinary(timeout)
+
+            progress("Reading sensor IDs")
+            self.getSensorID(timeout)
+            self.getAlarmThresholds()
+
+            progress("Starting data gathering")
+            response = self.request({"Command": "START"}, lambda r: 'Response' in r, timeout)
+            log.info("Device: %s", response['Response'])
+        except Exception:
+            self.stopPipeline()
+            raise
+
+        if self.rollup is not None:
+            self.rollup.start()
+
+    def pipelineStats(self):
+        """
+        Returnerer statistikk for innsamlingen: linjer per sekund fra leseren, dybde og tellere
+        for køene, og forsinkelse fra seriellport til commit.
 
-        self.thread = threading.Thread(target=self.collectData)
-        self.thread.start()
+        Returns:
+            dict: 'reader' (SerialLineReader.stats), 'queues' (StageQueue.stats per kø)
+                  og 'writer' (WriteBuffer.stats, None med delt skrivekø).
+        """
+        return {
+            'reader': self.line_reader.stats() if self.line_reader is not None else None,
+            'queues': [self.line_queue.stats(), self.write_queue.stats()],
+            'writer': self.write_buffer.stats() if self.write_buffer is not None else None,
+        }
 
     def collectData(self):
         """
-        Samler inn data fra sensorer i en løkke og behandler dataene.
+        Lesetrinnet: henter linjer fra seriellporten og legger dem i linjekøen.
+        Gjør ikke noe annet, slik at UART-bufferen tømmes selv om databasen er treg.
+        Er linjekøen full, forkastes linjen og telles i stedet for at lesingen stopper opp.
+        Svar på kommandoer legges i self.responses i stedet, der request() venter på dem.
+
+        Lesingen blokkerer til data kommer (maks portens timeout) i stedet for å sove et fast
+        intervall, og alle linjer som har kommet legges i køen med en gang.
         """
         try:
             while self.running:
-                if self.ser.in_waiting > 0:
-                    data = self.ser.readline().decode().strip()
-                    print(f"Received: {data}")
-                    self.processData(data)
-
-                print('sleep')
-                time.sleep(self.interval)
-                print()
-                print()
+                # Inkluderer ventetiden på data, så trinnet viser også hvor lenge porten er stille
+                with profiler.section('read.serial'):
+                    lines = self.line_reader.readLines()
+                if not lines:
+                    continue
+                with profiler.section('read.route'):
+                    self.lines_received.inc(len(lines))
+                    for arrival, line in lines:
+                        if isinstance(line, bytes) and self.isResponse(line):
+                            self.responses_received.inc()
+                            self.responses.put(line)
+                        else:
+                            self.line_queue.put((arrival, line))
         except KeyboardInterrupt:
             self.sendCommandStop()
-            print("Program terminated")
+            log.info("Program terminated")
         finally:
+            self.line_queue.close()
             self.ser.close()
-            self.conn.close()
 
+    def parseData(self):
+        """
+        Tolketrinnet: dekoder linjer fra linjekøen, sjekker alarmgrenser og sender
+        målinger og alarmer videre til skrivekøen. Med parse_block samles linjer i opptil
+        parse_wait_ms (eller til det er parse_block linjer) og behandles samlet med processBatch.
+
+        Linjer med feil form telles i invalid_lines og hoppes over. Skulle en blokk likevel
+        feile, logges feilen og blokken telles som ugyldig, men tråden fortsetter; ellers ville
+        skrivekøen lukkes mens leseren fortsatt fyller linjekøen.
+        """
+        try:
+            while True:
+                item = self.line_queue.get()
+                if item is None:
+                    break
+                self.clock_offset = time.time() - time.monotonic()
+                if self.parse_block:
+                    block = [item]
+                    deadline = time.monotonic() + self.parse_wait
+                    while len(block) < self.parse_block:
+                        item = self.line_queue.poll(max(0.0, deadline - time.monotonic()))
+                        if item is None:
+                            break
+                        block.append(item)
+                    start = time.monotonic()
+                    if block[0][0] is not None:
+                        self.queue_wait.observe(1000 * (start - block[0][0]))
+                    try:
+                        self.processBatch(block)
+                    except Exception:
+                        log.exception("Failed to process a block of %d lines", len(block))
+                        self.invalid_lines.inc(len(block))
+                    self.parse_time.observe(1000 * (time.monotonic() - start))
+                    continue
+                arrival, line = item
+                try:
+                    with profiler.section('parse.line'):
+                        log.debug("Received: %s", line)
+                        if isinstance(line, tuple):
+                            self.processFrame(line, arrival)
+                        else:
+                            self.processData(line.decode(errors='replace'), arrival)
+                except Exception:
+                    log.exception("Failed to process line %r", line)
+                    self.invalid_lines.inc()
+        finally:
+            if not self.shared_writer:
+                self.write_queue.close()
+
+    def writeData(self):
+        """
+        Skrivetrinnet: eier databaseforbindelsen og skriver målinger og alarmer i bolker.
+        """
+        try:
+            self.write_buffer.drainQueue(self.write_queue)
+        finally:
+            self.db.close()
 
 
 if __name__ == "__main__":
@@ -398,9 +886,10 @@ if __name__ == "__main__":
 
     frequency = 1
 
-    collector = SensorDataCollector(port='COM5', frequency=frequency)
+    setup_logging()
+    metrics.serve()  # http://127.0.0.1:9108/metrics
+    collector = SensorDataCollector(port=DEFAULT_PORT, frequency=frequency)
 
-    time.sleep(5)
     #collector.sendCommandStart()
 
     collector.run()
@@ -3,30 +3,126 @@
 
 
 import time
-import mysql.connector  # Importerer MySQL-connektoren
+from collections import namedtuple
+from Storage import open_backend  # Felles database-backend (MySQL eller SQLite)
+from IdGaps import GapTracker
+from Rollup import fetch_series
+
+# Siste verdier for alle sensorer fra én spørring (se HentData.snapshot):
+#   temperature:  {sensor_id: (reading_id, temperature)}
+#   acceleration: {sensor_id: (reading_id, diff_x, diff_y, diff_z)}
+#   thresholds:   {(sensor_id, 'T' eller 'A'): (threshold_id, min_value, max_value)}
+Snapshot = namedtuple('Snapshot', ['temperature', 'acceleration', 'thresholds'])
+
+# Én rundtur: siste måling per sensor via indeksen (sensor_id, timestamp), og gjeldende
+# grense per sensor og parameter via indeksen (sensor_id, parameter, threshold_id).
+# Sensorene hentes fra målingene selv, ikke fra SENSORS, så også sensorer som ikke er
+# registrert kommer med. De rekursive CTE-ene hopper fra sensor_id til neste i indeksen
+# (ett oppslag per sensor) i stedet for å lese hele indeksen med DISTINCT.
+SNAPSHOT_SQL = """
+    WITH RECURSIVE
+    temperature_sensors (sensor_id) AS (
+        SELECT MIN(sensor_id) FROM temperaturereadings
+        UNION ALL
+        SELECT (SELECT MIN(sensor_id) FROM temperaturereadings WHERE sensor_id > s.sensor_id)
+        FROM temperature_sensors s WHERE s.sensor_id IS NOT NULL),
+    acceleration_sensors (sensor_id) AS (
+        SELECT MIN(sensor_id) FROM accelerationreadings
+        UNION ALL
+        SELECT (SELECT MIN(sensor_id) FROM accelerationreadings WHERE sensor_id > s.sensor_id)
+        FROM acceleration_sensors s WHERE s.sensor_id IS NOT NULL)
+    SELECT 'T', s.sensor_id, r.reading_id, r.temperature, NULL, NULL
+    FROM temperature_sensors s JOIN temperaturereadings r ON r.reading_id = (
+        SELECT reading_id FROM temperaturereadings WHERE sensor_id = s.sensor_id
+        ORDER BY timestamp DESC, reading_id DESC LIMIT 1)
+    UNION ALL
+    SELECT 'A', s.sensor_id, r.reading_id, r.diff_acceleration_x, r.diff_acceleration_y, r.diff_acceleration_z
+    FROM acceleration_sensors s JOIN accelerationreadings r ON r.reading_id = (
+        SELECT reading_id FROM accelerationreadings WHERE sensor_id = s.sensor_id
+        ORDER BY timestamp DESC, reading_id DESC LIMIT 1)
+    UNION ALL
+    SELECT 'LT', s.sensor_id, a.threshold_id, a.min_value, a.max_value, NULL
+    FROM (SELECT DISTINCT sensor_id FROM alarmthresholds) s JOIN alarmthresholds a ON a.threshold_id = (
+        SELECT MAX(threshold_id) FROM alarmthresholds WHERE sensor_id = s.sensor_id AND parameter IN ('T', 'temp'))
+    UNION ALL
+    SELECT 'LA', s.sensor_id, a.threshold_id, a.min_value, a.max_value, NULL
+    FROM (SELECT DISTINCT sensor_id FROM alarmthresholds) s JOIN alarmthresholds a ON a.threshold_id = (
+        SELECT MAX(threshold_id) FROM alarmthresholds WHERE sensor_id = s.sensor_id AND parameter IN ('A', 'accel'))
+"""
+
+def siste(readings):
+    """
+    Finner sensoren med den nyeste målingen i en av ordbøkene fra snapshot().
+
+    :param readings: Snapshot.temperature eller Snapshot.acceleration.
+    :return: (sensor_id, måling), eller None hvis ordboken er tom.
+    """
+    if not readings:
+        return None
+    return max(readings.items(), key=lambda item: item[1][0])
+
+
+def gjeldende_grense(thresholds, sensor_id, parameter):
+    """
+    Finner gjeldende grense for en sensor. Har sensoren ingen egen grense, brukes den nyeste
+    grensen for parameteren uansett sensor (slik SensorConfig lagrer dem).
+
+    :param thresholds: Snapshot.thresholds.
+    :param sensor_id: Sensorens ID.
+    :param parameter: 'T' eller 'A'.
+    :return: (min_value, max_value), eller None hvis det ikke finnes noen grense.
+    """
+    threshold = thresholds.get((sensor_id, parameter))
+    if threshold is None:
+        candidates = [value for (_, param), value in thresholds.items() if param == parameter]
+        if not candidates:
+            return None
+        threshold = max(candidates)
+    return threshold[1:]
+
 
 class HentData:
     """
-    Klasse for å hente data fra en MySQL-database.
+    Klasse for å hente data fra databasen (MySQL eller SQLite, se Storage).
     """
 
-    def __init__(self):
+    def __init__(self, backend=None, hull_sekunder=60, utsett_tilkobling=False):
         """
-        Initialiserer tilkobling til MySQL-databasen og oppretter en cursor.
+        Initialiserer tilkobling til databasen.
+
+        :param backend: StorageBackend som skal brukes. Standard er open_backend().
+        :param hull_sekunder: Hvor lenge hent_siden() spør etter hull i reading_id som kan bli fylt
+                              av målinger som committes sent (flere skrivere, avspilt spool).
+        :param utsett_tilkobling: Ikke koble til her, men ved første koble_til(). Brukes av GUI-er
+                                  som henter data i en egen tråd, så vinduet ikke venter på databasen.
         """
+        self.backend = backend if backend is not None else open_backend()
+        self.db = None  # Satt til backend når forbindelsen er oppe
+        self.hull_sekunder = hull_sekunder
+        self.hull = {}  # Tabell -> GapTracker med hull under siste id som er lest
+        if utsett_tilkobling:
+            return
         try:
-            self.db = mysql.connector.connect(
-                host="localhost",  # Kobler til MySQL-serveren på localhost
-                user="root",  # Brukernavn for databasen
-                password="root",  # Passord for databasen
-                database="sensordata",  # Spesifiserer databasen som skal brukes
-                auth_plugin='mysql_native_password'  # Spesifiserer autentiseringsplugin
-            )
-            self.cursor = self.db.cursor(dictionary=True)  # Oppretter en cursor for å utføre spørringer
-        except mysql.connector.Error as err:
+            self.koble_til()
+        except self.backend.Error as err:
             print(f"Error: {err}")  # Viser feilmelding hvis tilkobling mislykkes
-            self.db = None
-            self.cursor = None
+
+    def koble_til(self):
+        """
+        Kobler til databasen hvis forbindelsen mangler (ved oppstart eller etter koble_fra()).
+
+        :raises backend.Error: Hvis databasen ikke kan nås.
+        """
+        if self.db is None:
+            self.backend.connect()
+            self.db = self.backend
+
+    def koble_fra(self):
+        """
+        Lukker en forbindelse som har feilet, så neste koble_til() åpner en ny.
+        """
+        self.backend.close()
+        self.db = None
 
     def hent_temperatur(self):
         """
@@ -34,13 +130,11 @@ class HentData:
 
         :return: Den siste temperaturavlesningen eller None hvis spørringen mislykkes.
         """
-        if self.cursor:  # Sjekker om tilkobling til databasen er vellykket
-            print('cursor')
-            self.cursor.execute(
-                "SELECT temperature FROM sensordata.temperaturereadings ORDER BY reading_id DESC LIMIT 1;"
-            )  # Utfører SQL-spørring
-
-            temprature = self.cursor.fetchall()  # Henter alle resultatene fra spørringen
+        if self.db:  # Sjekker om tilkobling til databasen er vellykket
+            temprature = self.db.query(
+                "SELECT temperature FROM temperaturereadings ORDER BY reading_id DESC LIMIT 1;",
+                as_dict=True
+            )  # Utfører SQL-spørring og henter alle resultatene
             return temprature
         return None  # Returnerer None hvis spørringen mislykkes
 
@@ -50,12 +144,11 @@ class HentData:
 
         :return: Den siste differensielle akselerasjonsavlesningen eller None hvis spørringen mislykkes.
         """
-        if self.cursor:  # Sjekker om tilkobling til databasen er vellykket
-            self.cursor.execute(
-                "SELECT diff_acceleration_x, diff_acceleration_y, diff_acceleration_z FROM sensordata.accelerationreadings ORDER BY reading_id DESC LIMIT 1;"
-            )  # Utfører SQL-spørring
-
-            diffacc = self.cursor.fetchall()  # Henter alle resultatene fra spørringen
+        if self.db:  # Sjekker om tilkobling til databasen er vellykket
+            diffacc = self.db.query(
+                "SELECT diff_acceleration_x, diff_acceleration_y, diff_acceleration_z FROM accelerationreadings ORDER BY reading_id DESC LIMIT 1;",
+                as_dict=True
+            )  # Utfører SQL-spørring og henter alle resultatene
             return diffacc
         return None
 
@@ -65,12 +158,12 @@ class HentData:
 
         :return: De siste temperaturgrenseverdiene eller None hvis spørringen mislykkes.
         """
-        if self.cursor:
-            self.cursor.execute(
-                """SELECT min_value, max_value FROM sensordata.alarmthresholds WHERE parameter = "T" ORDER BY threshold_id DESC LIMIT 1;"""
+        if self.db:
+            threshold_temp = self.db.query(
+                """SELECT min_value, max_value FROM alarmthresholds WHERE parameter = 'T' ORDER BY threshold_id DESC LIMIT 1;""",
+                as_dict=True
             )
 
-            threshold_temp = self.cursor.fetchall()
             self.db.commit()
             return threshold_temp
         return None
@@ -81,38 +174,170 @@ class HentData:
 
         :return: De siste akselerasjonsgrenseverdiene eller None hvis spørringen mislykkes.
         """
-        if self.cursor:
-            self.cursor.execute(
-                """SELECT max_value FROM sensordata.alarmthresholds WHERE parameter = "A" ORDER BY threshold_id DESC LIMIT 1;"""
+        if self.db:
+            threshold_acc = self.db.query(
+                """SELECT max_value FROM alarmthresholds WHERE parameter = 'A' ORDER BY threshold_id DESC LIMIT 1;""",
+                as_dict=True
             )
 
-            threshold_acc = self.cursor.fetchall()
             self.db.commit()
             return threshold_acc
         return None
 
-    def return_data(self):
+    def snapshot(self):
         """
-        Henter og returnerer den siste temperatur- og akselerasjonsavlesningen fra databasen.
+        Henter siste temperatur, siste differensielle akselerasjon og gjeldende grenser for alle
+        sensorer i én spørring.
 
-        :return: En ordbok med temperatur og akselerasjonsdata.
+        :return: Snapshot med kompakte tupler per sensor, eller None hvis spørringen mislykkes.
         """
-        diff_acceleartion = self.hent_diffacc()
-        print(diff_acceleartion)
+        if not self.db:
+            return None
+        rows = self.db.query(SNAPSHOT_SQL)
+        self.db.commit()  # Avslutter lesetransaksjonen så neste kall ser nye målinger
 
-        diff_acceleration_x = diff_acceleartion[0]['diff_acceleration_x']
-        diff_acceleration_y = diff_acceleartion[0]['diff_acceleration_y']
-        diff_acceleration_z = diff_acceleartion[0]['diff_acceleration_z']
+        snapshot = Snapshot({}, {}, {})
+        for kind, sensor_id, row_id, a, b, c in rows:
+            if kind == 'T':
+                snapshot.temperature[sensor_id] = (row_id, a)
+            elif kind == 'A':
+                snapshot.acceleration[sensor_id] = (row_id, a, b, c)
+            else:
+                snapshot.thresholds[(sensor_id, kind[1])] = (row_id, a, b)
+        return snapshot
 
-        temperatur = self.hent_temperatur()
-        temperatur = temperatur[0]['temperature']
+    def hent_siden(self, siste_temp_id=None, siste_acc_id=None, temp_sensor=None, acc_sensor=None, maks=10000, historikk=100):
+        """
+        Henter alle målinger som er kommet siden forrige kall, som kolonnelister.
+
+        Spørringene leser et intervall av primærnøkkelen (reading_id > siste id), så de trenger
+        ingen sortering. Kalleren sender inn siste_temp_id/siste_acc_id fra forrige resultat;
+        da kommer hver måling nøyaktig én gang uansett hvor ofte det måles.
+
+        Hull i reading_id under siste id (en annen skriver eller spoolen har ikke committet ennå)
+        spørres etter igjen ved hvert kall i hull_sekunder. Målinger som dukker opp der, kommer
+        med i neste resultat, sortert på reading_id sammen med de nye.
+
+        :param siste_temp_id: siste_temp_id fra forrige kall. None gir de historikk nyeste målingene.
+        :param siste_acc_id: siste_acc_id fra forrige kall.
+        :param temp_sensor: Ta bare med temperaturer fra denne sensoren (None = alle).
+        :param acc_sensor: Ta bare med akselerasjoner fra denne sensoren (None = alle).
+        :param maks: Maks antall rader som leses per tabell per kall. Resten kommer ved neste kall.
+        :param historikk: Antall rader som hentes første gang.
+        :return: Ordbok med 'temperature' (reading_id, timestamp, temperature) og 'acceleration'
+                 (reading_id, timestamp, x, y, z) som kolonnelister, og 'siste_temp_id'/'siste_acc_id'
+                 til neste kall. None hvis spørringen mislykkes.
+        """
+        if not self.db:
+            return None
+        temperature, siste_temp_id = self._hent_nye(
+            'temperaturereadings', ['temperature'], ['temperature'], siste_temp_id, temp_sensor, maks, historikk)
+        acceleration, siste_acc_id = self._hent_nye(
+            'accelerationreadings', ['diff_acceleration_x', 'diff_acceleration_y', 'diff_acceleration_z'], ['x', 'y', 'z'],
+            siste_acc_id, acc_sensor, maks, historikk)
+        self.db.commit()
+        return {
+            "temperature": temperature,
+            "acceleration": acceleration,
+            "siste_temp_id": siste_temp_id,
+            "siste_acc_id": siste_acc_id
+        }
+
+    def _hent_nye(self, table, columns, names, siste_id, sensor_id, maks, historikk):
+        """
+        :return: (kolonnelister, siste reading_id som er lest)
+        """
+        select = f"SELECT reading_id, sensor_id, timestamp, {', '.join(columns)} FROM {table}"
+        if siste_id is not None:
+            # Bare primærnøkkelen i WHERE; med sensor_id i tillegg kan databasen velge
+            # sensorindeksen og lese hele sensorens historikk
+            sene = self._hent_sene(table, select)
+            rows = self.db.query(select + f" WHERE reading_id > %s ORDER BY reading_id LIMIT {int(maks)}", (siste_id,))
+            self.hull.setdefault(table, GapTracker(self.hull_sekunder)).add_between(siste_id, [row[0] for row in rows])
+            if rows:
+                siste_id = rows[-1][0]
+            rows = sorted(sene + rows) if sene else rows
+        elif sensor_id is not None:
+            rows = self.db.query(select + f" WHERE sensor_id = %s ORDER BY timestamp DESC, reading_id DESC LIMIT {int(historikk)}",
+                                 (sensor_id,))
+            rows.reverse()
+        else:
+            rows = self.db.query(select + f" ORDER BY reading_id DESC LIMIT {int(historikk)}")
+            rows.reverse()
+        if rows and siste_id is None:
+            siste_id = rows[-1][0]
+        if sensor_id is not None:
+            rows = [row for row in rows if row[1] == sensor_id]
+
+        names = ['reading_id', 'timestamp'] + names
+        if not rows:
+            return {name: [] for name in names}, siste_id
+        columns = list(zip(*rows))
+        del columns[1]  # sensor_id
+        return {name: list(column) for name, column in zip(names, columns)}, siste_id
+
+    def _hent_sene(self, table, select):
+        """
+        Henter målinger som er committet i hull under siste id som er lest.
+
+        :return: Radene, sortert på reading_id.
+        """
+        hull = self.hull.get(table)
+        if not hull:
+            return []
+        hull.expire()
+        rows = []
+        for where, params in hull.queries():
+            rows += self.db.query(select + f" WHERE {where}", params)
+        rows.sort()
+        hull.found([row[0] for row in rows])
+        return rows
+
+    def hent_historikk(self, sensor_id, metrics, start, end, max_points=2000):
+        """
+        Henter historikk for ett tidsintervall fra databasen, fra rollup-tabellene når
+        intervallet er langt (se Rollup.fetch_series).
+
+        :param sensor_id: Sensorens ID.
+        :param metrics: Kolonnenavn, f.eks. ['temperature'] eller ['diff_acceleration_x', ...].
+        :param start: Start på intervallet (datetime).
+        :param end: Slutt på intervallet (datetime).
+        :param max_points: Maks antall punkter per serie.
+        :return: Ordbok metrikk -> serie fra fetch_series, eller None hvis spørringen mislykkes.
+        """
+        if not self.db:
+            return None
+        history = {}
+        for metric in metrics:
+            series = fetch_series(self.db, sensor_id, metric, start, end, max_points=max_points)
+            if not series['timestamp'] and series['resolution']:
+                # Rollups er ikke aggregert for intervallet (aggregatoren kjører ikke); bruk rådata
+                series = fetch_series(self.db, sensor_id, metric, start, end, max_points=max_points, rollups=False)
+            history[metric] = series
         self.db.commit()
+        return history
+
+    def return_data(self):
+        """
+        Henter og returnerer den siste temperatur- og akselerasjonsavlesningen fra databasen.
+
+        :return: En ordbok med temperatur og akselerasjonsdata, eller None hvis det ikke finnes data.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        temperatur = siste(snapshot.temperature)
+        diff_acceleration = siste(snapshot.acceleration)
+        if temperatur is None or diff_acceleration is None:
+            return None
 
+        _, (_, temperature) = temperatur
+        _, (_, x, y, z) = diff_acceleration
         return {
-            "temperature": temperatur,
-            "x": diff_acceleration_x,
-            "y": diff_acceleration_y,
-            "z": diff_acceleration_z
+            "temperature": temperature,
+            "x": x,
+            "y": y,
+            "z": z
         }
 
 if __name__ == "__main__":
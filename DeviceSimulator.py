@@ -0,0 +1,206 @@
+import argparse
+import json
+import math
+import os
+import random
+import select
+import threading
+import time
+import tty
+import Framing
+
+
+class DeviceSimulator:
+    """
+    Simulert mikrokontroller på en pseudoterminal (pty), for lasttesting uten maskinvare.
+
+    Simulatoren svarer på de samme kommandoene som den ekte enheten (STOP, START, RETURN_DATA og
+    GatherFreq) og sender målinger som JSON-linjer med valgt frekvens så lenge innsamlingen går.
+    Den forstår også BINARY og Baud, og sender da binære rammer (se Framing); baudraten ignoreres.
+    port er stien til pty-en (f.eks. /dev/pts/3) og kan åpnes med serial.Serial som en vanlig
+    seriellport. Fungerer bare på Linux og macOS.
+
+    Målingene sendes i takt med klokken: alle som er forfalt siden forrige runde skrives i ett
+    write-kall, så frekvensen holdes også i kHz-området. Det er ingen baudrate på en pty, så
+    simulatoren er ikke begrenset av 9600 baud slik den ekte enheten er.
+
+    Kjøres også som eget program, slik at CPU-bruken ikke blandes med innsamlingens:
+
+        python DeviceSimulator.py --temperature-every 10 --alarm-every 1000
+    """
+
+    def __init__(self, temperature_sensor_id=1, accelerometer_id=2, frequency=1, boot_delay=0.0,
+                 temperature_every=1, alarm_every=0, seed=None):
+        """
+        Args:
+            temperature_sensor_id (int): Sensor-ID som rapporteres for temperatursensoren.
+            accelerometer_id (int): Sensor-ID som rapporteres for akselerometeret.
+            frequency (float): Målinger per sekund før GatherFreq er mottatt.
+            boot_delay (float): Sekunder etter start der kommandoer ignoreres, som når en
+                                Arduino starter på nytt etter at porten er åpnet.
+            temperature_every (int): Temperatur tas med i hver n-te linje; de andre har bare
+                                     akselerasjon. 1 gir temperatur og akselerasjon i alle linjer.
+            alarm_every (int): Hver n-te måling får en verdi langt utenfor normalen, så alarmveien
+                               også belastes. 0 gir ingen slike.
+            seed (int): Frø for støyen, for repeterbare kjøringer.
+        """
+        self.temperature_sensor_id = temperature_sensor_id
+        self.accelerometer_id = accelerometer_id
+        self.frequency = frequency
+        self.boot_delay = boot_delay
+        self.temperature_every = max(1, temperature_every)
+        self.alarm_every = alarm_every
+        self.random = random.Random(seed)
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.gathering = False
+        self.binary = False
+        self.sent = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        Starter simulatoren.
+
+        Returns:
+            str: Stien til pty-en som innsamlingen skal åpne.
+        """
+        self.running = True
+        self.booted = time.monotonic() + self.boot_delay
+        self.thread = threading.Thread(target=self.loop, name=f'simulator {self.port}', daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def write(self, message):
+        os.write(self.master, json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def handle(self, message):
+        """
+        Svarer på én kommando fra innsamlingen.
+
+        Args:
+            message (dict): Den tolkede kommandoen.
+        """
+        if time.monotonic() < self.booted:
+            return
+        command = message.get('Command')
+        if command == 'BINARY':
+            self.write({"Response": "Binary framing enabled."})
+            self.binary = True
+        elif 'Baud' in message:
+            self.write({"Response": f"Baud rate set to {message['Baud']}."})
+        elif command == 'STOP':
+            self.gathering = False
+            self.write({"Response": "Data gathering stopped."})
+        elif command == 'START':
+            self.gathering = True
+            self.started = time.monotonic()
+            self.sent_since_start = 0
+            self.write({"Response": "Data gathering started."})
+        elif command == 'RETURN_DATA':
+            self.write({"SensorConfiguration": {
+                "TemperatureSensor": {"Sensor_id": self.temperature_sensor_id},
+                "Accelerometer": {"Sensor_id": self.accelerometer_id},
+            }})
+        elif 'GatherFreq' in message:
+            self.frequency = message['GatherFreq']
+            self.write({"Response": f"Gather frequency set to {self.frequency} Hz."})
+
+    def sample(self, n):
+        """
+        Lager måling nummer n som én JSON-linje, uten linjeskift.
+        """
+        t = n / self.frequency
+        spike = 50 if self.alarm_every and n % self.alarm_every == 0 else 0
+        noise = self.random.gauss
+        acceleration = (f'"acceleration":{{"sensor_id":{self.accelerometer_id},'
+                        f'"x":{math.sin(t) + noise(0, 0.05) + spike:.3f},'
+                        f'"y":{math.cos(t) + noise(0, 0.05):.3f},'
+                        f'"z":{9.81 + noise(0, 0.05):.3f}}}')
+        if n % self.temperature_every:
+            return '{' + acceleration + '}'
+        temperature = 20 + 2 * math.sin(t / 60) + noise(0, 0.1) + spike
+        return (f'{{"temperature":{{"sensor_id":{self.temperature_sensor_id},"temperature":{temperature:.2f}}},'
+                + acceleration + '}')
+
+    def frames(self, n):
+        """
+        Lager måling nummer n som binære rammer, med samme verdier som sample().
+        """
+        line = json.loads(self.sample(n))
+        device_ms = int(1000 * n / self.frequency) & 0xffffffff
+        frames = b''
+        if 'temperature' in line:
+            frames += Framing.encode(Framing.TEMPERATURE, self.temperature_sensor_id, device_ms,
+                                     line['temperature']['temperature'])
+        acceleration = line['acceleration']
+        return frames + Framing.encode(Framing.ACCELERATION, self.accelerometer_id, device_ms,
+                                       acceleration['x'], acceleration['y'], acceleration['z'])
+
+    def loop(self):
+        pending = b''
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.005)
+            if readable:
+                pending += os.read(self.master, 4096)
+                # Kommandoene sendes uten linjeskift, så de skilles på avsluttende }
+                while b'}' in pending:
+                    message, pending = pending.split(b'}', 1)
+                    try:
+                        self.handle(json.loads(message + b'}'))
+                    except json.JSONDecodeError:
+                        pass
+
+            if self.gathering:
+                # Send alle målinger som er forfalt siden start, i ett write-kall
+                due = int((time.monotonic() - self.started) * self.frequency) - self.sent_since_start
+                if due > 0:
+                    due = min(due, 1000)  # Henger simulatoren etter, tas resten i neste runde
+                    if self.binary:
+                        os.write(self.master, b''.join(self.frames(self.sent + i) for i in range(due)))
+                    else:
+                        lines = [self.sample(self.sent + i) for i in range(due)]
+                        os.write(self.master, ('\n'.join(lines) + '\n').encode())
+                    self.sent += due
+                    self.sent_since_start += due
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulert mikrokontroller på en pty.")
+    parser.add_argument('--temperature-sensor-id', type=int, default=1)
+    parser.add_argument('--accelerometer-id', type=int, default=2)
+    parser.add_argument('--frequency', type=float, default=1, help="Målinger per sekund før GatherFreq")
+    parser.add_argument('--boot-delay', type=float, default=0.0)
+    parser.add_argument('--temperature-every', type=int, default=1)
+    parser.add_argument('--alarm-every', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = DeviceSimulator(args.temperature_sensor_id, args.accelerometer_id, args.frequency, args.boot_delay,
+                                args.temperature_every, args.alarm_every, args.seed)
+    # Første linje er porten, så et annet program kan lese den fra stdout
+    print(simulator.start(), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        print(f"Sendt {simulator.sent} målinger")
+
+
+if __name__ == "__main__":
+    main()
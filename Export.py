@@ -0,0 +1,190 @@
+"""
+Eksporterer målinger til CSV eller Parquet for analyse utenfor HMI-en.
+
+Målingene hentes per sensor for et tidsintervall, slik at hver spørring bruker indeksen
+(sensor_id, timestamp), og strømmes fra databasen i bolker på chunk_size rader (ubufret cursor på
+MySQL, se StorageBackend.stream). Hver bolk skrives før neste hentes, så minnebruken er den samme
+uansett hvor mye som eksporteres. I Parquet blir hver bolk én row group.
+
+Parquet krever pyarrow (pip install pyarrow); CSV trenger ingenting ekstra.
+
+    python Export.py --start 2026-10-01 --end 2026-10-08 --format parquet --output eksport
+    python Export.py --sensors 1 2 --tables temperature --format csv --backend sqlite
+"""
+import argparse
+import csv
+import os
+import time
+from Storage import open_backend
+
+# Navn på kommandolinjen -> (tabell, kolonner)
+TABLES = {
+    'temperature': ('temperaturereadings', ['reading_id', 'sensor_id', 'timestamp', 'temperature']),
+    'acceleration': ('accelerationreadings', ['reading_id', 'sensor_id', 'timestamp',
+                                              'acceleration_x', 'acceleration_y', 'acceleration_z',
+                                              'diff_acceleration_x', 'diff_acceleration_y', 'diff_acceleration_z']),
+}
+
+INTEGER_COLUMNS = ('reading_id', 'sensor_id')
+
+
+class CsvWriter:
+    """
+    Skriver bolker som CSV med kolonnenavn på første linje.
+    """
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Skriver hver bolk som én row group i en Parquet-fil. Tidsstempler lagres som timestamp[s],
+    enten databasen gir datetime (MySQL) eller tekst (SQLite).
+    """
+
+    def __init__(self, path, columns, compression='snappy'):
+        """
+        :param path: Filen som skrives.
+        :param columns: Kolonnenavnene, i samme rekkefølge som i radene.
+        :param compression: Komprimering i pyarrow, f.eks. 'snappy', 'zstd' eller 'none'.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet-eksport krever pyarrow (pip install pyarrow), eller bruk --format csv")
+        self.pa = pa
+        self.columns = columns
+        self.types = [pa.int64() if column in INTEGER_COLUMNS else
+                      pa.timestamp('s') if column == 'timestamp' else pa.float64() for column in columns]
+        self.schema = pa.schema(list(zip(columns, self.types)))
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows):
+        pa = self.pa
+        arrays = []
+        for values, column_type in zip(zip(*rows), self.types):
+            if column_type == pa.timestamp('s') and isinstance(values[0], str):
+                arrays.append(pa.array(values, pa.string()).cast(column_type))
+            else:
+                arrays.append(pa.array(values, column_type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(fmt, path, columns, compression='snappy'):
+    if fmt == 'parquet':
+        return ParquetWriter(path, columns, compression)
+    return CsvWriter(path, columns)
+
+
+def sensors_in(db, table):
+    """
+    Finner sensorene som har målinger i tabellen.
+
+    :param db: Tilkoblet StorageBackend.
+    :param table: Målingstabellen.
+    :return: Sensor-ID-ene i stigende rekkefølge.
+    """
+    return [row[0] for row in db.query(f"SELECT DISTINCT sensor_id FROM {table} ORDER BY sensor_id")]
+
+
+def export_sql(table, columns, start, end):
+    """
+    Lager spørringen for én sensor og ett tidsintervall. Intervallet er [start, end).
+
+    :return: (sql, parametere uten sensor_id).
+    """
+    conditions = ["sensor_id = %s"]
+    params = []
+    if start is not None:
+        conditions.append("timestamp >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("timestamp < %s")
+        params.append(end)
+    sql = (f"SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(conditions)} "
+           f"ORDER BY sensor_id, timestamp, reading_id")
+    return sql, params
+
+
+def export_table(db, name, path, fmt='csv', start=None, end=None, sensors=None, chunk_size=50000,
+                 compression='snappy'):
+    """
+    Eksporterer én målingstabell til én fil, sensor for sensor.
+
+    :param db: Tilkoblet StorageBackend. Brukes ikke til andre spørringer under eksporten.
+    :param name: 'temperature' eller 'acceleration' (se TABLES).
+    :param path: Filen som skrives.
+    :param fmt: 'csv' eller 'parquet'.
+    :param start: Første tidsstempel som tas med, f.eks. '2026-10-01'. None betyr fra starten.
+    :param end: Første tidsstempel som ikke tas med. None betyr til og med siste måling.
+    :param sensors: Sensor-ID-ene som eksporteres. None betyr alle som har målinger.
+    :param chunk_size: Antall rader som hentes og skrives om gangen.
+    :param compression: Komprimering for Parquet.
+    :return: Ordbok med 'rows', 'seconds', 'rows_per_sec' og 'bytes'.
+    """
+    table, columns = TABLES[name]
+    sql, params = export_sql(table, columns, start, end)
+    started = time.perf_counter()
+    if sensors is None:
+        sensors = sensors_in(db, table)
+
+    rows = 0
+    writer = open_writer(fmt, path, columns, compression)
+    try:
+        for sensor_id in sensors:
+            for chunk in db.stream(sql, (sensor_id, *params), chunk_size):
+                writer.write(chunk)
+                rows += len(chunk)
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else 0.0,
+        'bytes': os.path.getsize(path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=None)
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--sensors', type=int, nargs='+', default=None, help="Standard: alle")
+    parser.add_argument('--start', default=None, help="F.eks. 2026-10-01 eller '2026-10-01 12:00:00'")
+    parser.add_argument('--end', default=None, help="Første tidspunkt som ikke tas med")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--compression', default='snappy', help="Parquet: snappy, zstd, gzip eller none")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rader per bolk")
+    parser.add_argument('--output', default='.', help="Mappen filene skrives til")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    db = open_backend(args.backend)
+    db.connect()
+    try:
+        for name in args.tables:
+            path = os.path.join(args.output, f"{TABLES[name][0]}.{args.format}")
+            result = export_table(db, name, path, args.format, args.start, args.end, args.sensors,
+                                  args.chunk_size, args.compression)
+            print(f"{path}: {result['rows']} rader på {result['seconds']:.1f} s "
+                  f"({result['rows_per_sec']:.0f} rader/s, {result['bytes'] / 2 ** 20:.1f} MB)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
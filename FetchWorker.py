@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+
+class FetchWorker:
+    """
+    Kjører databasespørringene til et GUI i en egen tråd.
+
+    Tråden kaller fetch() hvert interval sekund, og kjører enkeltjobber lagt inn med submit()
+    (f.eks. historikk når brukeren trykker på en knapp). Resultatene legges i en trådsikker kø
+    som GUI-et tømmer fra Tk-tråden med drain(), typisk fra en root.after-callback. En treg
+    spørring eller en database som ikke svarer fryser dermed aldri vinduet. Alle spørringer
+    går gjennom samme tråd, så forbindelsen aldri brukes fra to tråder samtidig.
+    Funksjonene som kjøres i tråden må ikke røre Tk-widgets.
+    """
+
+    POLL = 'poll'
+
+    def __init__(self, fetch, interval=1.0, name='fetch'):
+        """
+        Args:
+            fetch (callable): Funksjon uten argumenter som henter data. Kjøres i arbeidertråden.
+            interval (float): Sekunder mellom hver henting.
+            name (str): Navn på tråden.
+        """
+        self.fetch = fetch
+        self.interval = interval
+        self.name = name
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def submit(self, tag, job):
+        """
+        Kjører job() én gang i arbeidertråden. Resultatet kommer i drain() med samme tag.
+
+        Args:
+            tag (str): Merkelapp som skiller resultatet fra de periodiske.
+            job (callable): Funksjon uten argumenter.
+        """
+        self.jobs.put((tag, job))
+        self.wake.set()
+
+    def request(self):
+        """
+        Ber om en ny periodisk henting med en gang i stedet for å vente på neste intervall.
+        """
+        self.submit(self.POLL, self.fetch)
+
+    def run_job(self, tag, job):
+        start = time.perf_counter()
+        try:
+            result, error = job(), None
+        except Exception as e:
+            result, error = None, e
+        self.results.put((tag, result, 1000 * (time.perf_counter() - start), error))
+
+    def loop(self):
+        next_poll = time.monotonic()
+        while self.running:
+            while True:
+                try:
+                    tag, job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                self.run_job(tag, job)
+                if tag == self.POLL:
+                    next_poll = time.monotonic() + self.interval
+            if time.monotonic() >= next_poll:
+                self.run_job(self.POLL, self.fetch)
+                next_poll = time.monotonic() + self.interval
+            self.wake.wait(max(0.0, next_poll - time.monotonic()))
+            self.wake.clear()
+
+    def drain(self):
+        """
+        Henter alle resultater som er klare, uten å blokkere. Kalles fra Tk-tråden.
+
+        Returns:
+            list: (tag, resultat, spørretid i ms, unntak eller None) i den rekkefølgen de ble
+                  hentet. Periodiske hentinger har tag FetchWorker.POLL.
+        """
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
@@ -0,0 +1,122 @@
+import struct
+import zlib
+
+# Binære rammer fra mikrokontrolleren, som alternativ til JSON-linjer:
+#
+#   magic (2 byte) | type (1) | lengde (1) | nyttelast (lengde byte) | CRC-32 (4)
+#
+# Alle felt er little-endian. CRC-32 (zlib.crc32) regnes over type, lengde og nyttelast.
+# Svar på kommandoer er fortsatt JSON-linjer, også når rammer er slått på; de starter med {
+# og kan derfor skilles fra rammene på første byte.
+MAGIC = b'\xa5\x5a'
+HEADER = struct.Struct('<2sBB')
+CRC = struct.Struct('<I')
+
+TEMPERATURE = 1
+ACCELERATION = 2
+
+# sensor_id (uint16), enhetens tid i ms (uint32), verdier (float32)
+PAYLOADS = {
+    TEMPERATURE: struct.Struct('<HIf'),
+    ACCELERATION: struct.Struct('<HI3f'),
+}
+
+
+def encode(frame_type, *values):
+    """
+    Pakker én måling som en binær ramme. Brukes av DeviceSimulator og i tester av enheten.
+
+    Args:
+        frame_type (int): TEMPERATURE eller ACCELERATION.
+        *values: sensor_id, tid i ms og måleverdiene, i rekkefølgen i PAYLOADS.
+
+    Returns:
+        bytes: Hele rammen.
+    """
+    payload = PAYLOADS[frame_type].pack(*values)
+    body = bytes((frame_type, len(payload))) + payload
+    return MAGIC + body + CRC.pack(zlib.crc32(body))
+
+
+class FrameDecoder:
+    """
+    Deler en bytestrøm med både binære rammer og JSON-linjer opp i elementer.
+
+    Bytene samles i én bytearray, og rammene tolkes med struct.unpack_from direkte fra bufferen,
+    og CRC regnes over en memoryview, så ingen ramme kopieres. Rammer med feil CRC eller ukjent
+    type forkastes, og dekoderen leter videre fra neste byte etter magic eller {.
+    """
+
+    def __init__(self, max_line=65536):
+        """
+        Args:
+            max_line (int): Lengste tillatte JSON-linje. Lengre data uten linjeskift forkastes.
+        """
+        self.max_line = max_line
+        self.buffer = bytearray()
+        self.frames = 0
+        self.lines = 0
+        self.crc_errors = 0
+        self.skipped = 0
+
+    def feed(self, chunk):
+        """
+        Legger til mottatte byte og returnerer alle komplette elementer.
+
+        Args:
+            chunk (bytes): Byte lest fra seriellporten.
+
+        Returns:
+            list: JSON-linjer som bytes (uten linjeskift), og rammer som tupler
+                  (type, sensor_id, tid i ms, verdi...).
+        """
+        buffer = self.buffer
+        buffer += chunk
+        items = []
+        size = len(buffer)
+        pos = 0
+        with memoryview(buffer) as view:
+            while pos < size:
+                first = buffer[pos]
+                if first == MAGIC[0]:
+                    if size - pos < HEADER.size:
+                        break
+                    magic, frame_type, length = HEADER.unpack_from(buffer, pos)
+                    payload = PAYLOADS.get(frame_type)
+                    if magic != MAGIC or payload is None or length != payload.size:
+                        self.skipped += 1
+                        pos += 1
+                        continue
+                    end = pos + HEADER.size + length + CRC.size
+                    if end > size:
+                        break
+                    if zlib.crc32(view[pos + 2:end - CRC.size]) != CRC.unpack_from(buffer, end - CRC.size)[0]:
+                        self.crc_errors += 1
+                        pos += 1
+                        continue
+                    items.append((frame_type,) + payload.unpack_from(buffer, pos + HEADER.size))
+                    self.frames += 1
+                    pos = end
+                elif first == 0x7b:  # {
+                    newline = buffer.find(b'\n', pos)
+                    if newline < 0:
+                        if size - pos > self.max_line:
+                            self.skipped += size - pos
+                            pos = size
+                        break
+                    items.append(bytes(view[pos:newline]).rstrip())
+                    self.lines += 1
+                    pos = newline + 1
+                else:
+                    if first not in b'\r\n ':
+                        self.skipped += 1
+                    pos += 1
+        del buffer[:pos]
+        return items
+
+    def stats(self):
+        """
+        Returns:
+            dict: Antall rammer, linjer, CRC-feil og forkastede byte.
+        """
+        return {'frames': self.frames, 'lines': self.lines, 'crc_errors': self.crc_errors, 'skipped': self.skipped}
@@ -1,12 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from datetime import datetime
-from DbTrans import HentData
+from DbTrans import HentData, siste, gjeldende_grense
+from RingBuffer import RingBuffer
+from LivePlot import LivePlot
+from FetchWorker import FetchWorker
 import mplcursors
 
 
+def epoch(timestamp):
+    """
+    Gjør om et timestamp fra databasen (datetime eller 'YYYY-MM-DD HH:MM:SS') til sekunder siden epoch.
+    """
+    return as_datetime(timestamp).timestamp()
+
+
+def as_datetime(timestamp):
+    """
+    Gjør om et timestamp fra databasen (datetime eller 'YYYY-MM-DD HH:MM:SS') til datetime.
+    """
+    return datetime.fromisoformat(str(timestamp))
+
+
 class SensorGUI:
     """
     GUI-applikasjon for visning og overvåking av sanntids- og historiske sensorverdier.
@@ -14,13 +32,15 @@ class SensorGUI:
     Viser temperatur- og akselerasjonsdata, håndterer alarmgrenser, plotter data og viser hendelseslogg.
     """
 
-    def __init__(self, root, fetcher):
+    def __init__(self, root, fetcher, live_capacity=3600):
         """
         Initialiserer GUI-en med hovedvindu, oppsett av komponenter og start på dataoppdatering.
 
         Args:
             root (tk.Tk): Hovedvindu for GUI.
             fetcher (HentData): Objekt for henting av sanntidsdata og grenseverdier.
+            live_capacity (int): Antall målinger per serie som holdes i minnet for live-visning.
+                                 Historikk hentes fra databasen.
         """
         self.root = root
         self.root.title("Sensorovervåking")
@@ -31,21 +51,30 @@ class SensorGUI:
         self.cursor1 = None
         self.cursor2 = None
 
-        self.temperatures = []
-        self.accelerations = []
-        self.timestamps = []
+        # Live-seriene i ringbuffere med fast størrelse: (tid, temperatur) og (tid, x, y, z).
+        # Tid lagres som sekunder siden epoch.
+        self.temp_series = RingBuffer(live_capacity, 2)
+        self.acc_series = RingBuffer(live_capacity, 4)
+        self.last_temp_id = None
+        self.last_acc_id = None
+        self.temp_sensor = None
+        self.acc_sensor = None
 
         self.threshold_temp_max = 0
         self.threshold_temp_min = 0
         self.threshold_acc = 0
 
         self.fetcher = fetcher
+        # Spørringene kjøres i en egen tråd; Tk-tråden tømmer bare resultatkøen
+        self.worker = FetchWorker(self.fetch_live, interval=1.0)
 
         self.history_start = tk.StringVar(value="00:00:00")
         self.history_end = tk.StringVar(value="23:59:59")
         self.view_mode = tk.StringVar(value="Live")
 
         self.build_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.worker.start()
         self.update_gui()
 
     def build_gui(self):
@@ -70,10 +99,13 @@ class SensorGUI:
         self.temp_label.pack(fill=tk.X)
         self.accel_label = tk.Label(main_frame, text="Akselerasjon: -", font=("Arial", 14))
         self.accel_label.pack(fill=tk.X)
+        self.db_label = tk.Label(main_frame, text="Database: -", font=("Arial", 10), fg="gray")
+        self.db_label.pack(fill=tk.X)
 
         self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(12, 2), gridspec_kw={'height_ratios': [1, 1], 'hspace': 0.5})
         self.canvas = FigureCanvasTkAgg(self.fig, master=main_frame)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(20, 40))
+        self.live_plot = LivePlot(self.fig, self.ax1, self.ax2)
 
         alarm_frame = tk.Frame(main_frame)
         alarm_frame.pack(side=tk.BOTTOM, anchor='se', padx=20, pady=10)
@@ -99,12 +131,6 @@ class SensorGUI:
         self.log_box.pack(fill=tk.BOTH, expand=True)
         ttk.Button(log_frame, text="Tøm logg", command=lambda: self.log_box.delete(0, tk.END)).pack(pady=5)
 
-        temp_threshold = self.fetcher.hent_threshold_temp()
-        acc_threshold = self.fetcher.hent_threshold_acc()
-        self.threshold_temp_max = temp_threshold[0]['max_value']
-        self.threshold_temp_min = temp_threshold[0]['min_value']
-        self.threshold_acc = acc_threshold[0]['max_value']
-
     def log_event(self, event):
         """
         Legger en ny hendelse til i hendelsesloggen.
@@ -115,55 +141,192 @@ class SensorGUI:
         self.log_box.insert(tk.END, event)
         self.log_box.yview_moveto(1)
 
-    def update_gui(self):
-        """
-        Henter ny sanntidsdata, oppdaterer visning og varsler om alarmer.
-        Kalles periodisk hvert sekund for å oppdatere GUI og plot.
+    def close(self):
+        self.worker.stop()
+        self.root.destroy()
+
+    def fetch_live(self):
         """
-        data = self.fetcher.return_data()
-        if not data:
-            self.root.after(1000, self.update_gui)
-            return
+        Henter alarmgrenser og alle nye målinger siden forrige gang. Kjøres i FetchWorker-tråden
+        og rører derfor ingen widgets.
 
-        temperature = data['temperature']
-        x = data['x']
-        y = data['y']
-        z = data['z']
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        Alarmgrenser og hvilke sensorer som sist har målt hentes med HentData.snapshot. Deretter
+        hentes alle målinger siden forrige oppdatering (HentData.hent_siden), så ingen målinger
+        mellom to oppdateringer faller bort uansett målefrekvens.
 
-        self.timestamps.append(timestamp)
-        self.temperatures.append(temperature)
-        self.accelerations.append((x, y, z))
+        Returns:
+            tuple: (thresholds, temp_sensor, acc_sensor, nye målinger), eller None uten data.
+        """
+        self.fetcher.koble_til()
+        try:
+            snapshot = self.fetcher.snapshot()
+            latest_temp = siste(snapshot.temperature)
+            latest_acc = siste(snapshot.acceleration)
+            if latest_temp is None or latest_acc is None:
+                return None
+            temp_sensor = latest_temp[0]
+            acc_sensor = latest_acc[0]
+            new = self.fetcher.hent_siden(self.last_temp_id, self.last_acc_id, temp_sensor, acc_sensor)
+        except self.fetcher.backend.Error:
+            self.fetcher.koble_fra()  # Ny forbindelse ved neste forsøk
+            raise
+        self.last_temp_id = new['siste_temp_id']
+        self.last_acc_id = new['siste_acc_id']
+        return snapshot.thresholds, temp_sensor, acc_sensor, new
 
-        if self.view_mode.get() == "Live":
+    def update_gui(self):
+        """
+        Tømmer resultatene fra FetchWorker, oppdaterer visning og varsler om alarmer.
+        Kalles periodisk fra Tk-tråden og blokkerer aldri på databasen.
+        """
+        for tag, result, elapsed_ms, error in self.worker.drain():
+            if error is not None:
+                self.db_label.config(text=f"Database utilgjengelig: {error}", fg="red")
+                continue
+            self.db_label.config(text=f"Database: {elapsed_ms:.1f} ms", fg="gray")
+            if tag == FetchWorker.POLL and result is not None:
+                self.show_live(*result)
+            elif tag == 'history':
+                self.show_history(result)
+        self.root.after(100, self.update_gui)
+
+    def show_live(self, thresholds, temp_sensor, acc_sensor, new):
+        """
+        Legger nye målinger i live-seriene og oppdaterer etiketter, alarmlamper og plot.
+
+        Args:
+            thresholds (dict): Snapshot.thresholds.
+            temp_sensor (int): Sensoren som sist målte temperatur.
+            acc_sensor (int): Sensoren som sist målte akselerasjon.
+            new (dict): Resultatet fra HentData.hent_siden().
+        """
+        self.temp_sensor = temp_sensor
+        self.acc_sensor = acc_sensor
+        self.update_thresholds(thresholds, temp_sensor, acc_sensor)
+
+        new_temp = new['temperature']
+        new_acc = new['acceleration']
+        new_temp_times = [str(t)[11:19] for t in new_temp['timestamp']]
+        new_acc_times = [str(t)[11:19] for t in new_acc['timestamp']]
+        new_axes = list(zip(new_acc['x'], new_acc['y'], new_acc['z']))
+        self.temp_series.extend([epoch(t) for t in new_temp['timestamp']], new_temp['temperature'])
+        self.acc_series.extend([epoch(t) for t in new_acc['timestamp']], new_acc['x'], new_acc['y'], new_acc['z'])
+
+        if self.view_mode.get() == "Live" and len(self.temp_series) and len(self.acc_series):
+            _, temperature = self.temp_series.latest()
+            _, x, y, z = self.acc_series.latest()
             self.temp_label.config(text=f"Temperatur: {temperature} °C")
             self.accel_label.config(text=f"Akselerasjon: x={x}, y={y}, z={z}")
 
-            if self.threshold_temp_min <= temperature <= self.threshold_temp_max:
-                self.green_light.itemconfig(self.green_light_indicator, fill="green")
-                self.red_light.itemconfig(self.red_light_indicator, fill="gray")
-            else:
+            # Alarm hvis noen av de nye målingene er utenfor grensene, ikke bare den siste
+            temp_alarms = [(t, value) for t, value in zip(new_temp_times, new_temp['temperature'])
+                           if not self.threshold_temp_min <= value <= self.threshold_temp_max]
+            if temp_alarms:
                 self.green_light.itemconfig(self.green_light_indicator, fill="gray")
                 self.red_light.itemconfig(self.red_light_indicator, fill="red")
-                self.log_event(f"[{timestamp}] Temperaturalarm: {temperature} °C")
+                timestamp, value = temp_alarms[-1]
+                self.log_event(f"[{timestamp}] Temperaturalarm: {value} °C ({len(temp_alarms)} målinger)")
+            elif self.threshold_temp_min <= temperature <= self.threshold_temp_max:
+                self.green_light.itemconfig(self.green_light_indicator, fill="green")
+                self.red_light.itemconfig(self.red_light_indicator, fill="gray")
 
-            if any(abs(axis) > self.threshold_acc for axis in [x, y, z]):
+            acc_alarms = [(t, axes) for t, axes in zip(new_acc_times, new_axes)
+                          if any(abs(axis) > self.threshold_acc for axis in axes)]
+            if acc_alarms:
                 self.accel_green_light.itemconfig(self.accel_green_indicator, fill="gray")
                 self.accel_red_light.itemconfig(self.accel_red_indicator, fill="red")
-                self.log_event(f"[{timestamp}] Akselerasjonsalarm: x={x}, y={y}, z={z}")
-            else:
+                timestamp, (ax, ay, az) = acc_alarms[-1]
+                self.log_event(f"[{timestamp}] Akselerasjonsalarm: x={ax}, y={ay}, z={az} ({len(acc_alarms)} målinger)")
+            elif not any(abs(axis) > self.threshold_acc for axis in [x, y, z]):
                 self.accel_green_light.itemconfig(self.accel_green_indicator, fill="green")
                 self.accel_red_light.itemconfig(self.accel_red_indicator, fill="gray")
 
             self.plot_data()
 
-        self.root.after(1000, self.update_gui)
+    def update_thresholds(self, thresholds, temp_sensor, acc_sensor):
+        """
+        Oppdaterer alarmgrensene fra et snapshot. Beholder forrige verdi hvis en grense mangler.
+
+        Args:
+            thresholds (dict): Snapshot.thresholds fra HentData.snapshot().
+            temp_sensor (int): Sensoren temperaturen kommer fra.
+            acc_sensor (int): Sensoren akselerasjonen kommer fra.
+        """
+        temp_threshold = gjeldende_grense(thresholds, temp_sensor, 'T')
+        if temp_threshold is not None:
+            self.threshold_temp_min, self.threshold_temp_max = temp_threshold
+        acc_threshold = gjeldende_grense(thresholds, acc_sensor, 'A')
+        if acc_threshold is not None:
+            self.threshold_acc = acc_threshold[1]
+
+    def fetch_history(self, start, end, temp_sensor, acc_sensor):
+        """
+        Henter historikk for et tidsintervall fra databasen. Kjøres i FetchWorker-tråden.
+
+        Returns:
+            tuple: (tider, temperaturer, tider, x, y, z) med tider som datetime, eller None hvis
+                   det ikke finnes data.
+        """
+        self.fetcher.koble_til()
+        try:
+            temp = self.fetcher.hent_historikk(temp_sensor, ['temperature'], start, end)
+            acc = self.fetcher.hent_historikk(acc_sensor, ['diff_acceleration_x', 'diff_acceleration_y', 'diff_acceleration_z'], start, end)
+        except self.fetcher.backend.Error:
+            self.fetcher.koble_fra()
+            raise
+        if not temp or not acc or not temp['temperature']['timestamp'] or not acc['diff_acceleration_x']['timestamp']:
+            return None
+        return ([as_datetime(t) for t in temp['temperature']['timestamp']], temp['temperature']['mean'],
+                [as_datetime(t) for t in acc['diff_acceleration_x']['timestamp']], acc['diff_acceleration_x']['mean'],
+                acc['diff_acceleration_y']['mean'], acc['diff_acceleration_z']['mean'])
 
     def plot_data(self):
         """
         Plotter temperatur- og akselerasjonsdata i henhold til valgt visningsmodus (live/historikk).
-        Viser også grenseverdier i grafene og aktiverer markør for interaksjon.
+        Viser også grenseverdier i grafene.
+
+        Live-visningen tegnes inkrementelt med LivePlot (bare datalinjene tegnes på nytt).
+        """
+        if self.view_mode.get() == "History":
+            self.plot_history()
+            return
+
+        self.live_plot.set_thresholds(self.threshold_temp_min, self.threshold_temp_max, self.threshold_acc)
+        temp_times, temp_data = self.temp_series.last()
+        acc_times, acc_x, acc_y, acc_z = self.acc_series.last()
+        self.live_plot.update(temp_times, temp_data, acc_times, acc_x, acc_y, acc_z)
+
+    def plot_history(self):
         """
+        Ber FetchWorker hente historikk for valgt tidsintervall i dag. Resultatet vises av
+        show_history() når det er klart.
+        """
+        try:
+            today = datetime.now().date()
+            start = datetime.combine(today, datetime.strptime(self.history_start.get(), "%H:%M:%S").time())
+            end = datetime.combine(today, datetime.strptime(self.history_end.get(), "%H:%M:%S").time())
+        except ValueError:
+            messagebox.showwarning("Feil i tidsvalg", "Tidspunkt må skrives som HH:MM:SS.")
+            return
+        if self.temp_sensor is None or self.acc_sensor is None:
+            messagebox.showwarning("Feil i tidsvalg", "Fant ikke data i valgt tidsintervall.")
+            return
+        temp_sensor, acc_sensor = self.temp_sensor, self.acc_sensor
+        self.worker.submit('history', lambda: self.fetch_history(start, end, temp_sensor, acc_sensor))
+
+    def show_history(self, history):
+        """
+        Plotter historikk og aktiverer markør for interaksjon.
+
+        Args:
+            history (tuple): Resultatet fra fetch_history(), eller None uten data.
+        """
+        if history is None:
+            messagebox.showwarning("Feil i tidsvalg", "Fant ikke data i valgt tidsintervall.")
+            return
+        time_data, temp_data, acc_time_data, acc_x, acc_y, acc_z = history
+
+        self.live_plot.invalidate()
         self.ax1.clear()
         self.ax2.clear()
 
@@ -174,23 +337,6 @@ class SensorGUI:
             self.cursor2.remove()
             self.cursor2 = None
 
-        if self.view_mode.get() == "History":
-            start = self.history_start.get()
-            end = self.history_end.get()
-            try:
-                filtered = [(t, temp, acc) for t, temp, acc in zip(self.timestamps, self.temperatures, self.accelerations)
-                            if start <= t <= end]
-                if not filtered:
-                    raise ValueError
-                time_data, temp_data, acc_data = zip(*filtered)
-            except ValueError:
-                messagebox.showwarning("Feil i tidsvalg", "Fant ikke data i valgt tidsintervall.")
-                return
-        else:
-            temp_data = self.temperatures[-24:]
-            acc_data = self.accelerations[-24:]
-            time_data = self.timestamps[-24:]
-
         self.ax1.plot(time_data, temp_data, marker='o', label='Temperatur')
         self.ax1.axhline(y=0, color='gray', linestyle='--')
         self.ax1.axhline(y=self.threshold_temp_min, color='red', linestyle='--', label=f'{self.threshold_temp_min}°C')
@@ -198,36 +344,41 @@ class SensorGUI:
         self.ax1.set_title("Temperatur")
         self.ax1.set_ylabel("°C")
         self.ax1.set_ylim(-20, 40)
-        self.ax1.set_xticks(range(len(time_data)))
-        self.ax1.set_xticklabels(time_data, rotation=45, ha='right')
+        self.time_axis(self.ax1)
         self.ax1.legend()
 
-        self.ax2.plot(time_data, [a[0] for a in acc_data], label='x', color="red")
-        self.ax2.plot(time_data, [a[1] for a in acc_data], label='y', color="green")
-        self.ax2.plot(time_data, [a[2] for a in acc_data], label='z', color="blue")
+        self.ax2.plot(acc_time_data, acc_x, label='x', color="red")
+        self.ax2.plot(acc_time_data, acc_y, label='y', color="green")
+        self.ax2.plot(acc_time_data, acc_z, label='z', color="blue")
         self.ax2.axhline(y=0, color='gray', linestyle='--')
         self.ax2.axhline(y=-self.threshold_acc, color='red', linestyle='--', label=f'-{self.threshold_acc} m/s²')
         self.ax2.axhline(y=self.threshold_acc, color='blue', linestyle='--', label=f'{self.threshold_acc} m/s²')
         self.ax2.set_title("Akselerasjon")
         self.ax2.set_ylabel("m/s²")
         self.ax2.set_ylim(-20, 20)
-        self.ax2.set_xticks(range(len(time_data)))
-        self.ax2.set_xticklabels(time_data, rotation=45, ha='right')
+        self.time_axis(self.ax2)
         self.ax2.legend()
 
         plt.tight_layout()
-        self.canvas.draw()
         self.cursor1 = mplcursors.cursor(self.ax1, hover=True)
         self.cursor2 = mplcursors.cursor(self.ax2, hover=True)
-        plt.tight_layout()
         self.canvas.draw()
 
+    @staticmethod
+    def time_axis(ax):
+        """
+        Lar matplotlib velge passe mange tidsmerker på x-aksen, uansett antall punkter.
+        """
+        locator = mdates.AutoDateLocator(maxticks=12)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        ax.tick_params(axis='x', labelrotation=45)
 
 if __name__ == "__main__":
     """
     Starter GUI-applikasjonen med tilkobling til datakilde.
     """
     root = tk.Tk()
-    dataHenter = HentData()
+    dataHenter = HentData(utsett_tilkobling=True)  # FetchWorker kobler til
     app = SensorGUI(root, dataHenter)
     root.mainloop()
@@ -0,0 +1,111 @@
+"""
+Hull i reading_id som kan bli fylt senere.
+
+Flere skrivetråder og avspilling av spoolen kan committe en lavere reading_id etter en høyere.
+En leser som følger et høyvannsmerke på reading_id, husker derfor hullene den har gått forbi, og
+spør etter dem igjen til de har stått åpne i window sekunder (se Rollup.RollupAggregator og
+DbTrans.HentData.hent_siden).
+"""
+import bisect
+import time
+
+
+class GapTracker:
+    """
+    Sorterte, ikke-overlappende ID-intervaller [første, siste] som hver har en frist. Intervaller
+    som grenser til hverandre, slås sammen, og spørringene deles opp så hver har maks
+    max_clauses BETWEEN-ledd.
+    """
+
+    def __init__(self, window, max_ranges=10000, max_clauses=100):
+        """
+        Args:
+            window (float): Sekunder et hull sjekkes før det gis opp.
+            max_ranges (int): Maks antall intervaller. De eldste gis opp først.
+            max_clauses (int): Maks antall BETWEEN-ledd per spørring.
+        """
+        self.window = window
+        self.max_ranges = max_ranges
+        self.max_clauses = max_clauses
+        self.ranges = []  # [første ID, siste ID, monotonic() da hullet gis opp]
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add(self, first, last, now=None):
+        """
+        Legger til hullet first..last (begge med).
+
+        Returns:
+            list: Intervallene som ble gitt opp fordi det ble for mange, som [første, siste, frist].
+        """
+        deadline = (time.monotonic() if now is None else now) + self.window
+        index = bisect.bisect_left(self.ranges, [first])
+        self.ranges.insert(index, [first, last, deadline])
+        # Slå sammen med naboene når intervallene grenser til eller overlapper hverandre
+        if index + 1 < len(self.ranges) and self.ranges[index + 1][0] <= last + 1:
+            following = self.ranges.pop(index + 1)
+            self.ranges[index][1:] = [max(last, following[1]), max(deadline, following[2])]
+        if index > 0 and self.ranges[index - 1][1] + 1 >= first:
+            current = self.ranges.pop(index)
+            previous = self.ranges[index - 1]
+            previous[1:] = [max(previous[1], current[1]), max(previous[2], current[2])]
+
+        dropped = []
+        while len(self.ranges) > self.max_ranges:
+            dropped.append(self.ranges.pop(min(range(len(self.ranges)), key=lambda i: self.ranges[i][2])))
+        return dropped
+
+    def add_between(self, last_id, reading_ids, now=None):
+        """
+        Legger til hullene mellom last_id og sorterte reading_ids som er lest etter den.
+
+        Returns:
+            list: Intervallene som ble gitt opp (se add).
+        """
+        dropped = []
+        for reading_id in reading_ids:
+            if reading_id > last_id + 1:
+                dropped += self.add(last_id + 1, reading_id - 1, now)
+            last_id = max(last_id, reading_id)
+        return dropped
+
+    def expire(self, now=None):
+        """
+        Gir opp hull som har passert fristen.
+        """
+        now = time.monotonic() if now is None else now
+        self.ranges = [gap for gap in self.ranges if gap[2] > now]
+
+    def queries(self):
+        """
+        WHERE-betingelser som til sammen dekker alle hullene.
+
+        Returns:
+            list: (sql, parametere)-par, f.eks. ('reading_id BETWEEN %s AND %s OR ...', (1, 3, ...)).
+        """
+        conditions = []
+        for start in range(0, len(self.ranges), self.max_clauses):
+            chunk = self.ranges[start:start + self.max_clauses]
+            conditions.append((' OR '.join(['reading_id BETWEEN %s AND %s'] * len(chunk)),
+                               tuple(bound for gap in chunk for bound in gap[:2])))
+        return conditions
+
+    def found(self, reading_ids):
+        """
+        Fjerner ID-er som er funnet, fra hullene.
+
+        Args:
+            reading_ids (list): Sorterte reading_id-er.
+        """
+        remaining = []
+        for first, last, deadline in self.ranges:
+            start = bisect.bisect_left(reading_ids, first)
+            end = bisect.bisect_right(reading_ids, last)
+            for reading_id in reading_ids[start:end]:
+                if reading_id > first:
+                    remaining.append([first, reading_id - 1, deadline])
+                first = reading_id + 1
+            if first <= last:
+                remaining.append([first, last, deadline])
+        self.ranges = remaining
@@ -0,0 +1,169 @@
+from bisect import bisect_left
+
+
+def window(start, times, *columns):
+    """
+    Punktene med tid fra og med start, sortert på tid.
+
+    Radene kommer i den rekkefølgen de er lest fra databasen, og rader som spilles av fra spoolen
+    (se Spool) har eldre tider enn det som allerede er vist. Er tidene stigende, som vanlig, finnes
+    startpunktet med bisect; ellers sorteres punktene først.
+
+    Args:
+        start (float): Eldste tid som tas med.
+        times (sequence): Tidspunkt i sekunder siden epoch.
+        *columns (sequence): Verdier som hører til hvert tidspunkt.
+
+    Returns:
+        list: Tidene og hver kolonne innenfor vinduet.
+    """
+    if any(times[i] > times[i + 1] for i in range(len(times) - 1)):
+        order = sorted(range(len(times)), key=times.__getitem__)
+        times = [times[i] for i in order]
+        columns = [[values[i] for i in order] for values in columns]
+    first = bisect_left(times, start)
+    return [times[first:]] + [values[first:] for values in columns]
+
+
+class LivePlot:
+    """
+    Inkrementell live-visning av temperatur og akselerasjon i to matplotlib-akser.
+
+    Linjene lages én gang og oppdateres med set_data. Akser, rutenett, grenselinjer og
+    forklaringer tegnes bare ved full tegning og lagres som bakgrunn; hver oppdatering
+    limer inn bakgrunnen og tegner bare datalinjene (blitting). Full tegning og
+    tight_layout skjer bare ved oppstart, når vinduet endrer størrelse og når grensene endres.
+
+    x-aksen er sekunder relativt til nyeste måling, med fast intervall [-window, 0], så
+    aksene ikke må tegnes på nytt når tiden går.
+    """
+
+    def __init__(self, fig, ax_temp, ax_acc, window=60):
+        """
+        Args:
+            fig (Figure): Figuren aksene ligger i.
+            ax_temp (Axes): Aksen for temperatur.
+            ax_acc (Axes): Aksen for akselerasjon.
+            window (float): Antall sekunder som vises.
+        """
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.ax_temp = ax_temp
+        self.ax_acc = ax_acc
+        self.window = window
+        self.background = None
+        self.thresholds = (0, 0, 0)
+        self.full_draws = 0
+        self.blits = 0
+
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('resize_event', self.on_resize)
+        self.build()
+
+    def build(self):
+        """
+        Lager aksene og alle linjene. Kalles på nytt hvis aksene er tømt (f.eks. etter historikkvisning).
+        """
+        temp_min, temp_max, acc = self.thresholds
+        self.ax_temp.clear()
+        self.ax_acc.clear()
+
+        self.temp_line, = self.ax_temp.plot([], [], marker='o', markersize=3, label='Temperatur', animated=True)
+        self.ax_temp.axhline(y=0, color='gray', linestyle='--')
+        self.temp_min_line = self.ax_temp.axhline(y=temp_min, color='red', linestyle='--', label=f'{temp_min}°C')
+        self.temp_max_line = self.ax_temp.axhline(y=temp_max, color='blue', linestyle='--', label=f'{temp_max}°C')
+        self.ax_temp.set_title("Temperatur")
+        self.ax_temp.set_ylabel("°C")
+        self.ax_temp.set_ylim(-20, 40)
+        self.ax_temp.set_xlim(-self.window, 0)
+        self.ax_temp.legend(loc='upper left')
+
+        self.acc_lines = [
+            self.ax_acc.plot([], [], label=axis, color=color, animated=True)[0]
+            for axis, color in (('x', 'red'), ('y', 'green'), ('z', 'blue'))
+        ]
+        self.ax_acc.axhline(y=0, color='gray', linestyle='--')
+        self.acc_min_line = self.ax_acc.axhline(y=-acc, color='red', linestyle='--', label=f'-{acc} m/s²')
+        self.acc_max_line = self.ax_acc.axhline(y=acc, color='blue', linestyle='--', label=f'{acc} m/s²')
+        self.ax_acc.set_title("Akselerasjon")
+        self.ax_acc.set_ylabel("m/s²")
+        self.ax_acc.set_xlabel("sekunder")
+        self.ax_acc.set_ylim(-20, 20)
+        self.ax_acc.set_xlim(-self.window, 0)
+        self.ax_acc.legend(loc='upper left')
+
+        self.fig.tight_layout()
+        self.background = None
+        self.stale = False
+
+    def artists(self):
+        return [self.temp_line] + self.acc_lines
+
+    def set_thresholds(self, temp_min, temp_max, acc):
+        """
+        Flytter grenselinjene. Bakgrunnen tegnes på nytt bare hvis grensene faktisk er endret.
+        """
+        if (temp_min, temp_max, acc) == self.thresholds:
+            return
+        self.thresholds = (temp_min, temp_max, acc)
+        for line, y, label in ((self.temp_min_line, temp_min, f'{temp_min}°C'),
+                               (self.temp_max_line, temp_max, f'{temp_max}°C'),
+                               (self.acc_min_line, -acc, f'-{acc} m/s²'),
+                               (self.acc_max_line, acc, f'{acc} m/s²')):
+            line.set_ydata([y, y])
+            line.set_label(label)
+        self.ax_temp.legend(loc='upper left')
+        self.ax_acc.legend(loc='upper left')
+        self.background = None
+
+    def update(self, temp_times, temperatures, acc_times, acc_x, acc_y, acc_z):
+        """
+        Oppdaterer linjene med nye serier og tegner dem.
+
+        Args:
+            temp_times (sequence): Tidspunkt for temperaturene, i sekunder siden epoch.
+            temperatures (sequence): Temperaturer.
+            acc_times (sequence): Tidspunkt for akselerasjonene, i sekunder siden epoch.
+            acc_x, acc_y, acc_z (sequence): Akselerasjon per akse.
+        """
+        if self.stale:
+            self.build()
+        now = max(max(temp_times, default=0), max(acc_times, default=0))
+        temp_times, temperatures = window(now - self.window, temp_times, temperatures)
+        self.temp_line.set_data([t - now for t in temp_times], temperatures)
+        acc_times, *acc_values = window(now - self.window, acc_times, acc_x, acc_y, acc_z)
+        acc_offsets = [t - now for t in acc_times]
+        for line, values in zip(self.acc_lines, acc_values):
+            line.set_data(acc_offsets, values)
+        self.draw()
+
+    def draw(self):
+        if self.background is None:
+            # Full tegning; on_draw lagrer bakgrunnen og tegner linjene
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        for artist in self.artists():
+            artist.axes.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+        self.blits += 1
+
+    def on_draw(self, event):
+        # Etter hver full tegning (oppstart, endret størrelse, grenser): lagre bakgrunnen uten datalinjene
+        if self.stale:
+            return
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.artists():
+            artist.axes.draw_artist(artist)
+        self.full_draws += 1
+
+    def on_resize(self, event):
+        self.fig.tight_layout()
+        self.background = None
+
+    def invalidate(self):
+        """
+        Markerer at aksene er brukt til noe annet (historikk), så linjene bygges på nytt ved neste oppdatering.
+        """
+        self.stale = True
+        self.background = None
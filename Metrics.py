@@ -0,0 +1,195 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Øvre grenser (ms) for histogrammene: 0.01 ms til 25 s, ti bøtter per tidobling, så en
+# anslått persentil aldri er mer enn ca. 26 % fra riktig verdi
+BUCKETS_MS = [round(10 ** (exponent / 10), 4) for exponent in range(-20, 45)]
+
+
+class Counter:
+    """
+    Teller som bare øker. Trådsikker; kall inc() per blokk heller enn per måling i varme løkker.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Fordeling av verdier (typisk millisekunder) i faste bøtter, med antall, sum, maks og
+    anslåtte persentiler. Minnebruken er konstant uansett hvor mange verdier som registreres.
+    """
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Siste bøtte er alt over høyeste grense
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def observe_many(self, values):
+        """
+        Registrerer mange verdier under én lås.
+        """
+        with self.lock:
+            for value in values:
+                self.counts[bisect_left(self.buckets, value)] += 1
+                self.total += value
+                if value > self.max:
+                    self.max = value
+            self.count += len(values)
+
+    def percentile(self, fraction):
+        """
+        Returns:
+            float: Anslått persentil, interpolert lineært innenfor bøtta den ligger i (aldri
+                   over største registrerte verdi). 0 uten data.
+        """
+        with self.lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = fraction * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = min(self.buckets[index], maximum) if index < len(self.buckets) else maximum
+                return lower + (upper - lower) * max(0.0, rank - seen) / bucket_count
+            seen += bucket_count
+        return maximum
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    """
+    Samling av tellere, histogrammer og målere (funksjoner som leses ved avlesning) for
+    innsamlingen. Avleses med snapshot() eller over HTTP med serve().
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.server = None
+
+    def counter(self, name):
+        """
+        Returns:
+            Counter: Telleren med dette navnet; opprettes første gang.
+        """
+        with self.lock:
+            return self.counters.setdefault(name, Counter())
+
+    def histogram(self, name):
+        """
+        Returns:
+            Histogram: Histogrammet med dette navnet; opprettes første gang.
+        """
+        with self.lock:
+            return self.histograms.setdefault(name, Histogram())
+
+    def gauge(self, name, read):
+        """
+        Registrerer en måler. read() kalles ved hver avlesning, f.eks. lambda: queue.depth().
+        """
+        with self.lock:
+            self.gauges[name] = read
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 'uptime' (sekunder), 'counters', 'rates' (per sekund siden start),
+                  'histograms' (count, mean, p50, p95, p99, max) og 'gauges'.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+            gauges = dict(self.gauges)
+        uptime = time.time() - self.started
+        values = {name: counter.value for name, counter in counters.items()}
+        gauge_values = {}
+        for name, read in gauges.items():
+            try:
+                gauge_values[name] = read()
+            except Exception as e:
+                gauge_values[name] = repr(e)
+        return {
+            'uptime': uptime,
+            'counters': values,
+            'rates': {name: value / uptime if uptime > 0 else 0.0 for name, value in values.items()},
+            'histograms': {name: histogram.snapshot() for name, histogram in histograms.items()},
+            'gauges': gauge_values,
+        }
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """
+        Starter en HTTP-server i en egen tråd som svarer med snapshot() som JSON på GET /metrics.
+        Lytter bare lokalt som standard.
+
+        Args:
+            port (int): TCP-port. 0 gir en ledig port (se self.server.server_address).
+            host (str): Adressen det lyttes på.
+
+        Returns:
+            ThreadingHTTPServer: Serveren; stoppes med stop_serving().
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), indent=2).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Ikke én loggmelding per avlesning
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        return self.server
+
+    def stop_serving(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Felles for alle innsamlere i prosessen, så CollectorManager får summen for alle enhetene
+metrics = Metrics()
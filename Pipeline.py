@@ -0,0 +1,139 @@
+import queue
+import threading
+
+
+class StageQueue:
+    """
+    Begrenset kø mellom to trinn i innsamlingen (leser -> tolker -> skriver).
+
+    Køen teller dybde, høyeste dybde, tapte elementer og mottrykk, slik at man kan se
+    hvilket trinn som ikke holder følge. Med drop_when_full=True blokkerer put() aldri;
+    elementer som ikke får plass forkastes og telles. Ellers venter produsenten (mottrykk).
+    """
+
+    def __init__(self, name, maxsize, drop_when_full=False):
+        """
+        Args:
+            name (str): Navn på køen, brukes i statistikken.
+            maxsize (int): Maks antall elementer i køen.
+            drop_when_full (bool): Forkast i stedet for å blokkere når køen er full.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_when_full = drop_when_full
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+        self.lock = threading.Lock()
+        self.put_count = 0
+        self.dropped = 0
+        self.backpressure = 0
+        self.high_water = 0
+
+    def put(self, item):
+        """
+        Legger et element i køen.
+
+        Args:
+            item: Elementet som skal videre til neste trinn.
+
+        Returns:
+            bool: False dersom elementet ble forkastet fordi køen var full.
+        """
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.drop_when_full:
+                with self.lock:
+                    self.dropped += 1
+                return False
+            with self.lock:
+                self.backpressure += 1
+            self.queue.put(item)
+
+        with self.lock:
+            self.put_count += 1
+            depth = self.queue.qsize()
+            if depth > self.high_water:
+                self.high_water = depth
+        return True
+
+    def get(self, timeout=0.1):
+        """
+        Henter neste element. Venter til et element er tilgjengelig eller køen er lukket og tom.
+
+        Args:
+            timeout (float): Hvor ofte (sekunder) det sjekkes om køen er lukket.
+
+        Returns:
+            Neste element, eller None når køen er lukket og tom.
+        """
+        while True:
+            try:
+                return self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # Produsenten lukker køen etter siste put, så en lukket og tom kø er ferdig
+                if self.closed and self.queue.empty():
+                    return None
+
+    def poll(self, timeout):
+        """
+        Henter neste element, men venter maks timeout sekunder.
+
+        Returns:
+            Neste element, eller None ved timeout. Bruk finished() for å skille en lukket kø fra timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def finished(self):
+        """
+        Returns:
+            bool: True når produsenten har lukket køen og alt er hentet.
+        """
+        return self.closed and self.queue.empty()
+
+    def getNowait(self):
+        """
+        Henter neste element uten å vente.
+
+        Returns:
+            Neste element, eller None dersom køen er tom.
+        """
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """
+        Markerer at produsenten er ferdig. Konsumenten tømmer resten av køen og avslutter.
+        """
+        self.closed = True
+
+    def reopen(self):
+        """
+        Gjør køen klar til en ny innsamlingsrunde.
+        """
+        self.closed = False
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Dybde, kapasitet, høyeste dybde og tellere for køen.
+        """
+        with self.lock:
+            return {
+                'name': self.name,
+                'depth': self.queue.qsize(),
+                'maxsize': self.maxsize,
+                'high_water': self.high_water,
+                'put': self.put_count,
+                'dropped': self.dropped,
+                'backpressure': self.backpressure,
+            }
@@ -1,49 +1,69 @@
-import mysql.connector
+import os
+import sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Storage import DEFAULT_BACKEND, get_pool
+from ThresholdCache import get_threshold_cache
+
 class SensorDataFetcher:
-    def __init__(self, host="localhost", user="root", password="root", database="sensordata"):
-        self.config = {
-            "host": host,
-            "user": user,
-            "password": password,
-            "database": database
-        }
+    def __init__(self, host="localhost", user="root", password="root", database="sensordata", backend=None, path=None, pool_size=2):
+        # backend: 'mysql' eller 'sqlite' (standard: SENSORDATA_BACKEND). path brukes bare for SQLite.
+        # Forbindelsene deles via en pool, så hver oppdatering slipper ny tilkobling og innlogging.
+        if (backend or DEFAULT_BACKEND) == 'sqlite':
+            self.config = {"path": path} if path is not None else {}
+        else:
+            self.config = {
+                "host": host,
+                "user": user,
+                "password": password,
+                "database": database,
+                "autocommit": True  # Ellers ser en gjenbrukt forbindelse et gammelt øyeblikksbilde
+            }
+        self.pool = get_pool(backend, size=pool_size, **self.config)
+        self.backend = backend
+        # Grensene holdes i minnet og lastes bare på nytt når alarmthresholds endres. Cachen
+        # opprettes ved første henting (se threshold_cache), så konstruktøren aldri kobler til.
+        self.thresholds = None
 
-    def get_latest_data(self, temp_sensor_id=1, accel_sensor_id=2):
-        try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
+    def threshold_cache(self):
+        # Opprettes og lastes første gang den trengs, dvs. i FetchWorker-tråden ved første
+        # henting. Et vindu som startes mens databasen ikke svarer, fryser dermed ikke.
+        if self.thresholds is None:
+            self.thresholds = get_threshold_cache(self.backend, **self.config)
+        return self.thresholds
 
-            # Hent siste temperaturverdi
-            cursor.execute("""
-                SELECT temperature, sensor_id FROM temperaturereadings
-                WHERE sensor_id = %s
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """, (temp_sensor_id,))
-            temp_row = cursor.fetchone()
+    def pool_stats(self):
+        # Ventetid ved utlån og antall åpnede/lukkede forbindelser (se ConnectionPool.stats)
+        return self.pool.stats()
 
-            # Hent siste akselerasjonsverdi
-            cursor.execute("""
-                SELECT x, y, z, sensor_id FROM accelerationreadings
-                WHERE sensor_id = %s
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """, (accel_sensor_id,))
-            accel_row = cursor.fetchone()
+    def get_latest_data(self, temp_sensor_id=1, accel_sensor_id=2):
+        self.threshold_cache()  # Første henting laster grensene
+        try:
+            with self.pool.connection() as db:
+                # Hent siste temperaturverdi
+                temp_row = db.query_one("""
+                    SELECT temperature, sensor_id FROM temperaturereadings
+                    WHERE sensor_id = %s
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                """, (temp_sensor_id,), as_dict=True)
 
-            cursor.close()
-            conn.close()
+                # Hent siste akselerasjonsverdi
+                accel_row = db.query_one("""
+                    SELECT acceleration_x AS x, acceleration_y AS y, acceleration_z AS z, sensor_id FROM accelerationreadings
+                    WHERE sensor_id = %s
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                """, (accel_sensor_id,), as_dict=True)
 
             if temp_row and accel_row:
-                thresholds = self.get_thresholds(temp_sensor_id)
                 return {
                     "temperature": round(temp_row['temperature'], 2),
                     "x": round(accel_row['x'], 3),
                     "y": round(accel_row['y'], 3),
                     "z": round(accel_row['z'], 3),
-                    "thresholds": thresholds
+                    "thresholds": self.get_thresholds(temp_sensor_id, accel_sensor_id)
                 }
             else:
                 return None
@@ -52,37 +72,30 @@ class SensorDataFetcher:
             print("Databasefeil:", e)
             return None
 
-    def get_thresholds(self, sensor_id):
-        try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
-
-            cursor.execute("""
-                SELECT threshold_type, min_value, max_value
-                FROM alarmthresholds
-                WHERE sensor_id = %s
-            """, (sensor_id,))
-            rows = cursor.fetchall()
-
-            cursor.close()
-            conn.close()
-
-            thresholds = {}
-            for row in rows:
-                if row["threshold_type"] == "temp":
-                    thresholds["temp_min"] = row["min_value"]
-                    thresholds["temp_max"] = row["max_value"]
-                elif row["threshold_type"] == "accel":
-                    thresholds["accel_threshold"] = max(abs(row["min_value"]), abs(row["max_value"]))
+    def get_thresholds(self, sensor_id, accel_sensor_id=None):
+        # Temperaturgrensen slås opp på sensor_id og akselerasjonsgrensen på accel_sensor_id
+        # (standard: samme sensor). Mangler en grense, brukes standardverdien, så GUI-en alltid
+        # får alle nøklene.
+        thresholds = self.default_thresholds()
+        cache = self.threshold_cache()
+        if not cache.loaded:
+            print("Feil ved henting av grenseverdier: grensene er ikke lastet")
             return thresholds
 
-        except Exception as e:
-            print("Feil ved henting av grenseverdier:", e)
-            return {
-                "temp_min": -4,
-                "temp_max": 28,
-                "accel_threshold": 15
-            }
+        temp = cache.get(sensor_id, "T", fallback=False)
+        if temp is not None:
+            thresholds["temp_min"], thresholds["temp_max"] = temp
+        accel = cache.get(sensor_id if accel_sensor_id is None else accel_sensor_id, "A", fallback=False)
+        if accel is not None:
+            thresholds["accel_threshold"] = max(abs(accel[0]), abs(accel[1]))
+        return thresholds
+
+    def default_thresholds(self):
+        return {
+            "temp_min": -4,
+            "temp_max": 28,
+            "accel_threshold": 15
+        }
 
 
 if __name__ == "__main__":
@@ -94,3 +107,4 @@ if __name__ == "__main__":
     else:
         print("Ingen data funnet.")
     print(fetcher.get_thresholds(sensor_id=1))
+    print("Pool:", fetcher.pool_stats())
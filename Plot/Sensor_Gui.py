@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from datetime import datetime
 from Sensor_Db import SensorDataFetcher
+from FetchWorker import FetchWorker  # Sensor_Db legger prosjektmappen i sys.path
 
 
 class SensorGUI:
@@ -20,12 +21,16 @@ class SensorGUI:
         self.timestamps = []
 
         self.fetcher = SensorDataFetcher(password="DittPassordHer")
+        # Spørringene kjøres i en egen tråd, så en treg eller utilgjengelig database ikke fryser vinduet
+        self.worker = FetchWorker(self.fetcher.get_latest_data, interval=5.0)
 
         self.history_start = tk.StringVar(value="00:00:00")
         self.history_end = tk.StringVar(value="23:59:59")
         self.view_mode = tk.StringVar(value="Live")
 
         self.build_gui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.worker.start()
         self.update_gui()
 
     def build_gui(self):
@@ -52,6 +57,9 @@ class SensorGUI:
         self.accel_label = tk.Label(main_frame, text="Akselerasjon: -", font=("Arial", 14))
         self.accel_label.pack(fill=tk.X)
 
+        self.db_label = tk.Label(main_frame, text="Database: -", font=("Arial", 10), fg="gray")
+        self.db_label.pack(fill=tk.X)
+
         self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(12, 2), gridspec_kw={'height_ratios': [1, 1], 'hspace': 0.5})
         self.canvas = FigureCanvasTkAgg(self.fig, master=main_frame)
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(20, 40))
@@ -88,42 +96,51 @@ class SensorGUI:
         self.log_box.insert(tk.END, event)
         self.log_box.yview_moveto(1)
 
+    def close(self):
+        self.worker.stop()
+        self.root.destroy()
+
     def update_gui(self):
-        if self.view_mode.get() == "Live":
-            data = self.fetcher.get_latest_data()
-            if not data:
-                return
-
-            timestamp = datetime.now().strftime("%H:%M:%S")
-
-            self.timestamps.append(timestamp)
-            self.temperatures.append(data['temperature'])
-            self.accelerations.append((data['x'], data['y'], data['z']))
-
-            self.temp_label.config(text=f"Temperatur: {data['temperature']}°C")
-            self.accel_label.config(text=f"Akselerasjon: x={data['x']}, y={data['y']}, z={data['z']}")
-
-            # Bruk thresholds fra databasen
-            thresholds = data['thresholds']
-            if thresholds['temp_min'] <= data['temperature'] <= thresholds['temp_max']:
-                self.green_light.itemconfig(self.green_light_indicator, fill="green")
-                self.red_light.itemconfig(self.red_light_indicator, fill="gray")
-            else:
-                self.green_light.itemconfig(self.green_light_indicator, fill="gray")
-                self.red_light.itemconfig(self.red_light_indicator, fill="red")
-                self.log_event(f"[{timestamp}] Temperaturalarm: {data['temperature']}°C")
-
-            accel_threshold = thresholds['accel_threshold']
-            if any(abs(data[axis]) > accel_threshold for axis in ['x', 'y', 'z']):
-                self.accel_green_light.itemconfig(self.accel_green_indicator, fill="gray")
-                self.accel_red_light.itemconfig(self.accel_red_indicator, fill="red")
-                self.log_event(f"[{timestamp}] Akselerasjonsalarm: x={data['x']}, y={data['y']}, z={data['z']}")
-            else:
-                self.accel_green_light.itemconfig(self.accel_green_indicator, fill="green")
-                self.accel_red_light.itemconfig(self.accel_red_indicator, fill="gray")
-
-            self.plot_data()
-        self.root.after(5000, self.update_gui)
+        # Tømmer resultatene fra FetchWorker; blokkerer aldri på databasen
+        for _, data, elapsed_ms, error in self.worker.drain():
+            if error is not None or not data:
+                self.db_label.config(text=f"Database: ingen data ({error or 'se konsoll'}, {elapsed_ms:.0f} ms)", fg="red")
+                continue
+            self.db_label.config(text=f"Database: {elapsed_ms:.1f} ms", fg="gray")
+            if self.view_mode.get() == "Live":
+                self.show_data(data)
+        self.root.after(100, self.update_gui)
+
+    def show_data(self, data):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+
+        self.timestamps.append(timestamp)
+        self.temperatures.append(data['temperature'])
+        self.accelerations.append((data['x'], data['y'], data['z']))
+
+        self.temp_label.config(text=f"Temperatur: {data['temperature']}°C")
+        self.accel_label.config(text=f"Akselerasjon: x={data['x']}, y={data['y']}, z={data['z']}")
+
+        # Bruk thresholds fra databasen
+        thresholds = data['thresholds']
+        if thresholds['temp_min'] <= data['temperature'] <= thresholds['temp_max']:
+            self.green_light.itemconfig(self.green_light_indicator, fill="green")
+            self.red_light.itemconfig(self.red_light_indicator, fill="gray")
+        else:
+            self.green_light.itemconfig(self.green_light_indicator, fill="gray")
+            self.red_light.itemconfig(self.red_light_indicator, fill="red")
+            self.log_event(f"[{timestamp}] Temperaturalarm: {data['temperature']}°C")
+
+        accel_threshold = thresholds['accel_threshold']
+        if any(abs(data[axis]) > accel_threshold for axis in ['x', 'y', 'z']):
+            self.accel_green_light.itemconfig(self.accel_green_indicator, fill="gray")
+            self.accel_red_light.itemconfig(self.accel_red_indicator, fill="red")
+            self.log_event(f"[{timestamp}] Akselerasjonsalarm: x={data['x']}, y={data['y']}, z={data['z']}")
+        else:
+            self.accel_green_light.itemconfig(self.accel_green_indicator, fill="green")
+            self.accel_red_light.itemconfig(self.accel_red_indicator, fill="gray")
+
+        self.plot_data()
 
     def plot_data(self):
         self.ax1.clear()
@@ -0,0 +1,195 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as FrameCounter
+from Metrics import Histogram, metrics
+
+log = logging.getLogger('profiling')
+
+
+class _NullSection:
+    # Brukes når profileringen er av: with-blokken koster bare to tomme metodekall
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = _NullSection()
+
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Valgfri tidtaking av trinnene i innsamlingen (seriell lesing, JSON-tolking, grensesjekk,
+    INSERT, commit osv.).
+
+    Trinnene omsluttes med `with profiler.section('navn'):`. Når profileringen er av, returnerer
+    section() et delt tomt objekt, så kostnaden er et attributtoppslag og to tomme metodekall.
+    Når den er på, legges varigheten i et histogram per trinn. Trinnene måles per blokk eller
+    bolk, ikke per måling, så tidtakingen selv koster lite også ved kHz.
+
+    En rapporttråd logger hvert report_interval sekund kall per sekund, p50/p95/p99 og andel av
+    tiden per trinn for siste intervall. Siste rapport kan også leses fra /metrics ('profile').
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.report_interval = 10.0
+        self.window = {}
+        self.window_started = time.monotonic()
+        self.lock = threading.Lock()
+        self.last_report = {}
+        self.thread = None
+        self.sampler = None
+
+    def section(self, name):
+        """
+        Args:
+            name (str): Navn på trinnet, f.eks. 'write.commit'.
+
+        Returns:
+            Kontekstbehandler som måler tiden i with-blokken.
+        """
+        if not self.enabled:
+            return NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name, seconds):
+        histogram = self.window.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.window.setdefault(name, Histogram())
+        histogram.observe(1000 * seconds)
+
+    def enable(self, report_interval=10.0):
+        """
+        Slår på tidtakingen og starter rapporttråden.
+
+        Args:
+            report_interval (float): Sekunder mellom hver rapport i loggen. 0 gir ingen rapporttråd;
+                                     bruk report() selv.
+        """
+        self.report_interval = report_interval
+        self.window = {}
+        self.window_started = time.monotonic()
+        self.enabled = True
+        metrics.gauge('profile', lambda: self.last_report)
+        if report_interval and self.thread is None:
+            self.thread = threading.Thread(target=self.loop, name='profiler', daemon=True)
+            self.thread.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def report(self):
+        """
+        Lager rapport for tiden siden forrige rapport, og starter et nytt intervall.
+
+        Returns:
+            dict: Trinn -> {'calls_per_sec', 'p50', 'p95', 'p99', 'max' (ms), 'share' (andel av
+                  intervallet brukt i trinnet, summert over alle tråder)}.
+        """
+        with self.lock:
+            window, self.window = self.window, {}
+            started, self.window_started = self.window_started, time.monotonic()
+        elapsed = max(1e-9, time.monotonic() - started)
+        report = {}
+        for name in sorted(window):
+            snapshot = window[name].snapshot()
+            report[name] = {
+                'calls_per_sec': snapshot['count'] / elapsed,
+                'p50': snapshot['p50'],
+                'p95': snapshot['p95'],
+                'p99': snapshot['p99'],
+                'max': snapshot['max'],
+                'share': snapshot['mean'] * snapshot['count'] / 1000 / elapsed,
+            }
+        self.last_report = report
+        return report
+
+    def format_report(self, report):
+        lines = [f"{'trinn':22s} {'kall/s':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'andel':>7s}"]
+        for name, stage in report.items():
+            lines.append(f"{name:22s} {stage['calls_per_sec']:9.1f} {stage['p50']:8.3f} {stage['p95']:8.3f} "
+                         f"{stage['p99']:8.3f} {100 * stage['share']:6.1f}%")
+        return '\n'.join(lines)
+
+    def loop(self):
+        while self.enabled:
+            deadline = time.monotonic() + self.report_interval
+            while self.enabled and time.monotonic() < deadline:
+                time.sleep(0.1)
+            report = self.report()
+            if report:
+                log.info("Stage timings:\n%s", self.format_report(report))
+
+    def sample_stacks(self, seconds, path, interval=0.005):
+        """
+        Tar stakkprøver av alle tråder i seconds sekunder og skriver dem som "folded stacks"
+        (én linje per stakk: 'tråd;fil:funksjon;... antall'), som flamegraph.pl og speedscope
+        leser. Kjøres i en egen tråd og stopper av seg selv. cProfile ser bare tråden som starter
+        den, mens innsamlingen har én tråd per trinn; derfor brukes prøvetaking.
+
+        Args:
+            seconds (float): Hvor lenge det tas prøver.
+            path (str): Filen som skrives når vinduet er over.
+            interval (float): Sekunder mellom hver prøve. 5 ms gir rundt 1 % ekstra CPU.
+
+        Returns:
+            threading.Thread: Tråden som tar prøvene.
+        """
+        def run():
+            stacks = FrameCounter()
+            names = {}
+            own = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread in threading.enumerate():
+                    names[thread.ident] = thread.name
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)).replace(' ', '_'))
+                    stacks[';'.join(reversed(stack))] += 1
+                time.sleep(interval)
+            with open(path, 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            log.info("Wrote %d stack samples to %s", sum(stacks.values()), path)
+
+        self.sampler = threading.Thread(target=run, name='stack-sampler', daemon=True)
+        self.sampler.start()
+        return self.sampler
+
+
+# Felles for hele prosessen; slås på med profiler.enable()
+profiler = Profiler()
@@ -0,0 +1,304 @@
+"""
+Oppbevaringsjobb for målingstabellene.
+
+På MySQL er temperaturereadings/accelerationreadings partisjonert på timestamp per dag eller
+måned (se CreateSqlTabels.py --partition). Jobben sørger for at det finnes partisjoner noen
+perioder fram i tid, og sletter utløpte data ved å droppe hele partisjoner i stedet for
+DELETE rad for rad. Spørringer som filtrerer på timestamp (f.eks. dagens data med
+timestamp >= CURDATE()) leser da bare partisjonene som dekker intervallet.
+
+DDL krever en kort metadata-lås på tabellen. En DDL som venter på låsen blokkerer alle nye
+INSERT-er bak seg, så jobben setter lock_wait_timeout lavt og prøver heller igjen senere,
+i stedet for å stå i kø og stoppe innsamlingen.
+
+Nye partisjoner lages ved å dele opp den siste partisjonen pmax (REORGANIZE PARTITION). Så lenge
+pmax er tom, er det bare en rask metadataendring. Ligger det rader i pmax (jobben har ikke kjørt
+på lenge), må de kopieres, og tabellen er låst for skriving hele tiden. Da hoppes det over med
+en advarsel, med mindre --reorganize-nonempty er gitt. REORGANIZE kjøres bare når det er færre
+enn --ahead framtidige partisjoner, dvs. omtrent én gang per periode.
+
+SQLite har ikke partisjoner; der slettes utløpte rader i små bolker med én transaksjon per bolk.
+
+Rollups (se Rollup.py) slettes rad for rad: 1 s-oppløsningen etter like mange dager som
+målingene, 1 min og 1 t etter --keep-rollup-days.
+
+    python Retention.py --keep-days 30
+    python Retention.py --keep-days 30 --interval 3600     # kjør hver time
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from Rollup import RESOLUTIONS, SOURCES
+from Storage import open_backend
+
+# Målingstabell -> alarmtabellen som refererer til den
+READING_TABLES = {
+    'TEMPERATUREREADINGS': 'TEMPERATUREALARMS',
+    'ACCELERATIONREADINGS': 'ACCELERATIONALARMS',
+}
+
+LOCK_WAIT_TIMEOUT_ERRORS = (1205,)
+
+
+def period_start(day, granularity):
+    """
+    Første dag i perioden (dag eller måned) som day ligger i.
+    """
+    return day if granularity == 'day' else day.replace(day=1)
+
+
+def next_period(start, granularity):
+    """
+    Første dag i perioden etter den som starter på start.
+    """
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start, granularity):
+    return start.strftime('p%Y%m%d' if granularity == 'day' else 'p%Y%m')
+
+
+def parse_partition_name(name):
+    """
+    Tolker et partisjonsnavn laget av partition_name().
+
+    :return: (startdato, granularitet), eller None for pmax og ukjente navn.
+    """
+    digits = name[1:]
+    if not name.startswith('p') or not digits.isdigit():
+        return None
+    if len(digits) == 8:
+        return date(int(digits[:4]), int(digits[4:6]), int(digits[6:])), 'day'
+    if len(digits) == 6:
+        return date(int(digits[:4]), int(digits[4:]), 1), 'month'
+    return None
+
+
+def partition_definitions(first, last, granularity):
+    """
+    Partisjonsdefinisjoner for alle perioder fra og med first til og med last.
+    """
+    definitions = []
+    start = period_start(first, granularity)
+    while start <= last:
+        end = next_period(start, granularity)
+        definitions.append(f"PARTITION {partition_name(start, granularity)} VALUES LESS THAN ('{end}')")
+        start = end
+    return definitions
+
+
+def partitions(db, table):
+    """
+    Navn på partisjonene til en MySQL-tabell i stigende rekkefølge. Tom liste hvis tabellen ikke
+    er partisjonert.
+    """
+    rows = db.query("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND LOWER(TABLE_NAME) = LOWER(%s) AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return [row[0] for row in rows]
+
+
+def run_ddl(db, sql, lock_wait_timeout=2, retries=5):
+    """
+    Kjører en DDL-setning med kort ventetid på metadata-låsen, og prøver igjen med økende pause
+    dersom tabellen er i bruk.
+
+    :return: True hvis setningen ble kjørt.
+    """
+    db.execute(f"SET SESSION lock_wait_timeout = {int(lock_wait_timeout)}")
+    for attempt in range(retries):
+        try:
+            db.execute(sql)
+            return True
+        except db.Error as e:
+            if not e.args or e.args[0] not in LOCK_WAIT_TIMEOUT_ERRORS:
+                raise
+            print(f"Tabellen er låst, prøver igjen ({attempt + 1}/{retries})")
+            time.sleep(2 ** attempt)
+    return False
+
+
+def ensure_partitions(db, table, ahead=3, today=None, reorganize_nonempty=False):
+    """
+    Legger til partisjoner slik at det finnes minst ahead perioder etter dagens, ved å dele opp
+    pmax. Er pmax tom, er det en ren metadataoperasjon. Ellers kopieres radene i pmax mens
+    tabellen er låst for skriving, så det gjøres bare med reorganize_nonempty=True.
+
+    :param reorganize_nonempty: Del opp pmax selv om den har rader, og blokker innsamlingen så lenge.
+    :return: Navn på partisjonene som ble lagt til. Tom liste hvis DDL-en ikke ble kjørt.
+    """
+    today = today or date.today()
+    parsed = [parse_partition_name(name) for name in partitions(db, table)]
+    parsed = [p for p in parsed if p]
+    if not parsed:
+        return []
+    last_start, granularity = parsed[-1]
+
+    target = period_start(today, granularity)
+    for _ in range(ahead):
+        target = next_period(target, granularity)
+    definitions = partition_definitions(next_period(last_start, granularity), target, granularity)
+    if not definitions:
+        return []
+    if not reorganize_nonempty and db.query_one(f"SELECT 1 FROM {table} PARTITION (pmax) LIMIT 1"):
+        print(f"{table}: pmax har rader, og å dele den opp ville blokkert skriving mens de kopieres. "
+              f"Kjør med --reorganize-nonempty i et vedlikeholdsvindu.")
+        return []
+
+    if not run_ddl(db, f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ("
+                       + ", ".join(definitions + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"]) + ")"):
+        return []
+    return [definition.split()[1] for definition in definitions]
+
+
+def drop_expired(db, table, keep_days, today=None):
+    """
+    Dropper partisjoner der alle rader er eldre enn keep_days dager, og sletter alarmer som
+    refererte til målinger i de droppede partisjonene.
+
+    :return: Navn på partisjonene som ble droppet.
+    """
+    cutoff = (today or date.today()) - timedelta(days=keep_days)
+    expired = []
+    for name in partitions(db, table):
+        parsed = parse_partition_name(name)
+        if parsed and next_period(*parsed) <= cutoff:
+            expired.append(name)
+    if not expired:
+        return []
+
+    if run_ddl(db, f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"):
+        purge_orphan_alarms(db, table, READING_TABLES[table.upper()])
+        return expired
+    return []
+
+
+def purge_orphan_alarms(db, readings_table, alarms_table, chunk=1000):
+    """
+    Sletter alarmer som peker på målinger som ikke finnes lenger. Alarmene gås gjennom i bolker
+    på chunk alarm_id-er med én transaksjon hver, og hver alarm sjekkes med NOT EXISTS. En lavere
+    reading_id betyr ikke en eldre måling (avspilt spool, flere skrivere), så det holder ikke å
+    sammenligne med den minste reading_id som er igjen.
+
+    :return: Antall slettede alarmer.
+    """
+    total = 0
+    last = 0
+    while True:
+        rows = db.query(f"SELECT alarm_id FROM {alarms_table} WHERE alarm_id > %s ORDER BY alarm_id LIMIT {int(chunk)}", (last,))
+        if not rows:
+            break
+        first, last = rows[0][0], rows[-1][0]
+        total += db.execute(f"DELETE FROM {alarms_table} WHERE alarm_id BETWEEN %s AND %s AND NOT EXISTS "
+                            f"(SELECT 1 FROM {readings_table} WHERE {readings_table}.reading_id = {alarms_table}.reading_id)",
+                            (first, last)).rowcount
+        db.commit()
+        if len(rows) < chunk:
+            break
+    return total
+
+
+def purge_rows(db, table, keep_days, chunk=5000, today=None):
+    """
+    Sletter utløpte rader i bolker for tabeller uten partisjoner (SQLite, eller MySQL som ikke er
+    partisjonert). Hver bolk er egen transaksjon, så innsamlingen aldri venter lenge på låsen.
+
+    :return: Antall slettede målinger.
+    """
+    cutoff = str((today or date.today()) - timedelta(days=keep_days))
+    alarms_table = READING_TABLES[table.upper()]
+    total = 0
+    while True:
+        rows = db.query(f"SELECT reading_id FROM {table} WHERE timestamp < %s ORDER BY reading_id LIMIT {int(chunk)}", (cutoff,))
+        if not rows:
+            break
+        last = rows[-1][0]
+        db.execute(f"DELETE FROM {alarms_table} WHERE reading_id IN "
+                   f"(SELECT reading_id FROM {table} WHERE reading_id <= %s AND timestamp < %s)", (last, cutoff))
+        deleted = db.execute(f"DELETE FROM {table} WHERE reading_id <= %s AND timestamp < %s", (last, cutoff)).rowcount
+        db.commit()
+        total += deleted
+        if len(rows) < chunk:
+            break
+    return total
+
+
+def purge_rollups(db, keep_days, today=None):
+    """
+    Sletter utløpte rollups. Det slettes per sensor, målestørrelse og oppløsning, så hver DELETE
+    er et område i primærnøkkelen, med én transaksjon hver.
+
+    :param keep_days: Ordbok oppløsning (sekunder) -> antall dager som skal beholdes. Oppløsninger
+                      som mangler eller har None, beholdes.
+    :return: Antall slettede rader.
+    """
+    today = today or date.today()
+    metrics = [metric for columns in SOURCES.values() for metric in columns]
+    sensors = [row[0] for row in db.query("SELECT DISTINCT sensor_id FROM ROLLUPS")]
+    total = 0
+    for resolution in RESOLUTIONS:
+        if keep_days.get(resolution) is None:
+            continue
+        cutoff = str(today - timedelta(days=keep_days[resolution]))
+        for sensor_id in sensors:
+            for metric in metrics:
+                total += db.execute("DELETE FROM ROLLUPS WHERE sensor_id = %s AND metric = %s "
+                                    "AND resolution = %s AND bucket_start < %s",
+                                    (sensor_id, metric, resolution, cutoff)).rowcount
+                db.commit()
+    return total
+
+
+def apply_retention(db, keep_days, ahead=3, today=None, keep_rollup_days=365, reorganize_nonempty=False):
+    """
+    Kjører én runde av oppbevaringsjobben på alle målingstabellene og rollups.
+
+    :param db: Tilkoblet StorageBackend.
+    :param keep_days: Antall dager med data som skal beholdes. Gjelder også 1 s-rollups.
+    :param ahead: Antall framtidige perioder det skal finnes partisjoner for.
+    :param keep_rollup_days: Antall dager med 1 min- og 1 t-rollups som skal beholdes. None beholder alt.
+    :param reorganize_nonempty: Se ensure_partitions.
+    """
+    for table in READING_TABLES:
+        if db.name == 'mysql' and partitions(db, table):
+            added = ensure_partitions(db, table, ahead, today, reorganize_nonempty)
+            dropped = drop_expired(db, table, keep_days, today)
+            print(f"{table}: la til {len(added)} og droppet {len(dropped)} partisjoner")
+        else:
+            print(f"{table}: slettet {purge_rows(db, table, keep_days, today=today)} rader")
+    rollup_keep_days = {1: keep_days, 60: keep_rollup_days, 3600: keep_rollup_days}
+    print(f"ROLLUPS: slettet {purge_rollups(db, rollup_keep_days, today)} rader")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=None)
+    parser.add_argument('--keep-days', type=int, required=True)
+    parser.add_argument('--ahead', type=int, default=3, help="Antall framtidige partisjoner")
+    parser.add_argument('--keep-rollup-days', type=int, default=365,
+                        help="Dager med 1 min- og 1 t-rollups som beholdes (1 s følger --keep-days)")
+    parser.add_argument('--reorganize-nonempty', action='store_true',
+                        help="Del opp pmax selv om den har rader; blokkerer skriving mens radene kopieres")
+    parser.add_argument('--interval', type=float, default=None, help="Gjenta hvert N. sekund")
+    args = parser.parse_args()
+
+    db = open_backend(args.backend)
+    db.connect()
+    try:
+        while True:
+            db.ping()
+            apply_retention(db, args.keep_days, args.ahead, keep_rollup_days=args.keep_rollup_days,
+                            reorganize_nonempty=args.reorganize_nonempty)
+            if args.interval is None:
+                break
+            time.sleep(args.interval)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from array import array
+
+
+class RingBuffer:
+    """
+    Ringbuffer med fast kapasitet for tidsserier med en eller flere kolonner (f.eks. tid, x, y, z).
+
+    Kolonnene lagres i array('d') som allokeres én gang, så minnebruken er konstant uansett hvor
+    lenge programmet kjører. Når bufferen er full, overskrives de eldste verdiene.
+    """
+
+    def __init__(self, capacity, columns=1):
+        """
+        Args:
+            capacity (int): Maks antall rader som tas vare på.
+            columns (int): Antall verdier per rad.
+        """
+        self.capacity = capacity
+        self.columns = [array('d', bytes(8 * capacity)) for _ in range(columns)]
+        self.head = 0  # Indeksen neste rad skrives til
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, *values):
+        """
+        Legger til én rad i O(1).
+
+        Args:
+            *values (float): Én verdi per kolonne.
+        """
+        for column, value in zip(self.columns, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, *columns):
+        """
+        Legger til mange rader, gitt som én liste per kolonne.
+
+        Args:
+            *columns (list): Verdier per kolonne, alle like lange.
+        """
+        n = len(columns[0]) if columns else 0
+        if n > self.capacity:
+            columns = [values[n - self.capacity:] for values in columns]
+            n = self.capacity
+        if n == 0:
+            return
+        first = min(n, self.capacity - self.head)
+        for column, values in zip(self.columns, columns):
+            column[self.head:self.head + first] = array('d', values[:first])
+            if first < n:
+                column[:n - first] = array('d', values[first:])
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def last(self, n=None):
+        """
+        Henter de n nyeste radene i kronologisk rekkefølge.
+
+        Args:
+            n (int): Antall rader. None gir alle.
+
+        Returns:
+            list: Én array('d') per kolonne.
+        """
+        n = self.count if n is None else min(n, self.count)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return [column[start:start + n] for column in self.columns]
+        return [column[start:] + column[:self.head] for column in self.columns]
+
+    def latest(self):
+        """
+        Returns:
+            tuple: Verdiene i den nyeste raden, eller None hvis bufferen er tom.
+        """
+        if self.count == 0:
+            return None
+        index = (self.head - 1) % self.capacity
+        return tuple(column[index] for column in self.columns)
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
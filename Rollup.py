@@ -0,0 +1,382 @@
+"""
+Nedsamplede serier (rollups) av målingene med oppløsning 1 s, 1 min og 1 t.
+
+RollupAggregator leser nye målinger etter en høyvannsmerke på reading_id og oppdaterer
+min/maks/sum/antall per sensor, målestørrelse og tidsbøtte i tabellen ROLLUPS. Merket lagres i
+ROLLUP_STATE i samme transaksjon som bøttene, så hver måling telles nøyaktig én gang.
+
+Flere skrivere (og avspilling av spoolen) kan committe en lavere reading_id etter en høyere, så
+merket flyttes bare forbi sammenhengende ID-er. Et hull i reading_id er en transaksjon som ikke er
+committet ennå, og lesingen stopper der. Står hullet åpent i settle sekunder (f.eks. fordi
+transaksjonen ble rullet tilbake), hoppes det over, men ID-ene sjekkes igjen hver runde i
+late_window sekunder. Målinger som dukker opp der, legges til i bøttene sine da.
+
+fetch_series() velger den groveste oppløsningen som fortsatt er minst like fin som den
+ønskede, slik at lange tidsintervaller ikke trenger å lese rådata.
+
+    python Rollup.py                  # aggreger det som mangler og avslutt
+    python Rollup.py --interval 5     # aggreger hvert 5. sekund
+"""
+import argparse
+import logging
+import math
+import threading
+import time
+from IdGaps import GapTracker
+from Storage import open_backend
+
+log = logging.getLogger('rollup')
+
+# Kildetabell -> målestørrelsene (kolonnene) som aggregeres
+SOURCES = {
+    'temperaturereadings': ('temperature',),
+    'accelerationreadings': ('acceleration_x', 'acceleration_y', 'acceleration_z',
+                             'diff_acceleration_x', 'diff_acceleration_y', 'diff_acceleration_z'),
+}
+
+# Oppløsning i sekunder -> start på bøtta, gitt timestamp som 'YYYY-MM-DD HH:MM:SS'
+RESOLUTIONS = {
+    1: lambda timestamp: timestamp,
+    60: lambda timestamp: timestamp[:17] + '00',
+    3600: lambda timestamp: timestamp[:14] + '00:00',
+}
+
+UPSERT_SQL = {
+    'mysql': """
+        INSERT INTO ROLLUPS (sensor_id, metric, resolution, bucket_start, min_value, max_value, sum_value, sample_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            min_value = LEAST(min_value, VALUES(min_value)),
+            max_value = GREATEST(max_value, VALUES(max_value)),
+            sum_value = sum_value + VALUES(sum_value),
+            sample_count = sample_count + VALUES(sample_count)
+    """,
+    'sqlite': """
+        INSERT INTO ROLLUPS (sensor_id, metric, resolution, bucket_start, min_value, max_value, sum_value, sample_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (sensor_id, metric, resolution, bucket_start) DO UPDATE SET
+            min_value = MIN(min_value, excluded.min_value),
+            max_value = MAX(max_value, excluded.max_value),
+            sum_value = sum_value + excluded.sum_value,
+            sample_count = sample_count + excluded.sample_count
+    """,
+}
+
+# Tidsbøtte med lengde %s sekunder for nedsampling av rådata (se fetch_series)
+BUCKET_SQL = {
+    'mysql': "FLOOR(UNIX_TIMESTAMP(timestamp) / %s)",
+    'sqlite': "CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400) AS INTEGER) / %s",
+}
+
+STATE_SQL = {
+    'mysql': """
+        INSERT INTO ROLLUP_STATE (source, last_reading_id) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE last_reading_id = VALUES(last_reading_id)
+    """,
+    'sqlite': """
+        INSERT INTO ROLLUP_STATE (source, last_reading_id) VALUES (%s, %s)
+        ON CONFLICT (source) DO UPDATE SET last_reading_id = excluded.last_reading_id
+    """,
+}
+
+
+class RollupAggregator:
+    """
+    Bakgrunnsaggregator som holder ROLLUPS oppdatert fra målingstabellene.
+
+    Hullene som er hoppet over, huskes bare i minnet. Målinger som committes i et slikt hull
+    mens aggregatoren er stoppet, kommer ikke med i ROLLUPS.
+    """
+
+    # Maks antall ID-intervaller som sjekkes for sene målinger per kildetabell
+    MAX_LATE_RANGES = 10000
+
+    def __init__(self, backend, interval=5, chunk=10000, settle=10, late_window=3600):
+        """
+        Args:
+            backend (StorageBackend): Egen forbindelse for aggregatoren (ikke delt med skriveren).
+            interval (float): Sekunder mellom hver runde når den kjører som tråd.
+            chunk (int): Maks antall målinger som leses per spørring.
+            settle (float): Sekunder et hull i reading_id får stå åpent før det hoppes over.
+            late_window (float): Sekunder et hull som er hoppet over, sjekkes for sene målinger.
+        """
+        self.db = backend
+        self.interval = interval
+        self.chunk = chunk
+        self.settle = settle
+        self.late_window = late_window
+        self.running = False
+        self.thread = None
+        self.rows_aggregated = 0
+        self.late_rows = 0
+        self.gaps = {}  # Kilde -> (første manglende ID, monotonic() da hullet ble sett)
+        self.late = {}  # Kilde -> GapTracker med hull som sjekkes for sene målinger
+
+    def high_water_mark(self, source):
+        row = self.db.query_one("SELECT last_reading_id FROM ROLLUP_STATE WHERE source = %s", (source,))
+        return row[0] if row else 0
+
+    def run_once(self):
+        """
+        Aggregerer alle målinger som er kommet siden forrige runde.
+
+        Returns:
+            int: Antall målinger som ble aggregert.
+        """
+        total = 0
+        for source, metrics in SOURCES.items():
+            total += self._aggregate_late(source, metrics)
+            while True:
+                count, complete = self._aggregate(source, metrics)
+                total += count
+                if complete:
+                    break
+        self.rows_aggregated += total
+        return total
+
+    def _aggregate(self, source, metrics):
+        """
+        Aggregerer opptil chunk målinger fra source i én transaksjon.
+
+        Returns:
+            tuple: (antall aggregerte målinger, True hvis det ikke er flere klare målinger nå)
+        """
+        last_id = self.high_water_mark(source)
+        rows = self.db.query(
+            f"SELECT reading_id, sensor_id, timestamp, {', '.join(metrics)} FROM {source} "
+            f"WHERE reading_id > %s ORDER BY reading_id LIMIT {int(self.chunk)}",
+            (last_id,)
+        )
+
+        now = time.monotonic()
+        count = 0
+        for row in rows:
+            if row[0] > last_id + 1:
+                missing = last_id + 1
+                gap = self.gaps.get(source)
+                if gap is None or gap[0] != missing:
+                    gap = self.gaps[source] = (missing, now)
+                if now - gap[1] < self.settle:
+                    break  # Venter på at transaksjonen som har ID-ene, committer
+                log.info("Skipping reading_id %d-%d in %s, checking them for late rows for %.0f s",
+                         missing, row[0] - 1, source, self.late_window)
+                self._add_late(source, missing, row[0] - 1, now)
+            last_id = row[0]
+            count += 1
+
+        if count:
+            self._upsert(self._buckets(rows[:count], metrics))
+            self.db.execute(STATE_SQL[self.db.name], (source, last_id))
+        self.db.commit()
+        return count, count < len(rows) or len(rows) < self.chunk
+
+    def _aggregate_late(self, source, metrics):
+        """
+        Aggregerer målinger som er committet i hull høyvannsmerket har hoppet over.
+
+        Returns:
+            int: Antall sene målinger som ble aggregert.
+        """
+        late = self.late.get(source)
+        if late is not None:
+            late.expire()
+        if not late:
+            return 0
+        rows = []
+        # Tilstøtende hull er slått sammen, og hver spørring har et begrenset antall BETWEEN-ledd
+        for condition, params in late.queries():
+            rows += self.db.query(
+                f"SELECT reading_id, sensor_id, timestamp, {', '.join(metrics)} FROM {source} WHERE {condition}",
+                params
+            )
+        if rows:
+            self._upsert(self._buckets(rows, metrics))
+        self.db.commit()
+        if rows:
+            late.found(sorted(row[0] for row in rows))
+            self.late_rows += len(rows)
+            log.info("Aggregated %d late rows from %s", len(rows), source)
+        return len(rows)
+
+    def _add_late(self, source, first, last, now):
+        late = self.late.get(source)
+        if late is None:
+            late = self.late[source] = GapTracker(self.late_window, self.MAX_LATE_RANGES)
+        for dropped in late.add(first, last, now):
+            log.warning("Too many gaps in %s, no longer checking reading_id %d-%d", source, *dropped[:2])
+
+    @staticmethod
+    def _buckets(rows, metrics):
+        """
+        Regner ut min/maks/sum/antall per (sensor_id, målestørrelse, oppløsning, bøtte).
+        """
+        buckets = {}
+        for row in rows:
+            timestamp = str(row[2])
+            sensor_id = row[1]
+            for resolution, bucket_of in RESOLUTIONS.items():
+                bucket = bucket_of(timestamp)
+                for metric, value in zip(metrics, row[3:]):
+                    if value is None:
+                        continue
+                    key = (sensor_id, metric, resolution, bucket)
+                    aggregate = buckets.get(key)
+                    if aggregate is None:
+                        buckets[key] = [value, value, value, 1]
+                    else:
+                        if value < aggregate[0]:
+                            aggregate[0] = value
+                        if value > aggregate[1]:
+                            aggregate[1] = value
+                        aggregate[2] += value
+                        aggregate[3] += 1
+        return buckets
+
+    def _upsert(self, buckets):
+        self.db.executemany(UPSERT_SQL[self.db.name], [key + tuple(aggregate) for key, aggregate in buckets.items()])
+
+    def start(self):
+        """
+        Starter aggregatoren i en egen tråd.
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, name='rollup', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def loop(self):
+        try:
+            while self.running:
+                try:
+                    self.db.ping()  # Kobler til på nytt etter en feil
+                    self.run_once()
+                except self.db.Error as e:
+                    log.warning("Rollup error, retrying in %g s: %s", self.interval, e)
+                    try:
+                        self.db.rollback()
+                    except self.db.Error:
+                        pass
+                    self.db.close()
+                deadline = time.monotonic() + self.interval
+                while self.running and time.monotonic() < deadline:
+                    time.sleep(0.1)
+        finally:
+            self.db.close()
+
+
+def choose_resolution(start, end, resolution=None, max_points=None):
+    """
+    Velger den groveste rollup-oppløsningen som er minst like fin som ønsket.
+
+    Args:
+        start (datetime): Start på intervallet.
+        end (datetime): Slutt på intervallet.
+        resolution (float): Ønsket oppløsning i sekunder per punkt.
+        max_points (int): Maks antall punkter; gir oppløsning (end - start) / max_points.
+
+    Returns:
+        int: Oppløsning i sekunder, eller 0 for rådata.
+    """
+    if resolution is None:
+        if not max_points:
+            return 0
+        resolution = (end - start).total_seconds() / max_points
+    for candidate in sorted(RESOLUTIONS, reverse=True):
+        if candidate <= resolution:
+            return candidate
+    return 0
+
+
+def fetch_series(db, sensor_id, metric, start, end, resolution=None, max_points=None, rollups=True):
+    """
+    Henter en tidsserie for én sensor og målestørrelse, fra rollups når oppløsningen tillater det.
+    Fra rådata hentes maks max_points punkter; er det flere målinger, samles de i tidsbøtter i
+    databasen i stedet.
+
+    Args:
+        db (StorageBackend): Tilkoblet backend.
+        sensor_id (int): Sensorens ID.
+        metric (str): Kolonnenavn, f.eks. 'temperature' eller 'diff_acceleration_x'.
+        start (datetime): Start på intervallet.
+        end (datetime): Slutt på intervallet.
+        resolution (float): Ønsket oppløsning i sekunder per punkt.
+        max_points (int): Maks antall punkter (brukes hvis resolution ikke er gitt).
+        rollups (bool): False gir rådata, f.eks. når rollups ikke er aggregert for intervallet.
+
+    Returns:
+        dict: Kolonnelister 'timestamp', 'min', 'max', 'mean', 'count', og 'resolution'
+              (sekunder, 0 for rådata).
+    """
+    source = next(table for table, metrics in SOURCES.items() if metric in metrics)
+    chosen = choose_resolution(start, end, resolution, max_points) if rollups else 0
+    bounds = (start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'))
+
+    if chosen:
+        # Bøtta som start ligger i, begynner før start og skal være med
+        bounds = (RESOLUTIONS[chosen](bounds[0]), bounds[1])
+        rows = db.query("""
+            SELECT bucket_start, min_value, max_value, sum_value, sample_count FROM ROLLUPS
+            WHERE sensor_id = %s AND metric = %s AND resolution = %s AND bucket_start BETWEEN %s AND %s
+            ORDER BY bucket_start
+        """, (sensor_id, metric, chosen) + bounds)
+    else:
+        where = f"FROM {source} WHERE sensor_id = %s AND timestamp BETWEEN %s AND %s"
+        limit = f" LIMIT {int(max_points) + 1}" if max_points else ""
+        rows = db.query(f"SELECT timestamp, {metric} {where} ORDER BY timestamp{limit}", (sensor_id,) + bounds)
+        if not max_points or len(rows) <= max_points:
+            values = [row[1] for row in rows]
+            return {
+                'timestamp': [row[0] for row in rows],
+                'min': values,
+                'max': values,
+                'mean': values,
+                'count': [1] * len(values),
+                'resolution': 0,
+            }
+        # For mange målinger: samle dem i like lange tidsbøtter i databasen
+        chosen = max(1, math.ceil((end - start).total_seconds() / max_points))
+        bucket = BUCKET_SQL[db.name]
+        rows = db.query(f"""
+            SELECT MIN(timestamp), MIN({metric}), MAX({metric}), SUM({metric}), COUNT({metric}) {where}
+            GROUP BY {bucket} HAVING COUNT({metric}) > 0 ORDER BY {bucket}
+        """, (sensor_id,) + bounds + (chosen, chosen))
+
+    return {
+        'timestamp': [row[0] for row in rows],
+        'min': [row[1] for row in rows],
+        'max': [row[2] for row in rows],
+        'mean': [row[3] / row[4] for row in rows],
+        'count': [row[4] for row in rows],
+        'resolution': chosen,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=None)
+    parser.add_argument('--interval', type=float, default=None, help="Gjenta hvert N. sekund")
+    parser.add_argument('--settle', type=float, default=10,
+                        help="Sekunder et hull i reading_id får stå åpent før det hoppes over")
+    args = parser.parse_args()
+
+    aggregator = RollupAggregator(open_backend(args.backend), interval=args.interval or 5, settle=args.settle)
+    if args.interval is None:
+        aggregator.db.connect()
+        print(f"Aggregerte {aggregator.run_once()} målinger")
+        aggregator.db.close()
+        return
+    aggregator.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Aggregert totalt: {aggregator.rows_aggregated} målinger")
+    except KeyboardInterrupt:
+        aggregator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
-import mysql.connector
+import logging
+import queue
+import threading
 import time
-from mysql.connector import Error
 import serial  # For mikrokontrollerkommunikasjon
-from DataColector import SensorDataCollector
+from DataColector import SensorDataCollector, DEFAULT_PORT
+from Storage import open_backend
+from CollectorLog import setup_logging
+
+log = logging.getLogger('sensorconfig')
 
 class SensorApp:
     """
     GUI-program for registrering og konfigurasjon av sensorer.
     Funksjonalitet:
-    - Lagrer sensordata i MySQL-database.
+    - Lagrer sensordata i databasen (MySQL eller SQLite, se Storage).
     - Logger hendelser i GUI.
     - Sender konfigurasjonsdata til mikrokontroller via seriellport.
     - Lagrer grenseverdier til alarmthresholds-tabellen.
@@ -25,7 +30,10 @@ class SensorApp:
         self.root = root
         self.root.title("Sensor System")
 
-        self.collector = SensorDataCollector('COM5', 1)
+        # Seriellporten åpnes først når innsamlingen startes, så vinduet kommer opp med en gang
+        self.collector = SensorDataCollector(DEFAULT_PORT, 1)
+        self.progress = queue.Queue()  # Loggmeldinger fra start/stopp-tråden
+        self.worker = None
 
         tk.Label(root, text="Sensor Type:").pack()
         self.sensor_input = tk.Entry(root)
@@ -59,20 +67,16 @@ class SensorApp:
         self.log_box = scrolledtext.ScrolledText(root, state='normal', height=10)
         self.log_box.pack()
 
-        # MySQL-tilkobling
+        # Databasetilkobling
+        self.db = open_backend()
         try:
-            self.db = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="root",
-                database="sensordata",
-                auth_plugin='mysql_native_password'  # Specify the authentication plugin
-            )
-            self.cursor = self.db.cursor()
-            self.log("✅ Koblet til MySQL-database.")
-        except Error as e:
+            self.db.connect()
+            self.log(f"✅ Koblet til {self.db.name}-database.")
+        except self.db.Error as e:
             self.log(f"❌ Feil ved tilkobling til database: {e}")
 
+        self.root.after(100, self.show_progress)
+
     def log(self, message):
         """
         Logger meldinger til GUI-loggboksen.
@@ -82,6 +86,47 @@ class SensorApp:
         self.log_box.insert(tk.END, message + "\n")
         self.log_box.see(tk.END)
 
+    def show_progress(self):
+        """
+        Viser meldinger fra start/stopp-tråden i loggen. Kjører på Tk-tråden hvert 100 ms.
+        """
+        while True:
+            try:
+                self.log(self.progress.get_nowait())
+            except queue.Empty:
+                break
+        if self.worker is not None and not self.worker.is_alive():
+            self.worker = None
+            self.start.config(state=tk.NORMAL)
+            self.stopp.config(state=tk.NORMAL)
+        self.root.after(100, self.show_progress)
+
+    def run_in_background(self, task):
+        """
+        Kjører task i en egen tråd så håndtrykket med mikrokontrolleren ikke fryser vinduet.
+        Knappene er deaktivert til tråden er ferdig. Uventede feil fra task logges og vises i
+        loggen, ellers ville de bare blitt skrevet til stderr av tråden.
+
+        :param task: Funksjon uten argumenter. Må ikke røre Tk-widgets; bruk self.progress.
+        :return: False hvis en start/stopp allerede pågår.
+        """
+        if self.worker is not None:
+            self.log("⏳ Vent til forrige start/stopp er ferdig.")
+            return False
+        self.start.config(state=tk.DISABLED)
+        self.stopp.config(state=tk.DISABLED)
+
+        def guarded():
+            try:
+                task()
+            except Exception as e:
+                log.exception("Collector start/stop failed")
+                self.progress.put(f"❌ Uventet feil: {e}")
+
+        self.worker = threading.Thread(target=guarded, name='collector-control', daemon=True)
+        self.worker.start()
+        return True
+
     def send_to_microcontroller(self, sensor_type, location):
         """
         Sender sensordata til mikrokontroller via seriell tilkobling (USB).
@@ -91,7 +136,7 @@ class SensorApp:
         """
         try:
             # Tilpass COM-port og baudrate til mikrokontrolleren din!
-            with serial.Serial('COM5', 9600, timeout=2) as ser:
+            with serial.Serial(DEFAULT_PORT, 9600, timeout=2) as ser:
                 if not ser.is_open:
                     ser.open()
                 config_data = f"type={sensor_type};location={location};\n"
@@ -111,37 +156,53 @@ class SensorApp:
         """
         try:
             # Henter siste sensor_id
-            self.cursor.execute("""
+            result = self.db.query_one("""
                 SELECT sensor_id FROM SENSORS ORDER BY installation_date DESC LIMIT 1
             """)
-            result = self.cursor.fetchone()
             if result:
                 sensor_id = result[0]
                 # Sett inn treshold
-                self.cursor.execute("""
+                self.db.execute("""
                     INSERT INTO alarmthresholds (sensor_id, parameter, min_value, max_value)
                     VALUES (%s, %s, %s, %s)
                 """, (sensor_id, parameter, min_val, max_val))
                 self.db.commit()
+                self.collector.thresholds.notify()  # Innsamlingen tar i bruk nye grenser med en gang
                 self.log(f"✅ Grenseverdier lagret: {parameter} ({min_val} - {max_val})")
             else:
                 self.log("❌ Ingen sensorer funnet.")
-        except Error as e:
+        except self.db.Error as e:
             self.log(f"❌ Klarte ikke lagre grenseverdier: {e}")
 
     def star_collection(self):
         """
-        Starter datainnsamling ved å kjøre SensorDataCollector.
+        Starter datainnsamling ved å kjøre SensorDataCollector i en egen tråd.
+        Hvert steg i håndtrykket vises i loggen.
         """
-        self.collector.run()  # this starts a loop
-        self.log("🚀 Datainnsamling startet.")
+        def task():
+            try:
+                self.collector.run(progress=lambda message: self.progress.put(f"… {message}"))
+                self.progress.put("🚀 Datainnsamling startet.")
+            except (serial.SerialException, TimeoutError, self.collector.db.Error) as e:
+                self.progress.put(f"❌ Klarte ikke starte datainnsamling: {e}")
+
+        if self.collector.running:
+            self.log("ℹ️ Datainnsamlingen går allerede.")
+            return
+        self.run_in_background(task)
 
     def stopp_collection(self):
         """
-        Stopper datainnsamling ved å stoppe SensorDataCollector.
+        Stopper datainnsamling ved å stoppe SensorDataCollector i en egen tråd.
         """
-        self.collector.stop()
-        self.log("🛑 Datainnsamling stoppet.")
+        def task():
+            try:
+                self.collector.stop()
+                self.progress.put("🛑 Datainnsamling stoppet.")
+            except serial.SerialException as e:
+                self.progress.put(f"❌ Klarte ikke stoppe datainnsamling: {e}")
+
+        self.run_in_background(task)
 
     def save_sensor(self):
         """
@@ -157,18 +218,17 @@ class SensorApp:
 
         try:
             # Sjekk om sensoren finnes fra før
-            self.cursor.execute("""
+            result = self.db.query_one("""
                 SELECT sensor_id FROM SENSORS
                 WHERE type = %s AND location = %s
             """, (sensor_type, location))
-            result = self.cursor.fetchone()
 
             if result:
                 self.log("⚠️ Sensor finnes allerede – ikke lagret på nytt.")
                 return
 
             # Sett inn sensor
-            self.cursor.execute("""
+            self.db.execute("""
                 INSERT INTO SENSORS (type, location, installation_date)
                 VALUES (%s, %s, %s)
             """, (sensor_type, location, time.strftime("%Y-%m-%d")))
@@ -191,10 +251,11 @@ class SensorApp:
             # Send til mikrokontroller
             self.send_to_microcontroller(sensor_type, location)
 
-        except Error as e:
+        except self.db.Error as e:
             self.log(f"❌ Databasefeil: {e}")
 
 if __name__ == "__main__":
+    setup_logging()
     root = tk.Tk()
     app = SensorApp(root)
     root.mainloop()
@@ -0,0 +1,132 @@
+import time
+from Framing import FrameDecoder
+
+
+class SerialLineReader:
+    """
+    Leser seriellporten i store biter og deler dem selv opp i linjer.
+
+    Ligger det data i inngangsbufferen, hentes alt i ett read()-kall. Er porten ledig, blokkerer
+    read() til første byte kommer (eller portens timeout går ut), og det som har kommet i
+    mellomtiden hentes rett etter, så biten ikke blir én byte. Alle komplette linjer returneres
+    med en gang, mens en ufullstendig linje tas vare på til resten kommer. Dermed brukes ett
+    eller to read()-kall per bit i stedet for ett readline()-kall per måling, og ingen linjer
+    blir liggende og vente.
+
+    Med binary=True tolkes strømmen av en FrameDecoder i stedet, som gir både binære rammer og
+    JSON-linjer (svar på kommandoer).
+    """
+
+    def __init__(self, ser, chunk_size=4096, max_line=65536):
+        """
+        Args:
+            ser (serial.Serial): Åpen seriellport med timeout satt (brukes som maks ventetid).
+            chunk_size (int): Maks antall byte som leses per kall.
+            max_line (int): Lengste tillatte linje. Lengre data uten linjeskift forkastes.
+        """
+        self.ser = ser
+        self.chunk_size = chunk_size
+        self.max_line = max_line
+        self.pending = bytearray()
+        self.binary = False
+        self.decoder = None
+
+        self.started = time.monotonic()
+        self.line_count = 0
+        self.byte_count = 0
+        self.read_count = 0
+        self.discarded = 0
+
+    def reset(self):
+        """
+        Forkaster en halvlest linje, går tilbake til JSON-linjer og nullstiller tellerne.
+        """
+        self.pending.clear()
+        self.binary = False
+        self.decoder = None
+        self.started = time.monotonic()
+        self.line_count = 0
+        self.byte_count = 0
+        self.read_count = 0
+        self.discarded = 0
+
+    def setBinary(self, binary):
+        """
+        Slår binære rammer av eller på. Tas i bruk ved neste readLines(), i lesetråden.
+        Slås på før enheten bes om å sende rammer, så ingen ramme leses som tekst.
+        """
+        self.binary = binary
+
+    def readLines(self):
+        """
+        Venter på data og returnerer alle komplette linjer som er mottatt.
+
+        Returns:
+            list: (ankomsttid, linje)-par, der ankomsttid er time.monotonic() da biten ble lest
+                  og linje er bytes uten linjeskift. I binærmodus er rammer tupler i stedet for
+                  bytes (se FrameDecoder.feed). Tom liste ved timeout.
+        """
+        waiting = self.ser.in_waiting
+        chunk = self.ser.read(min(max(1, waiting), self.chunk_size))
+        if not waiting and chunk:
+            # Porten var ledig og read() ventet på første byte; resten av linjen er kommet siden
+            waiting = min(self.ser.in_waiting, self.chunk_size - len(chunk))
+            if waiting:
+                chunk += self.ser.read(waiting)
+        if self.binary != (self.decoder is not None):
+            self.switchFraming()
+        if not chunk:
+            return []
+        arrival = time.monotonic()
+        self.read_count += 1
+        self.byte_count += len(chunk)
+
+        if self.decoder is not None:
+            items = self.decoder.feed(chunk)
+            self.line_count += len(items)
+            return [(arrival, item) for item in items]
+
+        self.pending += chunk
+
+        if b'\n' not in chunk:
+            if len(self.pending) > self.max_line:
+                self.discarded += 1
+                self.pending.clear()
+            return []
+
+        *lines, rest = self.pending.split(b'\n')
+        self.pending = bytearray(rest)
+
+        result = []
+        for line in lines:
+            line = line.strip()
+            if line:
+                result.append((arrival, bytes(line)))
+        self.line_count += len(result)
+        return result
+
+    def switchFraming(self):
+        # En halvlest linje tas med over, så den ikke går tapt ved byttet
+        if self.binary:
+            self.decoder = FrameDecoder(self.max_line)
+            self.decoder.buffer += self.pending
+            self.pending.clear()
+        else:
+            self.pending = self.decoder.buffer
+            self.decoder = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Antall linjer, byte og lesekall, samt linjer per sekund siden start/reset.
+        """
+        elapsed = time.monotonic() - self.started
+        return {
+            'lines': self.line_count,
+            'bytes': self.byte_count,
+            'reads': self.read_count,
+            'lines_per_read': self.line_count / self.read_count if self.read_count else 0,
+            'lines_per_sec': self.line_count / elapsed if elapsed > 0 else 0,
+            'discarded': self.discarded,
+            'frames': self.decoder.stats() if self.decoder is not None else None,
+        }
@@ -0,0 +1,240 @@
+"""
+Lokal spool for målinger som ikke kan skrives til databasen med en gang.
+
+Spoolen er én fil med fast størrelse som er minnemappet (mmap) og bare skrives i enden:
+
+    hode: magic (8 byte) | generasjon (8)
+    post: generasjon (8) | lengde (4) | CRC-32 (4) | nyttelast (lengde byte)
+
+Nyttelasten er én bolk fra WriteBuffer som JSON: [temperaturrader, temperaturalarmer,
+akselerasjonsrader, akselerasjonsalarmer]. Å legge til en bolk er en minnekopi, så skrivetråden
+blir ikke holdt igjen av en treg eller nede database.
+
+Hvor langt spoolen er spilt av, lagres i tabellen SPOOL_STATE (generasjon og posisjon) i samme
+transaksjon som radene som spilles av, så en måling blir verken skrevet to ganger eller borte
+hvis prosessen eller databasen stopper midt i avspillingen. Når alt er spilt av, starter spoolen
+på nytt fra begynnelsen med en ny generasjon. Poster fra en tidligere generasjon som fortsatt
+ligger lenger ut i filen, har feil generasjon og blir derfor ikke lest. Finnes det poster når
+spoolen åpnes, blir de spilt av ved neste anledning.
+
+Uten sync=True ligger det som er spoolet i operativsystemets sidebuffer til det skrives ut, så det
+overlever at prosessen krasjer, men ikke nødvendigvis strømbrudd. En spoolfil skal bare brukes av
+én prosess om gangen.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+log = logging.getLogger('spool')
+
+MAGIC = b'SNSPOOL1'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<QII')
+
+DEFAULT_SPOOL_PATH = os.environ.get('SENSORDATA_SPOOL_PATH', 'sensordata.spool')
+
+STATE_SQL = {
+    'mysql': """
+        INSERT INTO SPOOL_STATE (spool, generation, position) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE generation = VALUES(generation), position = VALUES(position)
+    """,
+    'sqlite': """
+        INSERT INTO SPOOL_STATE (spool, generation, position) VALUES (%s, %s, %s)
+        ON CONFLICT (spool) DO UPDATE SET generation = excluded.generation, position = excluded.position
+    """,
+}
+
+
+class SpoolFull(Exception):
+    pass
+
+
+class Spool:
+    """
+    Minnemappet spoolfil som flere skrivetråder kan legge bolker i samtidig. Bare én tråd spiller
+    av om gangen (se WriteBuffer.replaySpool).
+    """
+
+    def __init__(self, path=DEFAULT_SPOOL_PATH, capacity=64 * 2 ** 20, sync=False, name=None):
+        """
+        Åpner spoolfilen, eller oppretter den med capacity byte. Eksisterende poster beholdes.
+
+        Args:
+            path (str): Filsti til spoolfilen.
+            capacity (int): Filstørrelse i byte. Brukes bare når filen opprettes.
+            sync (bool): Skriv hver bolk til disk (msync) før append() returnerer.
+            name (str): Navnet spoolen har i SPOOL_STATE. Standard er filnavnet.
+        """
+        self.path = path
+        self.sync = sync
+        self.name = name or os.path.basename(path)
+        self.lock = threading.Lock()
+        self.replay_lock = threading.Lock()
+
+        self.file = open(path, 'a+b')
+        if os.path.getsize(path) < HEADER.size + RECORD.size:
+            self.file.truncate(max(capacity, HEADER.size + RECORD.size))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = len(self.map)
+
+        magic, self.generation = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self._newGeneration()
+        self.end = self._scan()
+        # Posisjonen som er spilt av, lest fra SPOOL_STATE første gang spoolen spilles av
+        self.checkpoint = None
+
+        self.batches_spooled = 0
+        self.rows_spooled = 0
+        self.rows_replayed = 0
+        self.full = 0
+        if self.end > HEADER.size:
+            log.warning("Spool %s has %d bytes from an earlier run; replaying from the checkpoint in SPOOL_STATE",
+                        path, self.end - HEADER.size)
+
+    def _newGeneration(self):
+        # Tiden i nanosekunder er unik nok og øker, også når filen slettes og lages på nytt
+        self.generation = time.time_ns()
+        HEADER.pack_into(self.map, 0, MAGIC, self.generation)
+
+    def _scan(self):
+        """
+        Finner enden av spoolen: første post med annen generasjon, feil lengde eller feil CRC.
+        En bolk som ble halvveis skrevet før et krasj, blir dermed ikke lest.
+        """
+        position = HEADER.size
+        while position + RECORD.size <= self.capacity:
+            generation, length, crc = RECORD.unpack_from(self.map, position)
+            start = position + RECORD.size
+            if generation != self.generation or start + length > self.capacity:
+                break
+            if zlib.crc32(self.map[start:start + length]) != crc:
+                break
+            position = start + length
+        return position
+
+    def append(self, temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms):
+        """
+        Legger en bolk til i enden av spoolen.
+
+        Args:
+            temperature_rows (list): Temperaturrader som i WriteBuffer.
+            temperature_alarms (list): Alarmparametere per temperaturrad.
+            acceleration_rows (list): Akselerasjonsrader som i WriteBuffer.
+            acceleration_alarms (list): Alarmparametere per akselerasjonsrad.
+
+        Raises:
+            SpoolFull: Bolken får ikke plass. Ingenting er skrevet.
+        """
+        payload = json.dumps([temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms],
+                             separators=(',', ':')).encode()
+        with self.lock:
+            start = self.end + RECORD.size
+            end = start + len(payload)
+            if end > self.capacity:
+                self.full += 1
+                raise SpoolFull(f"Spool {self.path} is full ({self.capacity} bytes)")
+            self.map[start:end] = payload
+            # Posthodet skrives sist; før det stopper _scan() på den gamle enden
+            RECORD.pack_into(self.map, self.end, self.generation, len(payload), zlib.crc32(payload))
+            if end + RECORD.size <= self.capacity:
+                # Posten etter får aldri samme generasjon ved et uhell fra en tidligere runde
+                RECORD.pack_into(self.map, end, 0, 0, 0)
+            if self.sync:
+                self.map.flush()
+            self.end = end
+            self.batches_spooled += 1
+            self.rows_spooled += len(temperature_rows) + len(acceleration_rows)
+
+    def pending(self):
+        """
+        Returns:
+            bool: True dersom det ligger bolker som ikke er spilt av.
+        """
+        return self.end > (self.checkpoint if self.checkpoint is not None else HEADER.size)
+
+    def read(self, position, max_rows):
+        """
+        Leser bolker fra position til de til sammen har minst max_rows rader, eller enden er nådd.
+
+        Args:
+            position (int): Der forrige avspilling stoppet.
+            max_rows (int): Omtrentlig antall rader som skal leses.
+
+        Returns:
+            tuple: (temperaturrader, temperaturalarmer, akselerasjonsrader, akselerasjonsalarmer,
+                    ny posisjon).
+        """
+        with self.lock:
+            end = self.end
+        temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms = [], [], [], []
+        while position < end and len(temperature_rows) + len(acceleration_rows) < max_rows:
+            generation, length, crc = RECORD.unpack_from(self.map, position)
+            start = position + RECORD.size
+            batch = json.loads(self.map[start:start + length])
+            temperature_rows.extend(tuple(row) for row in batch[0])
+            temperature_alarms.extend(batch[1])
+            acceleration_rows.extend(tuple(row) for row in batch[2])
+            acceleration_alarms.extend(batch[3])
+            position = start + length
+        return temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms, position
+
+    def loadCheckpoint(self, db):
+        """
+        Leser hvor langt spoolen er spilt av fra SPOOL_STATE.
+
+        Args:
+            db (StorageBackend): Tilkoblet database.
+
+        Returns:
+            int: Posisjonen det skal spilles av fra.
+        """
+        row = db.query_one("SELECT generation, position FROM SPOOL_STATE WHERE spool = %s", (self.name,))
+        if row is None or row[0] != self.generation:
+            return HEADER.size
+        return row[1]
+
+    def saveCheckpoint(self, db, position):
+        """
+        Lagrer posisjonen i SPOOL_STATE. Committes av den som kaller, sammen med radene.
+        """
+        db.execute(STATE_SQL[db.name], (self.name, self.generation, position))
+
+    def replayed(self, position, rows):
+        """
+        Registrerer at alt før position er committet. Er hele spoolen spilt av, starter den på
+        nytt fra begynnelsen med en ny generasjon.
+        """
+        with self.lock:
+            self.checkpoint = position
+            self.rows_replayed += rows
+            if position == self.end:
+                self._newGeneration()
+                RECORD.pack_into(self.map, HEADER.size, 0, 0, 0)
+                self.end = self.checkpoint = HEADER.size
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Bolker og rader spoolet, rader spilt av, byte som venter, kapasitet og antall
+                  bolker som ikke fikk plass.
+        """
+        with self.lock:
+            return {
+                'batches_spooled': self.batches_spooled,
+                'rows_spooled': self.rows_spooled,
+                'rows_replayed': self.rows_replayed,
+                'pending_bytes': self.end - (self.checkpoint if self.checkpoint is not None else HEADER.size),
+                'capacity': self.capacity,
+                'full': self.full,
+            }
@@ -0,0 +1,449 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BACKEND = os.environ.get('SENSORDATA_BACKEND', 'mysql')
+DEFAULT_SQLITE_PATH = os.environ.get('SENSORDATA_SQLITE_PATH', 'sensordata.db')
+
+DEFAULT_MYSQL_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': 'root',
+    'database': 'sensordata'
+}
+
+
+class StorageBackend:
+    """
+    Felles grensesnitt mot databasen som innsamling, HMI og plotting bruker.
+
+    SQL skrives med %s som plassholder (som i pymysql); backenden oversetter ved behov.
+    Tabellnavn skrives uten databaseprefiks, siden databasen velges ved tilkobling.
+    """
+
+    name = None
+    Error = Exception
+
+    def __init__(self):
+        self.conn = None
+
+    def connect(self):
+        """
+        Åpner forbindelsen til databasen.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Lukker forbindelsen. Neste ping() eller connect() åpner en ny.
+        """
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except self.Error:
+                pass
+            self.conn = None
+
+    def ping(self):
+        """
+        Sjekker at forbindelsen lever og kobler til på nytt ved behov.
+        """
+        if self.conn is None:
+            self.connect()
+
+    def clone(self):
+        """
+        Lager en ny, ikke tilkoblet backend med samme oppsett, for en tråd som trenger egen forbindelse.
+        """
+        raise NotImplementedError
+
+    def _sql(self, sql):
+        return sql
+
+    def execute(self, sql, params=()):
+        """
+        Utfører én SQL-setning.
+
+        Returns:
+            Cursor med eventuelle resultater.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(self._sql(sql), params)
+        return cursor
+
+    def executemany(self, sql, rows):
+        """
+        Utfører samme SQL-setning for alle rader i én operasjon.
+        """
+        cursor = self.conn.cursor()
+        cursor.executemany(self._sql(sql), rows)
+        return cursor
+
+    def insert(self, sql, params=()):
+        """
+        Setter inn én rad.
+
+        Returns:
+            int: Den genererte primærnøkkelen (lastrowid).
+        """
+        return self.execute(sql, params).lastrowid
+
+    def query(self, sql, params=(), as_dict=False):
+        """
+        Utfører en spørring og henter alle rader.
+
+        Args:
+            sql (str): SELECT-setningen.
+            params (tuple): Parametere til plassholderne.
+            as_dict (bool): Returner rader som ordbøker med kolonnenavn som nøkler.
+
+        Returns:
+            list: Radene som tupler, eller som ordbøker hvis as_dict er satt.
+        """
+        cursor = self.execute(sql, params)
+        rows = cursor.fetchall()
+        if as_dict:
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+        return list(rows)
+
+    def query_one(self, sql, params=(), as_dict=False):
+        """
+        Som query(), men returnerer bare første rad eller None.
+        """
+        rows = self.query(sql, params, as_dict)
+        return rows[0] if rows else None
+
+    def _stream_cursor(self):
+        return self.conn.cursor()
+
+    def stream(self, sql, params=(), chunk_size=10000):
+        """
+        Utfører en spørring og henter radene i bolker med fetchmany, så minnebruken er den samme
+        uansett hvor stort resultatet er. Forbindelsen kan ikke brukes til andre spørringer før
+        alle bolkene er hentet eller generatoren er lukket.
+
+        Args:
+            sql (str): SELECT-setningen.
+            params (tuple): Parametere til plassholderne.
+            chunk_size (int): Maks antall rader per bolk.
+
+        Yields:
+            list: Opptil chunk_size rader som tupler.
+        """
+        cursor = self._stream_cursor()
+        try:
+            cursor.execute(self._sql(sql), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        if self.conn is not None:  # Lukket forbindelse har ingenting å rulle tilbake
+            self.conn.rollback()
+
+
+class MySQLBackend(StorageBackend):
+    """
+    MySQL-server via pymysql. Standardoppsettet for installasjoner med egen databaseserver.
+    """
+
+    name = 'mysql'
+
+    def __init__(self, **config):
+        """
+        Args:
+            **config: Tilkoblingsparametere til pymysql.connect (host, user, password, database).
+                      Mangler de, brukes DEFAULT_MYSQL_CONFIG.
+        """
+        import pymysql
+        super().__init__()
+        self.pymysql = pymysql
+        self.Error = pymysql.MySQLError
+        self.config = dict(DEFAULT_MYSQL_CONFIG, **config)
+
+    def connect(self):
+        self.conn = self.pymysql.connect(**self.config)
+
+    def clone(self):
+        return MySQLBackend(**self.config)
+
+    def ping(self):
+        if self.conn is None:
+            self.connect()
+        else:
+            self.conn.ping(reconnect=True)
+
+    def _stream_cursor(self):
+        # Ubufret cursor: radene leses fra serveren etter hvert, i stedet for at pymysql henter
+        # hele resultatet inn i minnet ved execute()
+        return self.conn.cursor(self.pymysql.cursors.SSCursor)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Innebygd SQLite-database i én fil, for små edge-maskiner uten plass til en MySQL-server.
+
+    Databasen kjøres i WAL-modus med synchronous=NORMAL: lesere (HMI) blokkerer ikke skriveren,
+    og en commit krever ikke fsync av hele databasen. Sammen med bolkskriving i WriteBuffer blir
+    hver bolk én transaksjon. Ved strømbrudd kan siste commit før bruddet gå tapt, men filen
+    forblir konsistent.
+    """
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, auto_migrate=True):
+        """
+        Args:
+            path (str): Filsti til databasefilen. Opprettes med tabeller hvis den ikke finnes.
+            auto_migrate (bool): Kjør manglende skjemamigreringer ved tilkobling.
+        """
+        super().__init__()
+        self.path = path
+        self.auto_migrate = auto_migrate
+        self.statements = {}
+
+    def connect(self):
+        # Forbindelsen åpnes i én tråd og brukes av skrivetråden, men aldri av to tråder samtidig
+        self.conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        if self.auto_migrate:
+            self.create_schema()
+
+    def clone(self):
+        return SQLiteBackend(self.path, self.auto_migrate)
+
+    def create_schema(self):
+        """
+        Oppretter tabellene og kjører migreringene som mangler (se CreateSqlTabels).
+        """
+        from CreateSqlTabels import migrate  # CreateSqlTabels importerer selv Storage
+        migrate(self, verbose=False)
+
+    def _sql(self, sql):
+        statement = self.statements.get(sql)
+        if statement is None:
+            statement = self.statements[sql] = sql.replace('%s', '?')
+        return statement
+
+
+class ConnectionPool:
+    """
+    Delt pool av databaseforbindelser, slik at hver spørring ikke trenger ny TCP-tilkobling
+    og autentisering.
+
+    Ledige forbindelser som har ligget lenger enn health_check_interval sekunder pinges før de
+    lånes ut, og en forbindelse som feiler under bruk lukkes og erstattes ved neste utlån.
+    Forbindelsene bør være i autocommit-modus når de bare brukes til lesing, ellers ser
+    MySQL (REPEATABLE READ) det samme øyeblikksbildet helt til noen committer.
+    """
+
+    def __init__(self, factory, size=4, health_check_interval=30, checkout_timeout=5):
+        """
+        Args:
+            factory (callable): Lager en ny, ikke tilkoblet StorageBackend.
+            size (int): Maks antall forbindelser (lånt ut + ledige).
+            health_check_interval (float): Sekunder en forbindelse kan ligge ledig før den pinges.
+            checkout_timeout (float): Maks ventetid i sekunder på en ledig forbindelse.
+        """
+        self.factory = factory
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self.condition = threading.Condition()
+        self.idle = []
+        self.count = 0
+
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.opened = 0
+        self.closed = 0
+        self.health_check_failures = 0
+
+    def acquire(self):
+        """
+        Låner en forbindelse fra poolen. Må leveres tilbake med release().
+
+        Returns:
+            StorageBackend: Tilkoblet backend.
+
+        Raises:
+            TimeoutError: Ingen forbindelse ble ledig innen checkout_timeout.
+        """
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        db = None
+        with self.condition:
+            while True:
+                if self.idle:
+                    db, last_used = self.idle.pop()
+                    break
+                if self.count < self.size:
+                    self.count += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    if not self.idle and self.count >= self.size:
+                        raise TimeoutError("Ingen ledig databaseforbindelse i poolen")
+
+        try:
+            if db is None:
+                db = self._open()
+            elif time.monotonic() - last_used > self.health_check_interval:
+                try:
+                    db.ping()
+                except db.Error:
+                    self.health_check_failures += 1
+                    self._discard(db)
+                    db = self._open()
+        except Exception:
+            with self.condition:
+                self.count -= 1
+                self.condition.notify()
+            raise
+
+        wait = time.monotonic() - start
+        with self.condition:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return db
+
+    def release(self, db, broken=False):
+        """
+        Leverer en forbindelse tilbake til poolen.
+
+        Args:
+            db (StorageBackend): Forbindelsen fra acquire().
+            broken (bool): Forbindelsen feilet og skal lukkes i stedet for å gjenbrukes.
+        """
+        if broken:
+            self._discard(db)
+            with self.condition:
+                self.count -= 1
+                self.condition.notify()
+            return
+        with self.condition:
+            self.idle.append((db, time.monotonic()))
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Låner en forbindelse for varigheten av en with-blokk. Feiler databasen underveis,
+        byttes forbindelsen ut før neste utlån.
+        """
+        db = self.acquire()
+        broken = False
+        try:
+            yield db
+        except db.Error:
+            broken = True
+            raise
+        finally:
+            self.release(db, broken)
+
+    def _open(self):
+        db = self.factory()
+        db.connect()
+        with self.condition:
+            self.opened += 1
+        return db
+
+    def _discard(self, db):
+        db.close()
+        with self.condition:
+            self.closed += 1
+
+    def close(self):
+        """
+        Lukker alle ledige forbindelser.
+        """
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.count -= len(idle)
+        for db, _ in idle:
+            self._discard(db)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Utlån, ventetid ved utlån (snitt og maks i ms), åpnede og lukkede forbindelser
+                  (churn), feilede helsesjekker og antall ledige/utlånte forbindelser.
+        """
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.count - len(self.idle),
+                'checkouts': self.checkouts,
+                'wait_avg_ms': 1000 * self.wait_total / self.checkouts if self.checkouts else 0,
+                'wait_max_ms': 1000 * self.wait_max,
+                'opened': self.opened,
+                'closed': self.closed,
+                'health_check_failures': self.health_check_failures,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(kind=None, size=4, **options):
+    """
+    Returnerer en delt ConnectionPool for gitt backend og tilkoblingsparametere.
+    Samme parametere gir samme pool innenfor prosessen.
+
+    Args:
+        kind (str): 'mysql' eller 'sqlite', som i open_backend().
+        size (int): Poolstørrelse. Brukes bare når poolen opprettes.
+        **options: Tilkoblingsparametere, som i open_backend().
+
+    Returns:
+        ConnectionPool: Delt pool.
+    """
+    kind = kind or DEFAULT_BACKEND
+    key = (kind, tuple(sorted(options.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(lambda: open_backend(kind, **options), size)
+        return pool
+
+
+def open_backend(kind=None, **options):
+    """
+    Oppretter en backend av valgt type. Forbindelsen åpnes først ved connect() eller ping().
+
+    Args:
+        kind (str): 'mysql' eller 'sqlite'. Standard er miljøvariabelen SENSORDATA_BACKEND,
+                    ellers 'mysql'.
+        **options: For MySQL tilkoblingsparametere (host, user, password, database),
+                   for SQLite 'path' til databasefilen og 'auto_migrate'.
+
+    Returns:
+        StorageBackend: Backend som ikke er koblet til ennå.
+
+    Raises:
+        TypeError: Et valg som backenden ikke kjenner.
+    """
+    kind = kind or DEFAULT_BACKEND
+    if kind == 'mysql':
+        return MySQLBackend(**options)
+    if kind == 'sqlite':
+        return SQLiteBackend(**options)
+    raise ValueError(f"Ukjent database-backend: {kind}")
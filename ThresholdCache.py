@@ -0,0 +1,160 @@
+import logging
+import threading
+from Storage import open_backend
+
+log = logging.getLogger('thresholds')
+
+# Parameternavn som brukes om hverandre i alarmthresholds
+PARAMETERS = {'T': 'T', 'temp': 'T', 'A': 'A', 'accel': 'A'}
+
+CURRENT_THRESHOLDS_SQL = """
+    SELECT a.threshold_id, a.sensor_id, a.parameter, a.min_value, a.max_value
+    FROM alarmthresholds a JOIN (
+        SELECT MAX(threshold_id) AS threshold_id FROM alarmthresholds GROUP BY sensor_id, parameter
+    ) latest ON a.threshold_id = latest.threshold_id
+"""
+
+
+class ThresholdCache:
+    """
+    Gjeldende alarmgrenser i minnet, nøklet på (sensor_id, parameter).
+
+    En bakgrunnstråd sjekker MAX(threshold_id) og COUNT(*) i alarmthresholds hvert
+    poll_interval sekund og laster grensene på nytt bare når tabellen er endret. Endringer fra
+    andre prosesser slår derfor inn innen poll_interval, og notify() gjør at endringer i samme
+    prosess slår inn med en gang. Oppslag med get() går aldri mot databasen.
+    """
+
+    def __init__(self, backend, poll_interval=2):
+        """
+        Args:
+            backend (StorageBackend): Egen forbindelse for cachen (ikke delt med andre tråder).
+            poll_interval (float): Maks sekunder før en endring i databasen blir synlig.
+        """
+        self.db = backend
+        self.poll_interval = poll_interval
+        self.thresholds = {}
+        self.latest_per_sensor = {}
+        self.version = None
+        self.loaded = False
+        self.reloads = 0
+
+        self.changed = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def get(self, sensor_id, parameter, fallback=True):
+        """
+        Slår opp gjeldende grense.
+
+        Args:
+            sensor_id (int): Sensorens ID.
+            parameter (str): 'T' eller 'A' (også 'temp'/'accel').
+            fallback (bool): Bruk sensorens nyeste grense uansett parameter hvis det ikke finnes
+                             noen for parameteren.
+
+        Returns:
+            tuple: (min_value, max_value), eller None hvis sensoren ikke har noen grense.
+        """
+        threshold = self.thresholds.get((sensor_id, PARAMETERS.get(parameter, parameter)))
+        if threshold is None and fallback:
+            threshold = self.latest_per_sensor.get(sensor_id)
+        return threshold[1:] if threshold else None
+
+    def notify(self):
+        """
+        Varsler om at alarmthresholds er endret, så grensene lastes på nytt med en gang.
+        """
+        self.changed.set()
+
+    def refresh(self, force=False):
+        """
+        Laster grensene på nytt hvis tabellen er endret siden forrige gang.
+
+        Returns:
+            bool: True hvis grensene ble lastet på nytt.
+        """
+        version = tuple(self.db.query_one("SELECT MAX(threshold_id), COUNT(*) FROM alarmthresholds"))
+        if version == self.version and not force:
+            self.db.commit()
+            return False
+
+        thresholds = {}
+        latest_per_sensor = {}
+        for threshold_id, sensor_id, parameter, min_value, max_value in self.db.query(CURRENT_THRESHOLDS_SQL):
+            key = (sensor_id, PARAMETERS.get(parameter, parameter))
+            if key not in thresholds or threshold_id > thresholds[key][0]:
+                thresholds[key] = (threshold_id, min_value, max_value)
+            if sensor_id not in latest_per_sensor or threshold_id > latest_per_sensor[sensor_id][0]:
+                latest_per_sensor[sensor_id] = (threshold_id, min_value, max_value)
+        self.db.commit()  # Avslutter lesetransaksjonen så neste sjekk ser nye rader
+
+        # Ordbøkene byttes ut i sin helhet, så get() trenger ingen lås
+        self.thresholds = thresholds
+        self.latest_per_sensor = latest_per_sensor
+        self.version = version
+        self.loaded = True
+        self.reloads += 1
+        return True
+
+    def start(self):
+        """
+        Laster grensene og starter tråden som holder dem oppdatert.
+        """
+        if self.thread is not None:
+            return
+        try:
+            self.db.ping()
+            self.refresh(force=True)
+        except self.db.Error as e:
+            log.warning("Threshold cache error: %s", e)
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, name='thresholds', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.changed.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.db.close()
+
+    def loop(self):
+        while self.running:
+            self.changed.wait(self.poll_interval)
+            self.changed.clear()
+            if not self.running:
+                break
+            try:
+                self.db.ping()
+                self.refresh()
+            except self.db.Error as e:
+                log.warning("Threshold cache error: %s", e)
+                self.db.close()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_threshold_cache(kind=None, poll_interval=2, **options):
+    """
+    Returnerer en delt, startet ThresholdCache for gitt backend og tilkoblingsparametere.
+    Samme parametere gir samme cache innenfor prosessen.
+
+    Args:
+        kind (str): 'mysql' eller 'sqlite', som i open_backend().
+        poll_interval (float): Brukes bare når cachen opprettes.
+        **options: Tilkoblingsparametere, som i open_backend().
+
+    Returns:
+        ThresholdCache: Delt cache.
+    """
+    key = (kind, tuple(sorted(options.items())))
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ThresholdCache(open_backend(kind, **options), poll_interval)
+            cache.start()
+        return cache
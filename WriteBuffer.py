@@ -0,0 +1,525 @@
+import logging
+import time
+from collections import deque
+from Metrics import metrics
+from Profiling import profiler
+from Spool import SpoolFull
+
+log = logging.getLogger('writer')
+
+
+class WriteBuffer:
+    """
+    Skrivebuffer som samler målinger i minnet og skriver dem til databasen i bolker.
+
+    En bolk skrives med executemany og én enkelt commit når bufferen når batch_size rader,
+    eller når den eldste raden har ventet i flush_interval_ms millisekunder.
+
+    Alarmer legges i bufferen sammen med målingen de gjelder. Ved skriving settes målinger med
+    alarm inn enkeltvis slik at reading_id hentes fra lastrowid, og alle alarmer i bolken settes
+    inn med én executemany. Det trengs dermed ingen SELECT for å finne siste reading_id.
+
+    Tapsgrense: Dersom prosessen krasjer (strømbrudd, kill -9) mistes det som ligger i bufferen,
+    dvs. maksimalt batch_size - 1 rader, og aldri mer enn flush_interval_ms millisekunder med data
+    (pluss tiden mellom to kall til due()). Ved normal stopp kalles flush() og ingenting mistes.
+
+    Feiler skrivingen, lukkes forbindelsen og bolken prøves én gang til på en ny forbindelse
+    (f.eks. etter at MySQL har lukket en ledig forbindelse). Feiler også det, regnes databasen
+    som nede, og den prøves igjen med ping() etter retry_interval sekunder, deretter med dobbelt
+    så lang pause hver gang opp til max_retry_interval. Uten spool blir radene liggende i
+    bufferen til databasen svarer igjen, og mens den er nede tas det ikke flere rader fra
+    skrivekøen, så køene fylles og leseren forkaster linjer (telles). Rader går bare tapt om
+    databasen fortsatt er nede når bufferen tømmes ved stopp.
+
+    Med en Spool legges bolken i spoolfilen i stedet for å gå tapt når skrivingen feiler. Bolker spooles også når
+    skrivekøen er mer enn spool_backlog full, så en treg database ikke gir mottrykk helt tilbake
+    til tolkeren. Når databasen svarer og køen er liten igjen, spilles spoolen av i bolker på
+    replay_batch rader (se replaySpool).
+    """
+
+    TEMPERATURE_SQL = '''
+            INSERT INTO temperaturereadings (sensor_id, timestamp, temperature)
+            VALUES (%s, %s, %s)
+            '''
+
+    ACCELERATION_SQL = '''
+            INSERT INTO accelerationreadings (sensor_id, timestamp, acceleration_x, acceleration_y, acceleration_z, diff_acceleration_x, diff_acceleration_y, diff_acceleration_z)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            '''
+
+    TEMPERATURE_ALARM_SQL = '''
+            INSERT INTO temperaturealarms (reading_id, parameter)
+            VALUES (%s, %s)
+            '''
+
+    ACCELERATION_ALARM_SQL = '''
+            INSERT INTO accelerationalarms (reading_id, parameter)
+            VALUES (%s, %s)
+            '''
+
+    def __init__(self, backend, batch_size=100, flush_interval_ms=500, latency_window=0, spool=None,
+                 retry_interval=1, spool_backlog=0.5, replay_batch=5000, max_retry_interval=60):
+        """
+        Initialiserer en tom skrivebuffer.
+
+        Args:
+            backend (StorageBackend): Databasen bolkene skrives til.
+            batch_size (int): Antall rader som utløser skriving. 1 gir commit per måling.
+            flush_interval_ms (int): Maks alder i millisekunder på eldste rad før skriving.
+            latency_window (int): Antall siste forsinkelser som tas vare på for p50/p99 i stats().
+                                  0 gir bare gjennomsnitt og maks.
+            spool (Spool): Spoolfil for bolker som ikke kan skrives. Kan deles av flere
+                           skrivebuffere. None betyr at radene blir liggende i bufferen.
+            retry_interval (float): Sekunder etter første feil før databasen prøves igjen.
+            spool_backlog (float): Andel av skrivekøens kapasitet som gjør at bolker spooles.
+            replay_batch (int): Omtrentlig antall rader per transaksjon ved avspilling.
+            max_retry_interval (float): Lengste pause mellom to forsøk mens databasen er nede.
+        """
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.retry_delay = retry_interval
+        self.spool_backlog = spool_backlog
+        self.replay_batch = replay_batch
+        self.retry_at = None  # Satt når databasen er nede: monotonic() da den prøves igjen
+        self.write_queue = None
+
+        self.temperature_rows = []
+        self.temperature_alarms = []
+        self.acceleration_rows = []
+        self.acceleration_alarms = []
+        self.arrivals = []
+        self.oldest = None
+
+        self.rows_written = 0
+        self.rows_lost = 0
+        self.alarms_written = 0
+        self.flushes = 0
+        self.rows_spooled = 0
+        self.rows_replayed = 0
+
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = deque(maxlen=latency_window) if latency_window else None
+
+        self.inserted = metrics.counter('rows_inserted')
+        self.lost = metrics.counter('rows_lost')
+        self.alarms_inserted = metrics.counter('alarms_inserted')
+        self.spooled = metrics.counter('rows_spooled')
+        self.replayed = metrics.counter('rows_replayed')
+        self.flush_time = metrics.histogram('flush_ms')
+        self.commit_latency = metrics.histogram('serial_to_commit_ms')
+
+    def __len__(self):
+        return len(self.temperature_rows) + len(self.acceleration_rows)
+
+    def addTemperature(self, row, arrival=None, alarms=()):
+        """
+        Legger en temperaturrad i bufferen.
+
+        Args:
+            row (tuple): (sensor_id, timestamp, temperature)
+            arrival (float): time.monotonic() da målingen ble lest, for måling av forsinkelse.
+            alarms (list): Alarmparametere som skal knyttes til målingen.
+        """
+        self.temperature_rows.append(row)
+        self.temperature_alarms.append(alarms)
+        self._added(arrival)
+
+    def addAcceleration(self, row, arrival=None, alarms=()):
+        """
+        Legger en akselerasjonsrad i bufferen.
+
+        Args:
+            row (tuple): (sensor_id, timestamp, x, y, z, diff_x, diff_y, diff_z)
+            arrival (float): time.monotonic() da målingen ble lest, for måling av forsinkelse.
+            alarms (list): Alarmparametere som skal knyttes til målingen.
+        """
+        self.acceleration_rows.append(row)
+        self.acceleration_alarms.append(alarms)
+        self._added(arrival)
+
+    def addTemperatureRows(self, rows, arrivals, alarms):
+        """
+        Legger mange temperaturrader i bufferen på én gang (se SensorDataCollector.processBatch).
+
+        Args:
+            rows (list): (sensor_id, timestamp, temperature)-rader.
+            arrivals (list): time.monotonic() da hver måling ble lest.
+            alarms (list): Alarmparametere per rad (tom sekvens for rader uten alarm).
+        """
+        self.temperature_rows.extend(rows)
+        self.temperature_alarms.extend(alarms)
+        self._addedRows(arrivals)
+
+    def addAccelerationRows(self, rows, arrivals, alarms):
+        """
+        Legger mange akselerasjonsrader i bufferen på én gang (se SensorDataCollector.processBatch).
+
+        Args:
+            rows (list): (sensor_id, timestamp, x, y, z, diff_x, diff_y, diff_z)-rader.
+            arrivals (list): time.monotonic() da hver måling ble lest.
+            alarms (list): Alarmparametere per rad (tom sekvens for rader uten alarm).
+        """
+        self.acceleration_rows.extend(rows)
+        self.acceleration_alarms.extend(alarms)
+        self._addedRows(arrivals)
+
+    def _addedRows(self, arrivals):
+        self.arrivals.extend(arrival for arrival in arrivals if arrival is not None)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self) >= self.batch_size:
+            self.flush()
+
+    def _added(self, arrival):
+        if arrival is not None:
+            self.arrivals.append(arrival)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self) >= self.batch_size:
+            self.flush()
+
+    def due(self):
+        """
+        Sjekker om eldste rad har ligget lenger enn flush_interval_ms i bufferen.
+
+        Returns:
+            bool: True dersom bufferen bør skrives nå.
+        """
+        return self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval
+
+    def untilDue(self, idle=0.1):
+        """
+        Returns:
+            float: Sekunder til eldste rad er forfalt, eller idle hvis bufferen er tom.
+        """
+        if self.oldest is None:
+            return idle
+        return max(0.0, self.oldest + self.flush_interval - time.monotonic())
+
+    def flush(self, force=False):
+        """
+        Skriver alle bufrede rader med executemany og én commit, eller til spoolen når
+        databasen er nede eller skrivekøen er full (se Spool).
+
+        Args:
+            force (bool): Prøv databasen selv om den er nede og det ikke er tid for nytt forsøk
+                          ennå. Brukes ved stopp, når radene ellers ville blitt liggende.
+
+        Returns:
+            int: Antall rader som ble skrevet til databasen.
+        """
+        if not len(self):
+            return 0
+        if self.retry_at is not None and not self.offline():
+            # Tid for nytt forsøk: koble til på nytt før radene tas ut av bufferen
+            try:
+                self.backend.ping()
+            except self.backend.Error as e:
+                self._broken(e)
+        if self.spool is None and self.offline() and not force:
+            return 0  # Radene blir liggende til neste forsøk
+
+        oldest = self.oldest
+        temperature_rows, self.temperature_rows = self.temperature_rows, []
+        temperature_alarms, self.temperature_alarms = self.temperature_alarms, []
+        acceleration_rows, self.acceleration_rows = self.acceleration_rows, []
+        acceleration_alarms, self.acceleration_alarms = self.acceleration_alarms, []
+        arrivals, self.arrivals = self.arrivals, []
+        self.oldest = None
+        count = len(temperature_rows) + len(acceleration_rows)
+        batch = (temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms)
+        if self.spool is not None and (self.offline() or self.backlogged()):
+            self._spoolRows(batch)
+            return 0
+
+        start = time.monotonic()
+        # Har forbindelsen fungert til nå, prøves bolken én gang til på en ny forbindelse
+        attempts = 1 if self.retry_at is not None else 2
+        for attempt in range(attempts):
+            try:
+                if self.retry_at is not None or attempt > 0:
+                    self.backend.ping()  # Kobler til på nytt etter en feil
+                alarms = self._writeRows(*batch)
+                with profiler.section('write.commit'):
+                    self.backend.commit()
+                break
+            except self.backend.Error as e:
+                if attempt + 1 < attempts:
+                    log.info("Write failed, retrying on a new connection: %s", e)
+                    self._close()
+                else:
+                    self._broken(e)
+        else:
+            if self.spool is not None:
+                log.warning("Write failed, spooling %d rows", count)
+                self._spoolRows(batch)
+            elif force:
+                log.error("Write failed, %d rows lost", count)
+                self.rows_lost += count
+                self.lost.inc(count)
+            else:
+                self._keep(batch, arrivals, oldest)
+            return 0
+
+        self._reconnected()
+        self.alarms_written += alarms
+        self.rows_written += count
+        self.flushes += 1
+        committed = time.monotonic()
+        self.inserted.inc(count)
+        self.alarms_inserted.inc(alarms)
+        self.flush_time.observe(1000 * (committed - start))
+        if arrivals:
+            self.commit_latency.observe_many([1000 * (committed - arrival) for arrival in arrivals])
+            self.latency_count += len(arrivals)
+            self.latency_total += sum(committed - arrival for arrival in arrivals)
+            self.latency_max = max(self.latency_max, committed - arrivals[0])
+            if self.latencies is not None:
+                self.latencies.extend(committed - arrival for arrival in arrivals)
+        return count
+
+    def _writeRows(self, temperature_rows, temperature_alarms, acceleration_rows, acceleration_alarms):
+        """
+        Setter inn målinger og alarmer uten å committe.
+
+        Returns:
+            int: Antall alarmer som ble satt inn.
+        """
+        with profiler.section('write.insert'):
+            temperature_alarm_rows = self._insertRows(self.TEMPERATURE_SQL, temperature_rows, temperature_alarms)
+            acceleration_alarm_rows = self._insertRows(self.ACCELERATION_SQL, acceleration_rows, acceleration_alarms)
+        with profiler.section('write.alarms'):
+            if temperature_alarm_rows:
+                self.backend.executemany(self.TEMPERATURE_ALARM_SQL, temperature_alarm_rows)
+            if acceleration_alarm_rows:
+                self.backend.executemany(self.ACCELERATION_ALARM_SQL, acceleration_alarm_rows)
+        return len(temperature_alarm_rows) + len(acceleration_alarm_rows)
+
+    def _keep(self, batch, arrivals, oldest):
+        """
+        Legger en bolk som ikke ble skrevet, tilbake foran radene som har kommet til siden.
+        """
+        self.temperature_rows[:0] = batch[0]
+        self.temperature_alarms[:0] = batch[1]
+        self.acceleration_rows[:0] = batch[2]
+        self.acceleration_alarms[:0] = batch[3]
+        self.arrivals[:0] = arrivals
+        self.oldest = oldest
+
+    def _close(self):
+        # Ruller tilbake og lukker forbindelsen; neste ping() åpner en ny
+        try:
+            self.backend.rollback()
+        except self.backend.Error:
+            pass
+        self.backend.close()
+
+    def _broken(self, error):
+        """
+        Lukker forbindelsen og venter med neste forsøk, med dobbelt så lang pause for hver feil
+        på rad.
+        """
+        self._close()
+        if self.retry_at is None:
+            self.retry_delay = self.retry_interval
+        else:
+            self.retry_delay = min(2 * self.retry_delay, self.max_retry_interval)
+        self.retry_at = time.monotonic() + self.retry_delay
+        log.warning("Database error, retrying in %.0f s: %s", self.retry_delay, error)
+
+    def _reconnected(self):
+        if self.retry_at is not None:
+            log.info("Database is back")
+            self.retry_at = None
+
+    def _spoolRows(self, batch):
+        count = len(batch[0]) + len(batch[2])
+        try:
+            with profiler.section('write.spool'):
+                self.spool.append(*batch)
+        except SpoolFull as e:
+            log.error("%s, %d rows lost", e, count)
+            self.rows_lost += count
+            self.lost.inc(count)
+            return
+        self.rows_spooled += count
+        self.spooled.inc(count)
+
+    def offline(self):
+        """
+        Returns:
+            bool: True dersom siste skriving feilet og det ikke er tid for å prøve igjen ennå.
+        """
+        return self.retry_at is not None and time.monotonic() < self.retry_at
+
+    def backlogged(self):
+        """
+        Returns:
+            bool: True dersom skrivekøen er mer enn spool_backlog full.
+        """
+        return self.write_queue is not None and self.write_queue.depth() > self.spool_backlog * self.write_queue.maxsize
+
+    def connect(self, retry=False):
+        """
+        Kobler til databasen. Med spool er det ikke en feil at databasen er nede; bolkene
+        spooles da til den svarer igjen, og den prøves igjen som etter en skrivefeil.
+
+        Args:
+            retry (bool): Prøv igjen med samme pause som etter en skrivefeil også uten spool, i
+                          stedet for å feile. Radene blir da liggende i bufferen til databasen svarer.
+
+        Raises:
+            backend.Error: Databasen svarer ikke, det er ingen spool og retry er False.
+        """
+        try:
+            self.backend.ping()
+        except self.backend.Error as e:
+            if self.spool is not None:
+                log.warning("Database unavailable, spooling to %s", self.spool.path)
+            elif not retry:
+                raise
+            self._broken(e)
+
+    def replaySpool(self):
+        """
+        Spiller av én bolk på opptil replay_batch rader fra spoolen i én transaksjon, sammen med
+        ny posisjon i SPOOL_STATE. Feiler skrivingen, rulles alt tilbake og posisjonen er
+        uendret. Gjør ingenting hvis en annen skrivebuffer spiller av samme spool.
+
+        Returns:
+            int: Antall rader som ble spilt av.
+        """
+        spool = self.spool
+        if not spool.replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            start = time.monotonic()
+            if self.retry_at is not None:
+                self.backend.ping()
+            position = spool.checkpoint
+            if position is None:
+                position = spool.loadCheckpoint(self.backend)
+            *batch, end = spool.read(position, self.replay_batch)
+            count = len(batch[0]) + len(batch[2])
+            if count:
+                alarms = self._writeRows(*batch)
+                spool.saveCheckpoint(self.backend, end)
+                self.backend.commit()
+                self.alarms_written += alarms
+                self.alarms_inserted.inc(alarms)
+            spool.replayed(end, count)
+        except self.backend.Error as e:
+            log.warning("Spool replay failed")
+            self._broken(e)
+            return 0
+        finally:
+            spool.replay_lock.release()
+
+        self._reconnected()
+        self.rows_replayed += count
+        self.replayed.inc(count)
+        if count:
+            log.info("Replayed %d spooled rows in %.0f ms", count, 1000 * (time.monotonic() - start))
+        return count
+
+    def drainQueue(self, write_queue):
+        """
+        Skriver alt som kommer i skrivekøen til køen er lukket og tom, og tømmer så bufferen.
+        Flere skrivebuffere (med hver sin forbindelse) kan tømme samme kø samtidig.
+
+        Args:
+            write_queue (StageQueue): Kø med (type, rad, ankomsttid, alarmer)-elementer. For typene
+                                      'temperatures' og 'accelerations' er rad, ankomsttid og
+                                      alarmer lister med én verdi per rad.
+        """
+        self.write_queue = write_queue
+        try:
+            while True:
+                if self.spool is None and self.offline() and not write_queue.closed:
+                    # Databasen er nede og radene har ingen annen plass: la køen fylles (mottrykk)
+                    time.sleep(min(0.1, max(0.0, self.retry_at - time.monotonic())))
+                    if not self.offline():
+                        self.flush()
+                    continue
+                # Venter bare til eldste rad er forfalt, så bufferen skrives i tide også når det
+                # ikke kommer flere rader (lav frekvens, eller enheten er stoppet)
+                item = write_queue.poll(self.untilDue())
+                if item is not None:
+                    kind, row, arrival, alarms = item
+                    if kind == 'temperature':
+                        self.addTemperature(row, arrival, alarms)
+                    elif kind == 'acceleration':
+                        self.addAcceleration(row, arrival, alarms)
+                    elif kind == 'temperatures':
+                        self.addTemperatureRows(row, arrival, alarms)
+                    elif kind == 'accelerations':
+                        self.addAccelerationRows(row, arrival, alarms)
+                elif write_queue.finished():
+                    break
+
+                if self.due():
+                    self.flush()
+                elif (self.spool is not None and self.spool.pending() and not self.offline()
+                      and not self.backlogged()):
+                    self.replaySpool()
+        finally:
+            # Det som ligger igjen i spoolen, spilles av neste gang innsamlingen startes
+            self.flush(force=True)
+
+    def _insertRows(self, sql, rows, alarms):
+        """
+        Setter inn rader i opprinnelig rekkefølge. Sammenhengende rader uten alarm settes inn med
+        executemany, mens rader med alarm settes inn enkeltvis for å få reading_id fra lastrowid.
+
+        Args:
+            sql (str): INSERT-setningen for målingene.
+            rows (list): Radene som skal settes inn.
+            alarms (list): Alarmparametere per rad (tom sekvens for rader uten alarm).
+
+        Returns:
+            list: (reading_id, parameter)-rader for alarmtabellen.
+        """
+        alarm_rows = []
+        start = 0
+        for index, parameters in enumerate(alarms):
+            if not parameters:
+                continue
+            if start < index:
+                self.backend.executemany(sql, rows[start:index])
+            reading_id = self.backend.insert(sql, rows[index])
+            alarm_rows.extend((reading_id, parameter) for parameter in parameters)
+            start = index + 1
+        if start < len(rows):
+            self.backend.executemany(sql, rows[start:])
+        return alarm_rows
+
+    def stats(self):
+        """
+        Returns:
+            dict: Skrevne, tapte, spoolede og avspilte rader, antall commits, om databasen er
+                  nede, og forsinkelse fra seriellport til commit (gjennomsnitt og maks i
+                  millisekunder, og p50/p99 med latency_window).
+        """
+        stats = {
+            'rows_written': self.rows_written,
+            'rows_lost': self.rows_lost,
+            'alarms_written': self.alarms_written,
+            'flushes': self.flushes,
+            'rows_spooled': self.rows_spooled,
+            'rows_replayed': self.rows_replayed,
+            'offline': self.retry_at is not None,
+            'pending': len(self),
+            'latency_avg_ms': 1000 * self.latency_total / self.latency_count if self.latency_count else 0,
+            'latency_max_ms': 1000 * self.latency_max,
+        }
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            stats['latency_p50_ms'] = 1000 * latencies[len(latencies) // 2]
+            stats['latency_p99_ms'] = 1000 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        return stats
@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Framing
+from Framing import FrameDecoder, encode
+
+TEMPERATURE = encode(Framing.TEMPERATURE, 1, 1000, 21.5)
+ACCELERATION = encode(Framing.ACCELERATION, 2, 1000, 0.5, -0.25, 9.75)
+LINE = b'{"Response": "Data gathering stopped."}\n'
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = FrameDecoder()
+
+    def test_decodes_frames(self):
+        items = self.decoder.feed(TEMPERATURE + ACCELERATION)
+        self.assertEqual(items, [(Framing.TEMPERATURE, 1, 1000, 21.5),
+                                 (Framing.ACCELERATION, 2, 1000, 0.5, -0.25, 9.75)])
+        self.assertEqual(self.decoder.frames, 2)
+
+    def test_crc_mismatch_is_dropped(self):
+        corrupt = bytearray(TEMPERATURE)
+        corrupt[6] ^= 0xff  # En byte i nyttelasten
+        items = self.decoder.feed(bytes(corrupt) + ACCELERATION)
+        self.assertEqual(items, [(Framing.ACCELERATION, 2, 1000, 0.5, -0.25, 9.75)])
+        self.assertEqual(self.decoder.crc_errors, 1)
+
+    def test_resyncs_after_garbage(self):
+        garbage = b'\x00\x13\xa5\x99junk\xa5'
+        items = self.decoder.feed(garbage + TEMPERATURE + b'\xff\xfe' + LINE)
+        self.assertEqual(items, [(Framing.TEMPERATURE, 1, 1000, 21.5), LINE.rstrip()])
+        self.assertGreater(self.decoder.skipped, 0)
+        self.assertEqual(self.decoder.buffer, bytearray())
+
+    def test_frame_split_across_reads(self):
+        data = TEMPERATURE + ACCELERATION + LINE
+        for split in range(1, len(data)):
+            decoder = FrameDecoder()
+            items = decoder.feed(data[:split]) + decoder.feed(data[split:])
+            self.assertEqual(items, [(Framing.TEMPERATURE, 1, 1000, 21.5),
+                                     (Framing.ACCELERATION, 2, 1000, 0.5, -0.25, 9.75),
+                                     LINE.rstrip()], msg=split)
+
+    def test_byte_by_byte(self):
+        items = []
+        for byte in TEMPERATURE + LINE + ACCELERATION:
+            items += self.decoder.feed(bytes((byte,)))
+        self.assertEqual(len(items), 3)
+        self.assertEqual(self.decoder.stats()['crc_errors'], 0)
+
+    def test_mixed_json_and_binary(self):
+        data = LINE + TEMPERATURE + b'{"temperature": {"sensor_id": 1, "temperature": 20.0}}\r\n' + ACCELERATION
+        items = self.decoder.feed(data)
+        self.assertEqual(items, [LINE.rstrip(), (Framing.TEMPERATURE, 1, 1000, 21.5),
+                                 b'{"temperature": {"sensor_id": 1, "temperature": 20.0}}',
+                                 (Framing.ACCELERATION, 2, 1000, 0.5, -0.25, 9.75)])
+        self.assertEqual((self.decoder.lines, self.decoder.frames), (2, 2))
+
+    def test_overlong_line_is_dropped(self):
+        decoder = FrameDecoder(max_line=16)
+        self.assertEqual(decoder.feed(b'{' + b'x' * 32), [])
+        self.assertEqual(decoder.feed(b'\n' + LINE), [LINE.rstrip()])
+
+
+if __name__ == "__main__":
+    unittest.main()
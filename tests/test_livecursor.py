@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from DbTrans import HentData
+from IdGaps import GapTracker
+from Storage import SQLiteBackend
+
+INSERT = "INSERT INTO temperaturereadings (reading_id, sensor_id, timestamp, temperature) VALUES (%s, 1, %s, %s)"
+
+
+class LiveCursorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'test.db')
+        # To skrivere med hver sin forbindelse, og HMI-en med en tredje
+        self.writer_a = SQLiteBackend(path)
+        self.writer_b = SQLiteBackend(path)
+        self.writer_a.connect()
+        self.writer_b.connect()
+        self.fetcher = HentData(SQLiteBackend(path))
+
+    def tearDown(self):
+        for db in (self.writer_a, self.writer_b, self.fetcher.backend):
+            db.close()
+        self.tmpdir.cleanup()
+
+    def insert(self, db, *reading_ids):
+        db.executemany(INSERT, [(i, f'2026-10-18 12:00:{i:02d}', float(i)) for i in reading_ids])
+        db.commit()
+
+    def fetch(self, siste_id):
+        new = self.fetcher.hent_siden(siste_id, 0)
+        return new['temperature']['reading_id'], new['siste_temp_id']
+
+    def test_rows_committed_out_of_id_order_are_not_skipped(self):
+        self.insert(self.writer_a, 1)
+        ids, cursor = self.fetch(None)
+        self.assertEqual((ids, cursor), ([1], 1))
+
+        # Skriver B committer 3 og 5 før skriver A har committet 2 og 4
+        self.insert(self.writer_b, 3, 5)
+        ids, cursor = self.fetch(cursor)
+        self.assertEqual((ids, cursor), ([3, 5], 5))
+
+        self.insert(self.writer_a, 2, 4)
+        self.insert(self.writer_b, 6)
+        ids, cursor = self.fetch(cursor)
+        self.assertEqual((ids, cursor), ([2, 4, 6], 6))
+
+        ids, cursor = self.fetch(cursor)
+        self.assertEqual((ids, cursor), ([], 6))
+        self.assertEqual(len(self.fetcher.hull['temperaturereadings']), 0)
+
+    def test_gaps_are_given_up_after_the_window(self):
+        self.fetcher.hull_sekunder = 0
+        self.insert(self.writer_a, 1)
+        ids, cursor = self.fetch(None)
+        self.insert(self.writer_b, 3)
+        ids, cursor = self.fetch(cursor)
+        self.insert(self.writer_a, 2)
+        ids, cursor = self.fetch(cursor)
+        self.assertEqual(ids, [])
+
+
+class GapTrackerTest(unittest.TestCase):
+
+    def test_adjacent_ranges_are_merged(self):
+        gaps = GapTracker(60)
+        gaps.add(5, 6, now=0)
+        gaps.add(1, 2, now=0)
+        gaps.add(3, 4, now=1)
+        self.assertEqual(gaps.ranges, [[1, 6, 61]])
+
+    def test_found_ids_split_ranges(self):
+        gaps = GapTracker(60)
+        gaps.add_between(0, [3, 10], now=0)
+        gaps.found([1, 5, 7])
+        self.assertEqual([gap[:2] for gap in gaps.ranges], [[2, 2], [4, 4], [6, 6], [8, 9]])
+
+    def test_queries_are_split_into_bounded_chunks(self):
+        gaps = GapTracker(60, max_clauses=2)
+        gaps.add_between(0, [2, 4, 6, 8, 10], now=0)
+        queries = gaps.queries()
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(queries[0], ('reading_id BETWEEN %s AND %s OR reading_id BETWEEN %s AND %s', (1, 1, 3, 3)))
+
+    def test_oldest_ranges_are_dropped_when_full(self):
+        gaps = GapTracker(60, max_ranges=2)
+        gaps.add(1, 1, now=0)
+        gaps.add(5, 5, now=2)
+        self.assertEqual(gaps.add(3, 3, now=1), [[1, 1, 60]])
+        self.assertEqual([gap[0] for gap in gaps.ranges], [3, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Framing
+from DataColector import SensorDataCollector, decodeFrame, decodeLine
+from Storage import SQLiteBackend
+
+GOOD = [
+    b'{"temperature": {"sensor_id": 1, "temperature": 21.5}}',
+    b'{"acceleration": {"sensor_id": 2, "x": 0.1, "y": 0.2, "z": 9.8}}',
+    b'{"temperature": {"sensor_id": 1, "temperature": 22}, '
+    b'"acceleration": {"sensor_id": 2, "x": 0.2, "y": 0.1, "z": 9.7}}',
+]
+
+BAD = [
+    b'not json',
+    b'123',
+    b'[1, 2]',
+    b'null',
+    b'{}',
+    b'{"temperature": 21.5}',
+    b'{"temperature": {"temperature": 21.5}}',
+    b'{"temperature": {"sensor_id": "1", "temperature": 21.5}}',
+    b'{"temperature": {"sensor_id": true, "temperature": 21.5}}',
+    b'{"temperature": {"sensor_id": 1, "temperature": "hot"}}',
+    b'{"temperature": {"sensor_id": 1, "temperature": null}}',
+    b'{"temperature": {"sensor_id": 1, "temperature": NaN}}',
+    b'{"acceleration": {"sensor_id": 2, "x": 0.1, "y": 0.2}}',
+    b'{"temperature": {"sensor_id": 1, "temperature": 20.0}, "acceleration": {"sensor_id": 2, "x": "a", "y": 0, "z": 0}}',
+]
+
+# Rammer slik FrameDecoder gir dem: (type, sensor_id, tid i ms, verdi...)
+GOOD_FRAMES = [
+    (Framing.TEMPERATURE, 1, 10, 21.5),
+    (Framing.ACCELERATION, 2, 10, 0.1, 0.2, 9.8),
+]
+
+BAD_FRAMES = [
+    (Framing.TEMPERATURE, 1, 20, float('nan')),
+    (Framing.TEMPERATURE, 1, 20, float('inf')),
+    (Framing.ACCELERATION, 2, 20, 0.1, float('-inf'), 9.8),
+    (9, 1, 20, 1.0),
+]
+
+
+class ParsingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        backend = SQLiteBackend(os.path.join(self.tmpdir.name, 'test.db'))
+        self.collector = SensorDataCollector('test', 1, backend=backend)
+        # Tellerne i Metrics er felles for prosessen, så bare økningen i hver test sjekkes
+        self.invalid_before = self.collector.invalid_lines.value
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def written(self):
+        # Radene tolkeren har sendt til skrivekøen, uten tidsstempel
+        temperatures, accelerations = [], []
+        while True:
+            item = self.collector.write_queue.getNowait()
+            if item is None:
+                return temperatures, accelerations
+            kind, rows = item[0], item[1]
+            if kind in ('temperature', 'acceleration'):
+                rows = [rows]
+            target = temperatures if kind.startswith('temperature') else accelerations
+            target.extend((row[0],) + tuple(row[2:]) for row in rows)
+
+    def expected(self):
+        return ([(1, 21.5), (1, 22.0)],
+                [(2, 0.1, 0.2, 9.8, 0.0 - 0.1, 0.0 - 0.2, 0.0 - 9.8),
+                 (2, 0.2, 0.1, 9.7, 0.1 - 0.2, 0.2 - 0.1, 9.8 - 9.7)])
+
+    def mixed(self):
+        lines = []
+        for i, line in enumerate(GOOD):
+            lines.extend(BAD[i::len(GOOD)])
+            lines.append(line)
+        return lines
+
+    def assertRows(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for row, expected_row in zip(actual, expected):
+            self.assertEqual(row[0], expected_row[0])
+            for value, expected_value in zip(row[1:], expected_row[1:]):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_batch_skips_bad_lines(self):
+        self.collector.processBatch([(None, line) for line in self.mixed()])
+        temperatures, accelerations = self.written()
+        expected_temperatures, expected_accelerations = self.expected()
+        self.assertRows(temperatures, expected_temperatures)
+        self.assertRows(accelerations, expected_accelerations)
+        self.assertEqual(self.collector.invalid_lines.value - self.invalid_before, len(BAD))
+
+    def test_per_line_skips_bad_lines(self):
+        for line in self.mixed():
+            self.collector.processData(line.decode(errors='replace'))
+        temperatures, accelerations = self.written()
+        expected_temperatures, expected_accelerations = self.expected()
+        self.assertRows(temperatures, expected_temperatures)
+        self.assertRows(accelerations, expected_accelerations)
+        self.assertEqual(self.collector.invalid_lines.value - self.invalid_before, len(BAD))
+
+    def test_batch_skips_bad_frames(self):
+        frames = [BAD_FRAMES[0], GOOD_FRAMES[0], BAD_FRAMES[1], BAD_FRAMES[2], GOOD_FRAMES[1], BAD_FRAMES[3]]
+        self.collector.processBatch([(None, frame) for frame in frames])
+        temperatures, accelerations = self.written()
+        self.assertRows(temperatures, [(1, 21.5)])
+        self.assertRows(accelerations, [(2, 0.1, 0.2, 9.8, -0.1, -0.2, -9.8)])
+        self.assertEqual(self.collector.invalid_lines.value - self.invalid_before, len(BAD_FRAMES))
+
+    def test_per_frame_skips_bad_frames(self):
+        for frame in BAD_FRAMES + GOOD_FRAMES:
+            self.collector.processFrame(frame)
+        temperatures, accelerations = self.written()
+        self.assertRows(temperatures, [(1, 21.5)])
+        self.assertRows(accelerations, [(2, 0.1, 0.2, 9.8, -0.1, -0.2, -9.8)])
+        self.assertEqual(self.collector.invalid_lines.value - self.invalid_before, len(BAD_FRAMES))
+
+    def test_decode_rejects_bad_frames(self):
+        for frame in BAD_FRAMES:
+            with self.assertRaises(ValueError, msg=frame):
+                decodeFrame(frame)
+
+    def test_decode_rejects_bad_shapes(self):
+        for line in BAD:
+            with self.assertRaises(ValueError, msg=line):
+                decodeLine(line)
+
+
+class BlockEquivalenceTest(unittest.TestCase):
+    """
+    Samme tilfeldige sekvens gjennom processData/processFrame og gjennom processBatch i blokker
+    av tilfeldig størrelse skal gi like rader, tidsstempler og alarmer.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'test.db')
+        self.per_sample = self.collector(path)
+        self.batched = self.collector(path)
+        self.batched.clock_offset = self.per_sample.clock_offset
+
+    def tearDown(self):
+        for collector in (self.per_sample, self.batched):
+            collector.thresholds.db.close()
+        self.tmpdir.cleanup()
+
+    def collector(self, path):
+        collector = SensorDataCollector('test', 1, backend=SQLiteBackend(path))
+        db = collector.thresholds.db
+        db.connect()
+        db.executemany("INSERT INTO alarmthresholds (sensor_id, parameter, min_value, max_value) VALUES (%s, %s, %s, %s)",
+                       [(1, 'T', 18.0, 25.0), (2, 'A', -0.5, 0.5)])
+        db.commit()
+        collector.thresholds.refresh(force=True)
+        return collector
+
+    def sequence(self, rng, count):
+        items = []
+        arrival = 1000.0
+        for _ in range(count):
+            arrival += rng.uniform(0, 0.05)  # Sekundskifter midt i blokkene
+            temperature = {"sensor_id": 1, "temperature": rng.uniform(10, 30)}
+            acceleration = {"sensor_id": 2, "x": rng.gauss(0, 0.4), "y": rng.gauss(0, 0.4), "z": rng.gauss(9.8, 0.4)}
+            kind = rng.randrange(6)
+            if kind == 0:
+                line = json.dumps({"temperature": temperature}).encode()
+            elif kind == 1:
+                line = json.dumps({"acceleration": acceleration}).encode()
+            elif kind == 2:
+                line = json.dumps({"temperature": temperature, "acceleration": acceleration}).encode()
+            elif kind == 3:
+                line = (Framing.TEMPERATURE, 1, 0, temperature["temperature"])
+            elif kind == 4:
+                line = (Framing.ACCELERATION, 2, 0, acceleration["x"], acceleration["y"], acceleration["z"])
+            else:
+                line = rng.choice(BAD + BAD_FRAMES)
+            items.append((arrival, line))
+        return items
+
+    def written(self, collector):
+        # Enkeltrader og blokker til én liste per tabell: (rad, alarmer)
+        temperatures, accelerations = [], []
+        while True:
+            item = collector.write_queue.getNowait()
+            if item is None:
+                return temperatures, accelerations
+            kind, rows, arrivals, alarms = item
+            if kind in ('temperature', 'acceleration'):
+                rows, alarms = [rows], [alarms]
+            target = temperatures if kind.startswith('temperature') else accelerations
+            target.extend((row, list(row_alarms)) for row, row_alarms in zip(rows, alarms))
+
+    def assertSame(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for (row, alarms), (expected_row, expected_alarms) in zip(actual, expected):
+            self.assertEqual(row[:2], expected_row[:2])
+            for value, expected_value in zip(row[2:], expected_row[2:]):
+                self.assertAlmostEqual(value, expected_value, places=9)
+            self.assertEqual(alarms, expected_alarms)
+
+    def test_batch_matches_per_sample(self):
+        rng = random.Random(20261018)
+        items = self.sequence(rng, 3000)
+
+        for arrival, line in items:
+            if isinstance(line, tuple):
+                self.per_sample.processFrame(line, arrival)
+            else:
+                self.per_sample.processData(line.decode(errors='replace'), arrival)
+        start = 0
+        while start < len(items):
+            size = rng.randint(1, 300)
+            self.batched.processBatch(items[start:start + size])
+            start += size
+
+        expected_temperatures, expected_accelerations = self.written(self.per_sample)
+        temperatures, accelerations = self.written(self.batched)
+        self.assertSame(temperatures, expected_temperatures)
+        self.assertSame(accelerations, expected_accelerations)
+        # Sekvensen må faktisk krysse grensene og gå over flere sekunder
+        self.assertTrue(any(alarms for _, alarms in expected_temperatures))
+        self.assertTrue(any(alarms for _, alarms in expected_accelerations))
+        self.assertGreater(len({row[1] for row, _ in expected_temperatures}), 1)
+        self.assertEqual(self.batched.acceleration_x2, self.per_sample.acceleration_x2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Retention import purge_orphan_alarms
+from Storage import SQLiteBackend
+
+
+class OrphanAlarmTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = SQLiteBackend(os.path.join(self.tmpdir.name, 'test.db'))
+        self.db.connect()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_ids_not_in_time_order(self):
+        # Målingene med lav ID er nyest (f.eks. skrevet før en avspilt spool) og blir igjen;
+        # de med høy ID er eldst og er slettet sammen med partisjonen sin
+        remaining = list(range(1, 11))
+        dropped = list(range(11, 21))
+        self.db.executemany("INSERT INTO temperaturereadings (reading_id, sensor_id, timestamp, temperature) "
+                            "VALUES (%s, 1, '2026-10-18 12:00:00', 20.0)", [(i,) for i in remaining])
+        self.db.executemany("INSERT INTO temperaturealarms (reading_id, parameter) VALUES (%s, 'HIGH ALARM TEMPERATURE')",
+                            [(i,) for i in dropped + remaining + dropped])
+        self.db.commit()
+
+        self.assertEqual(purge_orphan_alarms(self.db, 'temperaturereadings', 'temperaturealarms', chunk=7), 20)
+        self.assertEqual([row[0] for row in self.db.query("SELECT reading_id FROM temperaturealarms ORDER BY reading_id")],
+                         remaining)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from RingBuffer import RingBuffer
+
+
+def as_lists(columns):
+    return [list(column) for column in columns]
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_append_wraps_around(self):
+        buffer = RingBuffer(4, columns=2)
+        for i in range(10):
+            buffer.append(i, 10 * i)
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(as_lists(buffer.last()), [[6, 7, 8, 9], [60, 70, 80, 90]])
+        self.assertEqual(buffer.latest(), (9, 90))
+
+    def test_last_more_than_stored(self):
+        buffer = RingBuffer(5)
+        buffer.extend([1, 2, 3])
+        self.assertEqual(as_lists(buffer.last(10)), [[1, 2, 3]])
+        # Etter at bufferen har gått rundt, gir n over kapasiteten alle radene i rekkefølge
+        buffer.extend([4, 5, 6, 7])
+        self.assertEqual(as_lists(buffer.last(100)), [[3, 4, 5, 6, 7]])
+        self.assertEqual(as_lists(buffer.last(2)), [[6, 7]])
+        self.assertEqual(as_lists(buffer.last(0)), [[]])
+
+    def test_extend_larger_than_capacity(self):
+        buffer = RingBuffer(4, columns=2)
+        buffer.append(-1, -1)
+        buffer.extend(list(range(10)), [10 * i for i in range(10)])
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(as_lists(buffer.last()), [[6, 7, 8, 9], [60, 70, 80, 90]])
+        buffer.append(10, 100)
+        self.assertEqual(as_lists(buffer.last()), [[7, 8, 9, 10], [70, 80, 90, 100]])
+
+    def test_extend_across_the_end(self):
+        buffer = RingBuffer(5)
+        buffer.extend([1, 2, 3, 4])
+        buffer.extend([5, 6, 7])
+        self.assertEqual(as_lists(buffer.last()), [[3, 4, 5, 6, 7]])
+        self.assertEqual(buffer.latest(), (7,))
+
+    def test_clear(self):
+        buffer = RingBuffer(3)
+        self.assertIsNone(buffer.latest())
+        buffer.extend([1, 2, 3, 4])
+        buffer.clear()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(as_lists(buffer.last()), [[]])
+        buffer.append(5)
+        self.assertEqual(as_lists(buffer.last()), [[5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Rollup import RollupAggregator, fetch_series
+from Storage import SQLiteBackend
+
+TIMESTAMP = '2026-10-18 12:00:00'
+
+
+class RollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = SQLiteBackend(os.path.join(self.tmpdir.name, 'test.db'))
+        self.db.connect()
+        self.aggregator = RollupAggregator(self.db, settle=60)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def insert(self, *reading_ids):
+        # Eksplisitte ID-er, som når en annen skriver committer en lavere ID senere
+        self.db.executemany("INSERT INTO temperaturereadings (reading_id, sensor_id, timestamp, temperature) "
+                            "VALUES (%s, 1, %s, %s)", [(i, TIMESTAMP, float(i)) for i in reading_ids])
+        self.db.commit()
+
+    def bucket(self):
+        return self.db.query_one("SELECT sum_value, sample_count FROM ROLLUPS "
+                                 "WHERE metric = 'temperature' AND resolution = 60")
+
+    def test_waits_for_uncommitted_ids(self):
+        self.insert(1, 2, 4)
+        self.assertEqual(self.aggregator.run_once(), 2)
+        self.assertEqual(self.aggregator.high_water_mark('temperaturereadings'), 2)
+
+        self.insert(3)
+        self.assertEqual(self.aggregator.run_once(), 2)
+        self.assertEqual(self.bucket(), (10.0, 4))
+
+    def test_late_rows_in_skipped_gap_are_counted_once(self):
+        self.aggregator.settle = 0
+        self.insert(1, 2, 5)
+        self.assertEqual(self.aggregator.run_once(), 3)
+        self.assertEqual(self.aggregator.high_water_mark('temperaturereadings'), 5)
+
+        self.insert(4)
+        self.assertEqual(self.aggregator.run_once(), 1)
+        self.assertEqual(self.aggregator.run_once(), 0)
+        self.assertEqual(self.aggregator.late['temperaturereadings'].ranges[0][:2], [3, 3])
+        self.assertEqual(self.bucket(), (12.0, 4))
+
+    def test_many_gaps_are_checked_in_few_queries(self):
+        self.aggregator.settle = 0
+        # Annenhver ID mangler: 500 hull som hvert er ett intervall
+        self.insert(*range(1, 1002, 2))
+        self.aggregator.run_once()
+        late = self.aggregator.late['temperaturereadings']
+        self.assertEqual(len(late), 500)
+
+        # Hullene sjekkes i spørringer med maks 100 BETWEEN-ledd hver, ikke ett ledd per hull
+        self.assertEqual([len(params) // 2 for condition, params in late.queries()], [100] * 5)
+        self.insert(*range(2, 1001, 2))
+        self.assertEqual(self.aggregator.run_once(), 500)
+        self.assertEqual(len(late), 0)
+        self.assertEqual(self.bucket(), (sum(range(1, 1002)), 1001))
+
+    def test_series_includes_bucket_containing_start(self):
+        self.db.executemany("INSERT INTO temperaturereadings (sensor_id, timestamp, temperature) VALUES (1, %s, %s)",
+                            [('2026-10-18 12:00:10', 1.0), ('2026-10-18 12:00:50', 3.0),
+                             ('2026-10-18 12:01:30', 5.0)])
+        self.db.commit()
+        self.aggregator.run_once()
+        series = fetch_series(self.db, 1, 'temperature', datetime(2026, 10, 18, 12, 0, 30),
+                              datetime(2026, 10, 18, 12, 2), resolution=60)
+        self.assertEqual(series['resolution'], 60)
+        self.assertEqual(series['timestamp'], ['2026-10-18 12:00:00', '2026-10-18 12:01:00'])
+        self.assertEqual(series['mean'], [2.0, 5.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
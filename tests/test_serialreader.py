@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from SerialReader import SerialLineReader
+
+
+class FakeSerial:
+    """
+    Seriellport der data kommer i gitte biter. read() på tom inngangsbuffer gir én byte av neste
+    bit, som når den ekte porten våkner av første byte, og resten av biten ligger da i bufferen.
+    """
+
+    def __init__(self, arrivals):
+        self.arrivals = list(arrivals)
+        self.buffer = bytearray()
+        self.reads = []
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    def read(self, size=1):
+        if not self.buffer:
+            if not self.arrivals:
+                return b''  # Timeout
+            self.buffer += self.arrivals.pop(0)
+            size = 1
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.reads.append(len(data))
+        return data
+
+
+def read_all(reader):
+    lines = []
+    while reader.ser.arrivals or reader.ser.buffer:
+        lines += [line for arrival, line in reader.readLines()]
+    return lines
+
+
+class SerialLineReaderTest(unittest.TestCase):
+
+    LINES = [b'{"temperature": 21.5}', b'{"acceleration": {"x": 0.1, "y": 0.2, "z": 9.8}}', b'{"sensor_id": 3}']
+
+    def test_lines_split_across_chunks(self):
+        data = b''.join(line + b'\n' for line in self.LINES)
+        # Alle mulige steder å dele strømmen i tre biter
+        for first in range(1, len(data) - 1):
+            for second in range(first + 1, len(data)):
+                chunks = [data[:first], data[first:second], data[second:]]
+                reader = SerialLineReader(FakeSerial(chunks))
+                self.assertEqual(read_all(reader), self.LINES, chunks)
+
+    def test_crlf_and_empty_lines(self):
+        reader = SerialLineReader(FakeSerial([b'{"a": 1}\r', b'\n\r\n{"b"', b': 2}\r\n']))
+        self.assertEqual(read_all(reader), [b'{"a": 1}', b'{"b": 2}'])
+
+    def test_idle_port_reads_whole_chunk(self):
+        reader = SerialLineReader(FakeSerial([b'{"a": 1}\n{"b": 2}\n']))
+        self.assertEqual([line for arrival, line in reader.readLines()], [b'{"a": 1}', b'{"b": 2}'])
+        # Første byte vekker read(), resten hentes i samme readLines()
+        self.assertEqual(reader.ser.reads, [1, 17])
+        self.assertEqual(reader.readLines(), [])
+
+    def test_chunk_size_is_respected(self):
+        reader = SerialLineReader(FakeSerial([b'x' * 100 + b'\n']), chunk_size=40)
+        self.assertEqual(read_all(reader), [b'x' * 100])
+        self.assertTrue(all(size <= 40 for size in reader.ser.reads))
+        self.assertEqual(reader.stats()['reads'], 3)
+
+    def test_overlong_line_is_discarded(self):
+        reader = SerialLineReader(FakeSerial([b'x' * 50, b'x' * 50, b'\n{"a": 1}\n']), max_line=64)
+        self.assertEqual(read_all(reader), [b'{"a": 1}'])
+        self.assertEqual(reader.stats()['discarded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Spool import HEADER, Spool, SpoolFull
+from Storage import SQLiteBackend
+from WriteBuffer import WriteBuffer
+
+
+class CheckpointFailBackend(SQLiteBackend):
+    # Feiler når posisjonen skal lagres i SPOOL_STATE, etter at radene er satt inn
+    fail_checkpoint = False
+
+    def execute(self, sql, params=()):
+        if self.fail_checkpoint and 'SPOOL_STATE' in sql:
+            raise sqlite3.OperationalError("database is down")
+        return super().execute(sql, params)
+
+
+def batch(first, count, alarm=False):
+    temperature_rows = [(1, '2026-10-18 12:00:00', 20.0 + first + i) for i in range(count)]
+    temperature_alarms = [["HIGH ALARM TEMPERATURE"] if alarm and i == 0 else [] for i in range(count)]
+    acceleration_rows = [(2, '2026-10-18 12:00:00', 0.1, 0.2, 9.8, 0.0, 0.0, 0.0)]
+    return temperature_rows, temperature_alarms, acceleration_rows, [[]]
+
+
+class SpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.spool')
+        self.spool = Spool(self.path, capacity=64 * 1024)
+
+    def tearDown(self):
+        self.spool.close()
+        self.tmpdir.cleanup()
+
+    def reopen(self):
+        self.spool.close()
+        self.spool = Spool(self.path)
+
+    def test_append_and_read(self):
+        self.assertFalse(self.spool.pending())
+        self.spool.append(*batch(0, 3, alarm=True))
+        self.spool.append(*batch(3, 2))
+        self.assertTrue(self.spool.pending())
+
+        # read() stopper etter den bolken som når max_rows
+        *first, position = self.spool.read(HEADER.size, 1)
+        self.assertEqual(first, list(batch(0, 3, alarm=True)))
+        *second, end = self.spool.read(position, 1000)
+        self.assertEqual(second, list(batch(3, 2)))
+        self.assertEqual(end, self.spool.end)
+        self.assertEqual(self.spool.read(end, 1000), ([], [], [], [], end))
+
+    def test_records_survive_reopen(self):
+        self.spool.append(*batch(0, 3))
+        self.spool.append(*batch(3, 3))
+        end = self.spool.end
+        generation = self.spool.generation
+        self.reopen()
+        self.assertEqual(self.spool.generation, generation)
+        self.assertEqual(self.spool.end, end)
+        self.assertTrue(self.spool.pending())
+        self.assertEqual(self.spool.read(HEADER.size, 1000)[0], batch(0, 3)[0] + batch(3, 3)[0])
+
+    def test_torn_record_is_not_read(self):
+        self.spool.append(*batch(0, 3))
+        end = self.spool.end
+        self.spool.append(*batch(3, 3))
+        # Siste bolk ble halvveis skrevet før et krasj: feil CRC
+        self.spool.map[self.spool.end - 1] ^= 0xff
+        self.reopen()
+        self.assertEqual(self.spool.end, end)
+        self.assertEqual(self.spool.read(HEADER.size, 1000)[0], batch(0, 3)[0])
+
+    def test_full(self):
+        self.spool.close()
+        self.spool = Spool(os.path.join(self.tmpdir.name, 'small.spool'), capacity=600)
+        appended = 0
+        with self.assertRaises(SpoolFull):
+            while True:
+                self.spool.append(*batch(appended, 2))
+                appended += 2
+        self.assertGreater(appended, 0)
+        self.assertEqual(self.spool.stats()['full'], 1)
+        # Det som fikk plass, er urørt
+        rows = self.spool.read(HEADER.size, 1000)[0]
+        self.assertEqual([row[2] for row in rows], [20.0 + i for i in range(appended)])
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'test.db')
+        self.spool_path = os.path.join(self.tmpdir.name, 'test.spool')
+        self.db = CheckpointFailBackend(self.db_path)
+        self.db.connect()
+        self.spool = Spool(self.spool_path, capacity=64 * 1024)
+        self.buffer = WriteBuffer(self.db, spool=self.spool, retry_interval=0, replay_batch=5)
+        # Egen forbindelse til kontrollene; skrivebufferen lukker sin etter en feil
+        self.reader = SQLiteBackend(self.db_path)
+        self.reader.connect()
+
+    def tearDown(self):
+        self.spool.close()
+        self.reader.close()
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def temperatures(self):
+        return [row[0] for row in self.reader.query("SELECT temperature FROM temperaturereadings ORDER BY temperature")]
+
+    def replay_all(self, buffer):
+        rows = 0
+        while buffer.spool.pending():
+            rows += buffer.replaySpool()
+        return rows
+
+    def test_replay_writes_rows_and_alarms(self):
+        self.spool.append(*batch(0, 4, alarm=True))
+        self.spool.append(*batch(4, 4))
+        self.assertEqual(self.replay_all(self.buffer), 10)
+        self.assertEqual(self.temperatures(), [20.0 + i for i in range(8)])
+        self.assertEqual(self.reader.query_one("SELECT COUNT(*) FROM accelerationreadings")[0], 2)
+        self.assertEqual(self.reader.query_one("SELECT COUNT(*) FROM temperaturealarms")[0], 1)
+        self.assertEqual(self.buffer.rows_replayed, 10)
+
+    def test_checkpoint_survives_reopen(self):
+        for first in range(0, 12, 4):
+            self.spool.append(*batch(first, 4))
+        # Første bolk spilles av, så "krasj": ny spool og ny buffer på samme filer
+        self.assertEqual(self.buffer.replaySpool(), 5)
+        self.spool.close()
+        self.spool = Spool(self.spool_path)
+        self.assertIsNone(self.spool.checkpoint)
+        buffer = WriteBuffer(self.db, spool=self.spool, retry_interval=0, replay_batch=5)
+        self.assertEqual(self.replay_all(buffer), 10)
+        # Hver rad er skrevet nøyaktig én gang
+        self.assertEqual(self.temperatures(), [20.0 + i for i in range(12)])
+
+    def test_failed_checkpoint_rolls_back_rows(self):
+        self.spool.append(*batch(0, 4))
+        self.db.fail_checkpoint = True
+        self.assertEqual(self.buffer.replaySpool(), 0)
+        # Radene ble satt inn før SPOOL_STATE feilet, men er rullet tilbake sammen med den
+        self.assertEqual(self.temperatures(), [])
+        self.assertIsNone(self.reader.query_one("SELECT position FROM SPOOL_STATE WHERE spool = %s", (self.spool.name,)))
+        self.assertTrue(self.spool.pending())
+
+        self.db.fail_checkpoint = False
+        self.assertEqual(self.replay_all(self.buffer), 5)
+        self.assertEqual(self.temperatures(), [20.0 + i for i in range(4)])
+
+    def test_generation_rollover(self):
+        self.spool.append(*batch(0, 4))
+        self.spool.append(*batch(4, 4))
+        generation = self.spool.generation
+        self.replay_all(self.buffer)
+
+        # Helt avspilt: spoolen starter fra begynnelsen med ny generasjon
+        self.assertNotEqual(self.spool.generation, generation)
+        self.assertEqual(self.spool.end, HEADER.size)
+        self.assertEqual(self.spool.checkpoint, HEADER.size)
+        self.assertFalse(self.spool.pending())
+
+        # Ny bolk over de gamle postene; etter gjenåpning er bare den igjen, og den gamle
+        # posisjonen i SPOOL_STATE gjelder ikke for den nye generasjonen
+        self.spool.append(*batch(100, 2))
+        self.spool.close()
+        self.spool = Spool(self.spool_path)
+        self.assertEqual(self.spool.loadCheckpoint(self.reader), HEADER.size)
+        buffer = WriteBuffer(self.db, spool=self.spool, retry_interval=0, replay_batch=5)
+        self.assertEqual(self.replay_all(buffer), 3)
+        self.assertEqual(self.temperatures(), [20.0 + i for i in range(8)] + [120.0, 121.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Storage import SQLiteBackend
+from WriteBuffer import WriteBuffer
+
+
+class OutageBackend(SQLiteBackend):
+    # Oppfører seg som en database som er nede mens down er satt
+    down = False
+
+    def ping(self):
+        if self.down:
+            raise sqlite3.OperationalError("database is down")
+        super().ping()
+
+    def executemany(self, sql, rows):
+        if self.down:
+            raise sqlite3.OperationalError("database is down")
+        return super().executemany(sql, rows)
+
+
+class ReconnectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = OutageBackend(os.path.join(self.tmpdir.name, 'test.db'))
+        self.db.connect()
+        self.buffer = WriteBuffer(self.db, batch_size=1000, retry_interval=0.05)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def add(self, count):
+        for i in range(count):
+            self.buffer.addTemperature((1, '2026-10-18 12:00:00', 20.0 + i))
+
+    def count(self):
+        return self.db.query_one("SELECT COUNT(*) FROM temperaturereadings")[0]
+
+    def test_dropped_connection_is_reopened(self):
+        self.db.conn.close()  # F.eks. MySQL som har lukket en ledig forbindelse
+        self.add(10)
+        self.assertEqual(self.buffer.flush(), 10)
+        self.assertEqual(self.buffer.rows_lost, 0)
+        self.assertEqual(self.count(), 10)
+
+    def test_keeps_rows_during_outage_without_spool(self):
+        self.db.down = True
+        self.add(10)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertTrue(self.buffer.offline())
+
+        # Mens databasen er nede blir radene liggende, også de som kommer til
+        self.add(5)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer), 15)
+
+        self.db.down = False
+        time.sleep(self.buffer.retry_delay + 0.01)
+        self.assertEqual(self.buffer.flush(), 15)
+        self.assertIsNone(self.buffer.retry_at)
+        self.assertEqual(self.buffer.rows_lost, 0)
+        self.assertEqual([row[0] for row in self.db.query("SELECT temperature FROM temperaturereadings")],
+                         [20.0 + i for i in range(10)] + [20.0 + i for i in range(5)])
+
+    def test_rows_lost_only_when_stopping_while_down(self):
+        self.db.down = True
+        self.add(10)
+        self.buffer.flush()
+        self.assertEqual(self.buffer.flush(force=True), 0)
+        self.assertEqual(self.buffer.rows_lost, 10)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_backoff_doubles_while_down(self):
+        self.db.down = True
+        self.add(1)
+        self.buffer.flush()
+        first = self.buffer.retry_delay
+        time.sleep(first + 0.01)
+        self.add(1)
+        self.buffer.flush()
+        self.assertEqual(self.buffer.retry_delay, 2 * first)
+
+
+if __name__ == "__main__":
+    unittest.main()